@@ -1,97 +1,465 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, jsonify
-from flask_bcrypt import Bcrypt
+from flask import Blueprint, Flask, Response, abort, current_app, render_template, request, redirect, url_for, flash, jsonify, send_from_directory, session, stream_with_context, g
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
+import database
+import encoding
+import images
+import metrics
+import migrations
+import ratelimit
+import repository
+import storage
 from database import get_connection, init_db
-from werkzeug.utils import secure_filename
-from functools import wraps
+from repository import StudentRepository
+from stats import StudentStats
+from changes import CacheInvalidator, ChangeNotifier
+from config import get_config
+from cache import create_cache
+from passwords import PasswordHasher, HasherBusy
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache, wraps
+from urllib.parse import quote
 from flask_cors import CORS
-from dotenv import load_dotenv
+from jinja2 import ChoiceLoader, ModuleLoader, TemplateError
+from markupsafe import Markup
+from werkzeug.http import http_date, quote_etag
+from werkzeug.security import safe_join
+import click
 import os
+import csv
+import hashlib
+import io
+import json
+import mimetypes
+import threading
+import time
+import zlib
 
-# Load environment variables
-load_dotenv()
-
-# Initialize Flask app
-app = Flask(__name__)
-app.secret_key = os.environ.get('SECRET_KEY', 'ahmed')  # Use env variable or default
-app.config['TEMPLATES_AUTO_RELOAD'] = True  # Auto-reload templates
-
-# Enable CORS for API endpoints
-CORS(app, resources={r"/api/*": {"origins": "*"}})
-
-# File upload configuration
-UPLOAD_FOLDER = 'static/uploads'
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # 5MB max file size
 
-# Create upload folder if it doesn't exist
-os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+# Routes live on a blueprint; create_app() builds and configures the app
+bp = Blueprint('main', __name__, cli_group=None)
+login_manager = LoginManager()
+login_manager.login_view = 'main.login'
+
+# Per-process services, built from the app config by init_services()
+repo = None
+upload_storage = None
+image_processor = None
+hasher = None
+user_cache = None
+render_cache = None
+student_cache = None
+student_cache_sync = None
+student_stats = None
+change_notifier = None
+api_keys = {}
+admission = None
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def image_variants(student):
+    """Decode a student's image_variants column (None until processed)"""
+    variants = student['image_variants'] if 'image_variants' in student.keys() else None
+    return json.loads(variants) if variants else None
+
+@lru_cache(maxsize=4096)
+def thumbnail_key(variants, size):
+    """Key of the thumbnail closest to `size` in an image_variants value
+    
+    Memoized on the raw column: photos are shared and content-addressed,
+    so a page of students repeats the same few values.
+    """
+    thumbnails = json.loads(variants)['thumbnails']
+    fitting = [int(s) for s in thumbnails if int(s) >= size]
+    return thumbnails[str(min(fitting) if fitting else max(int(s) for s in thumbnails))]
+
+# What url_for() leaves unquoted in a <path:key> segment
+UPLOAD_KEY_SAFE = "!$&'()*+,/:;=@"
+
+def upload_url(key, external=False):
+    """URL of a stored file: the storage's public URL, else /uploads/<key>
+    
+    url_for() runs once per request for the /uploads/ prefix instead of
+    once per student in list responses.
+    """
+    url = upload_storage.url(key)
+    if url:
+        return url
+    name = 'upload_url_base_external' if external else 'upload_url_base'
+    base = g.get(name)
+    if base is None:
+        base = url_for('main.uploaded_file', key='_', _external=external)[:-1]
+        setattr(g, name, base)
+    return base + quote(key, safe=UPLOAD_KEY_SAFE)
+
+@bp.app_template_global()
+def student_image_url(student, size=None, external=False):
+    """URL of a student's photo, preferring the thumbnail closest to `size`"""
+    filename = student['image']
+    if not filename:
+        return None
+    if size:
+        variants = student['image_variants'] if 'image_variants' in student.keys() else None
+        if variants:
+            filename = thumbnail_key(variants, size)
+    return upload_url(filename, external)
+
+def student_image_keys(student):
+    """Every stored file a student's photo uses (upload or original, plus thumbnails)"""
+    if not student['image']:
+        return set()
+    keys = {student['image']}
+    keys.update(images.variant_files(image_variants(student)))
+    return keys
+
+def release_student_images(conn, student):
+    """Drop a student's references to its photo files
+    
+    Runs inside the caller's write job, which may be on the SQLite writer
+    thread, so the caller runs schedule_storage_gc() once it has committed.
+    The files themselves are deleted later by the storage garbage
+    collector, off the request path.
+    """
+    for key in student_image_keys(student):
+        repo.release_blob(conn, key)
+
+def retain_file(conn, key, size, restore):
+    """Add a reference to a stored file inside a write job
+    
+    If nothing referenced the file, the storage sweep may have deleted it
+    since it was saved; `restore()` then stores it again, before the write
+    commits (see storage.collect_garbage()).
+    """
+    if repo.retain_blob(conn, key, size) and not upload_storage.exists(key):
+        restore()
+
+def store_upload(file):
+    """Stream an uploaded file into content-addressed storage
+    
+    Returns (key, size, restore), `restore()` storing it again for
+    retain_file().
+    """
+    extension = file.filename.rsplit('.', 1)[1].lower()
+    
+    def restore():
+        file.stream.seek(0)
+        upload_storage.save_stream(file.stream, extension)
+    
+    key, size = upload_storage.save_stream(file.stream, extension)
+    return key, size, restore
+
+def process_student_image(student_id, key):
+    """Background job: normalize an upload and record its variants"""
+    try:
+        with upload_storage.open(key) as source:
+            rendered = images.render_variants(source)
+        sizes, files = {}, {}
+        original_key, sizes[original_key] = upload_storage.save_bytes(*rendered['original'])
+        files[original_key] = rendered['original']
+        thumbnails = {}
+        for size, (data, extension) in rendered['thumbnails'].items():
+            thumbnails[size], sizes[thumbnails[size]] = upload_storage.save_bytes(data, extension)
+            files[thumbnails[size]] = (data, extension)
+    except Exception as e:
+        # Not an image Pillow can read; keep serving the upload as-is
+        print(f"Image processing error for {key}: {e}")
+        return
+    
+    variants = {'original': original_key, 'thumbnails': thumbnails}
+    
+    def record_variants(conn):
+        # Only record the variants if the photo wasn't replaced meanwhile
+        updated = repo.set_image_variants(conn, student_id, original_key, json.dumps(variants), key)
+        for variant_key in set(images.variant_files(variants)):
+            if updated:
+                retain_file(conn, variant_key, sizes[variant_key],
+                            lambda: upload_storage.save_bytes(*files[variant_key]))
+            else:
+                repo.release_blob(conn, variant_key)
+        if updated:
+            # The normalized original replaces the raw upload
+            repo.release_blob(conn, key)
+        return updated
+    
+    try:
+        updated = database.run_write(record_variants)
+    except Exception as e:
+        print(f"Image processing error for {key}: {e}")
+        return
+    
+    if updated:
+        student_changed(student_id)
+
+last_storage_gc = 0.0
+
+def run_storage_gc(grace_seconds=None):
+    """Delete stored files that no student references any more
+    
+    Pass `grace_seconds` when running outside an app context (the
+    background sweep); it defaults to STORAGE_GC_GRACE.
+    """
+    if grace_seconds is None:
+        grace_seconds = current_app.config['STORAGE_GC_GRACE']
+    conn = get_connection()
+    try:
+        return storage.collect_garbage(upload_storage, repo, conn, database.run_write, grace_seconds)
+    except Exception as e:
+        print(f"Storage GC error: {e}")
+        return 0
+    finally:
+        conn.close()
+
+def schedule_storage_gc():
+    """Run the storage sweep in the background, at most once per STORAGE_GC_INTERVAL"""
+    global last_storage_gc
+    interval = current_app.config['STORAGE_GC_INTERVAL']
+    if interval and time.monotonic() - last_storage_gc >= interval:
+        last_storage_gc = time.monotonic()
+        image_processor.submit(run_storage_gc, current_app.config['STORAGE_GC_GRACE'])
+
+# Precompressed siblings (photo.svg.br, photo.svg.gz) by preference
+PRECOMPRESSED_ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+@bp.route('/uploads/<path:key>')
+def uploaded_file(key):
+    """Serve an uploaded file with long-lived caching and conditional/Range support
+    
+    Content-addressed keys are immutable, so they get a one-year
+    Cache-Control with the content hash as a strong ETag. Legacy uploads get
+    a short max-age and Werkzeug's mtime/size ETag.
+    """
+    if not isinstance(upload_storage, storage.LocalStorage):
+        abort(404)
+    # Keys reach exists() and the X-Accel-Redirect path as is, so anything
+    # that could leave the upload folder is refused up front
+    if safe_join(upload_storage.root, key) is None:
+        abort(404)
+    
+    immutable = storage.is_content_key(key)
+    max_age = current_app.config['UPLOADS_IMMUTABLE_MAX_AGE'] if immutable else current_app.config['UPLOADS_MAX_AGE']
+    etag = key.rsplit('/', 1)[-1].split('.', 1)[0] if immutable else True
+    
+    if not upload_storage.exists(key):
+        abort(404)
+    mimetype = mimetypes.guess_type(key)[0] or 'application/octet-stream'
+    
+    accel_prefix = current_app.config['UPLOADS_ACCEL_REDIRECT']
+    if accel_prefix:
+        # nginx serves the bytes (and handles Range) from an internal location
+        response = Response(status=200, mimetype=mimetype)
+        response.headers['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + key
+    else:
+        path, encoding = key, None
+        # Encoded bodies can't satisfy byte ranges of the original, so only
+        # use a precompressed file for whole-body requests
+        if 'Range' not in request.headers:
+            for name, suffix in PRECOMPRESSED_ENCODINGS:
+                if request.accept_encodings[name] and upload_storage.exists(key + suffix):
+                    path, encoding = key + suffix, name
+                    break
+        response = send_from_directory(upload_storage.root, path, mimetype=mimetype, conditional=True,
+                                       etag=f"{etag}-{encoding}" if encoding and immutable else etag,
+                                       max_age=max_age)
+        if encoding:
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+    
+    response.cache_control.public = True
+    response.cache_control.max_age = max_age
+    if immutable:
+        response.cache_control.immutable = True
+        if accel_prefix:
+            response.set_etag(etag)
+    return response
+
+@bp.cli.command('gc-uploads')
+def gc_uploads_command():
+    """Delete uploaded files that are no longer referenced"""
+    print(f"Deleted {run_storage_gc()} unreferenced file(s)")
+
+def queue_image_processing(student_id, filename):
+    if filename and images.PILLOW_AVAILABLE:
+        image_processor.submit(process_student_image, student_id, filename)
+
+# API keys and admission control
+def load_api_keys(config):
+    """{key: name} for API_KEY ('default') and the name:key pairs in API_KEYS"""
+    keys = {config['API_KEY']: 'default'} if config['API_KEY'] else {}
+    for pair in (config['API_KEYS'] or '').split(','):
+        pair = pair.strip()
+        if not pair:
+            continue
+        name, _, key = pair.partition(':')
+        if not name or not key:
+            raise ValueError(f"Invalid API_KEYS entry (expected name:key): {pair!r}")
+        keys[key] = name
+    return keys
+
+# GET endpoints that return whole collections; the change feed, whose
+# requests wait or stream for a long time, gets its own class so it can't
+# starve them. Other GETs are 'read' and other methods 'write'
+LIST_ENDPOINTS = {'main.api_get_students', 'main.api_export_students'}
+FEED_ENDPOINTS = {'main.api_get_student_changes', 'main.api_stream_student_changes'}
+
+def api_route_class(method, endpoint):
+    if method not in ('GET', 'HEAD'):
+        return 'write'
+    if endpoint in FEED_ENDPOINTS:
+        return 'feed'
+    return 'list' if endpoint in LIST_ENDPOINTS else 'read'
+
+def admission_rejected(rejected, route_class, config):
+    """JSON body for a request admission control turned away (also used by asgi.py)"""
+    if config['METRICS_ENABLED']:
+        metrics.metrics.rejected.inc(route_class, rejected.reason)
+    return {'success': False, 'error': str(rejected), 'retry_after': rejected.retry_after}
+
 # API Authentication decorator
 def api_key_required(f):
+    """Check X-API-Key, then admit the request for its key and route class
+    
+    Requests over the key's rate or concurrency limits get a 429, and a
+    503 when the worker's slots for the route class are all taken, both
+    with Retry-After. The concurrency slot is freed on teardown, which for
+    a streamed export or change feed is when the stream ends.
+    """
     @wraps(f)
     def decorated_function(*args, **kwargs):
-        api_key = request.headers.get('X-API-Key')
-        # Simple API key check (in production, store this securely)
-        if api_key != 'your-secret-api-key-123':
+        key_name = api_keys.get(request.headers.get('X-API-Key'))
+        if key_name is None:
             return jsonify({'error': 'Invalid or missing API key'}), 401
+        if admission is None:
+            return f(*args, **kwargs)
+        
+        route_class = api_route_class(request.method, request.endpoint)
+        try:
+            g.admission_release = admission.admit(key_name, route_class)
+        except ratelimit.Rejected as e:
+            response = jsonify(admission_rejected(e, route_class, current_app.config))
+            response.status_code = e.status
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
         return f(*args, **kwargs)
     return decorated_function
 
-@app.route('/template')
+@bp.teardown_app_request
+def release_admission(exception=None):
+    """Free the request's concurrency slot (after the body for stream_with_context responses)"""
+    release = g.pop('admission_release', None)
+    if release is not None:
+        release()
+
+@bp.route('/template')
 def test_template():
     return render_template('test.html')
 
-# Initialize extensions
-bcrypt = Bcrypt(app)
-login_manager = LoginManager(app)
-login_manager.login_view = 'login'
+@bp.cli.command('prune-changes')
+@click.option('--days', type=int, default=None, help='Days of changes to keep (default: CHANGES_RETENTION_DAYS)')
+def prune_changes_command(days):
+    """Delete change log entries older than the retention period
+    
+    Clients polling from before the cutoff get a 410 and resync.
+    """
+    days = current_app.config['CHANGES_RETENTION_DAYS'] if days is None else days
+    before = (datetime.now(timezone.utc) - timedelta(days=days)).strftime('%Y-%m-%d %H:%M:%S')
+    print(f"Deleted {database.run_write(repo.prune_changes, before)} change log entries")
 
-# Initialize database
-print("Initializing database...")
-init_db()
-print("Database initialization complete!")
+@bp.cli.command('db-migrate')
+@click.option('--target', type=int, default=None, help='Stop at this version (default: latest)')
+def db_migrate_command(target):
+    """Apply pending schema migrations"""
+    applied = database.migrate(target)
+    print(f"Applied {len(applied)} migration(s)" if applied else "Database schema is up to date")
+
+@bp.cli.command('db-status')
+def db_status_command():
+    """Show applied and pending schema migrations"""
+    conn = database.connect()
+    try:
+        for version, name, applied_at in migrations.applied(conn):
+            print(f"{version:4d}  applied  {applied_at}  {name}")
+        for migration in migrations.pending(conn):
+            print(f"{migration.version:4d}  pending  {'':19}  {migration.name}")
+    finally:
+        conn.close()
 
 # -------------------- User Class --------------------
 class User(UserMixin):
-    def __init__(self, id, username, password):
+    def __init__(self, id, username, password=None):
         self.id = id
         self.username = username
         self.password = password
 
+def remember_user_in_session(user):
+    """Carry the user's id and username in the (signed) session cookie"""
+    if current_app.config['USER_SESSION_CACHE']:
+        session['_user'] = {'id': user.id, 'username': user.username, 'loaded_at': int(time.time())}
+
+def invalidate_user(user_id):
+    """Drop cached copies of a user after their row changes"""
+    user_cache.delete(str(user_id))
+    payload = session.get('_user')
+    if payload and str(payload['id']) == str(user_id):
+        session.pop('_user', None)
+
 @login_manager.user_loader
 def load_user(user_id):
-    conn = get_connection()
-    user = conn.execute("SELECT * FROM users WHERE id=?", (user_id,)).fetchone()
-    conn.close()
-    if user:
-        return User(user['id'], user['username'], user['password'])
-    return None
+    """Load the lightweight (no password hash) User for a session
+    
+    Tries the signed session payload first, then the user cache, and only
+    then the database. The session payload is re-validated every
+    USER_SESSION_TTL seconds so changes from other workers are picked up.
+    """
+    payload = session.get('_user')
+    if (payload and str(payload['id']) == str(user_id)
+            and time.time() - payload['loaded_at'] < current_app.config['USER_SESSION_TTL']):
+        return User(payload['id'], payload['username'])
+    
+    user = user_cache.get(str(user_id))
+    if user is None:
+        conn = get_connection()
+        row = repo.get_user(conn, user_id)
+        conn.close()
+        if row is None:
+            return None
+        user = {'id': row['id'], 'username': row['username']}
+        user_cache.set(str(user_id), user)
+    
+    user_obj = User(user['id'], user['username'])
+    remember_user_in_session(user_obj)
+    return user_obj
 
 # -------------------- Auth Routes --------------------
-@app.route('/register', methods=['GET', 'POST'])
+@bp.route('/register', methods=['GET', 'POST'])
 def register():
     if request.method == 'POST':
         username = request.form['username']
-        password = bcrypt.generate_password_hash(request.form['password']).decode('utf-8')
+        try:
+            password = hasher.hash(request.form['password'])
+        except HasherBusy:
+            flash("The server is busy. Please try again in a moment.", "danger")
+            return render_template('register.html'), 503
 
-        conn = get_connection()
         try:
-            conn.execute("INSERT INTO users (username, password) VALUES (?, ?)", (username, password))
-            conn.commit()
+            database.run_write(repo.insert_user, username, password)
             flash("Registration successful! Please log in.", "success")
-            return redirect(url_for('login'))
+            return redirect(url_for('main.login'))
         except:
             flash("Username already exists.", "danger")
-        finally:
-            conn.close()
     return render_template('register.html')
 
-@app.route('/login', methods=['GET', 'POST'])
+def rehash_password(user_id, password):
+    """Re-hash a password whose stored cost factor is out of date"""
+    try:
+        database.run_write(repo.update_password, user_id, hasher.hash(password))
+        hasher.record_rehash()
+        invalidate_user(user_id)
+    except Exception as e:
+        # The login itself already succeeded; try again next time
+        print(f"Rehash error: {e}")
+
+@bp.route('/login', methods=['GET', 'POST'])
 def login():
     if request.method == 'POST':
         username = request.form.get('username')
@@ -103,20 +471,26 @@ def login():
             
         conn = get_connection()
         try:
-            user = conn.execute("SELECT * FROM users WHERE username=?", (username,)).fetchone()
+            user = repo.get_user_by_username(conn, username)
             
             if user:
-                if bcrypt.check_password_hash(user['password'], password):
-                    user_obj = User(user['id'], user['username'], user['password'])
+                if hasher.check(user['password'], password):
+                    if hasher.needs_rehash(user['password']):
+                        rehash_password(user['id'], password)
+                    user_obj = User(user['id'], user['username'])
                     login_user(user_obj)
+                    remember_user_in_session(user_obj)
                     next_page = request.args.get('next')
                     flash("Login successful!", "success")
-                    return redirect(next_page or url_for('index'))
+                    return redirect(next_page or url_for('main.index'))
                 else:
                     flash("Invalid username or password.", "danger")
             else:
                 flash("User not found.", "danger")
                 
+        except HasherBusy:
+            flash("The server is busy. Please try again in a moment.", "danger")
+            return render_template('login.html'), 503
         except Exception as e:
             print(f"Login error: {e}")
             flash("An error occurred during login. Please try again.", "danger")
@@ -125,187 +499,805 @@ def login():
             
     return render_template('login.html')
 
-@app.route('/logout')
+@bp.route('/logout')
 @login_required
 def logout():
     logout_user()
+    session.pop('_user', None)
     flash("You have been logged out.", "info")
-    return redirect(url_for('login'))
+    return redirect(url_for('main.login'))
+
+# -------------------- Templates & Render Cache --------------------
+def init_templates(app):
+    """Use precompiled templates when available and preload them outside debug
+    
+    Precompiled modules (`flask compile-templates`) are skipped when
+    templates auto-reload, since they never notice edits to the sources.
+    Preloading happens once, before gunicorn --preload forks the workers.
+    """
+    # The loader that reads template sources, kept for compile-templates
+    # and for the dev server
+    source_loader = app.jinja_env.loader
+    app.extensions['template_source_loader'] = source_loader
+    
+    compiled_dir = app.config['TEMPLATES_COMPILED_DIR']
+    if app.debug or app.config['TEMPLATES_AUTO_RELOAD']:
+        return
+    if os.path.isdir(compiled_dir):
+        app.jinja_env.loader = ChoiceLoader([ModuleLoader(compiled_dir), source_loader])
+    for name in source_loader.list_templates():
+        try:
+            app.jinja_env.get_template(name)
+        except TemplateError as e:
+            print(f"Template error in {name}: {e}")
+
+@bp.cli.command('compile-templates')
+def compile_templates_command():
+    """Precompile templates into TEMPLATES_COMPILED_DIR for production"""
+    compiled_dir = current_app.config['TEMPLATES_COMPILED_DIR']
+    env = current_app.jinja_env.overlay(loader=current_app.extensions['template_source_loader'])
+    env.compile_templates(compiled_dir, zip=None, log_function=print)
+    print(f"Compiled templates into {compiled_dir}")
+
+def bump_render_version():
+    """Start a new data version, making every cached fragment unreachable"""
+    version = os.urandom(8).hex()
+    render_cache.set('version', version)
+    return version
+
+def render_version():
+    """Token for the current student data; changes on every write"""
+    return render_cache.get('version') or bump_render_version()
+
+def render_fragment(template, params, build_context):
+    """Render a template fragment through the render cache
+    
+    Entries are keyed on (template, data version, params). With a shared
+    backend a write in any worker invalidates every worker at once; with
+    the in-process backend other workers catch up within RENDER_CACHE_TTL.
+    `build_context` (and so the database) is only called on a miss.
+    """
+    digest = hashlib.sha1(json.dumps(params, sort_keys=True).encode('utf-8')).hexdigest()
+    key = f"{template}:{render_version()}:{digest}"
+    html = render_cache.get(key)
+    if html is None:
+        html = render_template(template, **build_context())
+        # Don't pin a replica read that may predate our own latest write
+        if not database.recently_written():
+            render_cache.set(key, html)
+    return Markup(html)
+
+# -------------------- Write Hooks --------------------
+def student_changed(student_id, old=None, new=None):
+    """Propagate a committed single-student write to caches and read models
+    
+    Pass `new` for an insert, `old` for a delete and both for an update.
+    """
+    student_cache_sync.evict([student_id])
+    student_stats.record_change(old, new)
+    bump_render_version()
+    database.mark_write()
+    change_notifier.notify()
+
+def students_changed(ids):
+    """Propagate a committed bulk write touching the given student ids"""
+    student_cache_sync.evict(ids)
+    student_stats.invalidate()
+    bump_render_version()
+    database.mark_write()
+    change_notifier.notify()
+
+def conditional_request():
+    """True if the request carries validators a 304 could answer"""
+    return bool(request.if_none_match) or request.if_modified_since is not None
+
+def sync_student_cache(force=False):
+    """Evict students other workers wrote from the in-process student cache
+    
+    Only the 'memory' backend needs it: the change counter is read every
+    CHANGES_POLL_INTERVAL seconds, like the change feed does, and on every
+    conditional request so a 304 is never answered from a stale row.
+    """
+    if not student_cache_sync.due(force):
+        return
+    since = student_cache_sync.version
+    conn = database.get_read_connection()
+    try:
+        pruned_through, latest = repo.change_log_bounds(conn)
+        changes = []
+        if since is not None and since < latest:
+            changes = repo.changes_since(conn, since, student_cache_sync.batch_size)
+    finally:
+        conn.close()
+    student_cache_sync.apply(since, pruned_through, latest, [(seq, student_id) for seq, student_id, _ in changes])
+
+def get_student(id):
+    """Fetch one student by id through the read-through cache
+    
+    Returns a dict, or None if the student doesn't exist (misses are not
+    cached, so a student created elsewhere shows up immediately).
+    """
+    sync_student_cache(force=conditional_request())
+    student = student_cache.get(id)
+    if student is None:
+        generation = student_cache_sync.generation
+        conn = database.get_read_connection()
+        row = repo.get(conn, id)
+        conn.close()
+        if row is None:
+            return None
+        student = row.as_dict()
+        # A replica may not have caught up with a write we just made
+        if not (conn.replica and database.recently_written()):
+            student_cache_sync.store(id, student, generation)
+    return student
+
+def insert_student(conn, name, age, city, image=None, image_size=0, restore=None):
+    """Insert a student (and its image reference); run through database.run_write()
+    
+    `image`, `image_size` and `restore` come from store_upload().
+    """
+    student_id = repo.insert(conn, name, age, city, image)
+    if image:
+        retain_file(conn, image, image_size, restore)
+    return student_id
+
+def edit_student_row(conn, id, name, age, city, image=None, image_size=0, restore=None):
+    """Apply the edit form, swapping image references when a new photo was
+    uploaded; run through database.run_write()
+    
+    Returns the student as it was before, or None if there is no such
+    student (nothing is written then).
+    """
+    student = repo.get(conn, id)
+    if student is None:
+        return None
+    image_filename = image or student['image']
+    variants = None if image else student['image_variants']
+    repo.update(conn, id, name, age, city, image_filename, variants)
+    if image:
+        # Swap references to the old image (and its thumbnails) for the new one
+        retain_file(conn, image, image_size, restore)
+        release_student_images(conn, student)
+    return student
+
+def update_student_row(conn, id, data):
+    """Apply an API update; run through database.run_write()
+    
+    Returns (student as it was before, name, age, city), or None if there
+    is no such student.
+    """
+    student = repo.get(conn, id)
+    if student is None:
+        return None
+    name = data.get('name', student['name'])
+    age = data.get('age', student['age'])
+    city = data.get('city', student['city'])
+    repo.update_details(conn, id, name, age, city)
+    return student, name, age, city
+
+def delete_student_row(conn, id):
+    """Delete a student and release its images; run through database.run_write()
+    
+    Returns the deleted student, or None if there was none.
+    """
+    student = repo.get(conn, id)
+    if student is not None:
+        # Image files are deleted later by the storage sweep
+        release_student_images(conn, student)
+        repo.delete(conn, id)
+    return student
+
+# -------------------- Dashboard Search --------------------
+INDEX_PER_PAGE = 25
+INDEX_MAX_PER_PAGE = 100
+INDEX_COLUMNS = ('id', 'name', 'age', 'city', 'image', 'image_variants')
+
+def current_stats():
+    """Student aggregates, recomputed first if they are stale"""
+    if student_stats.is_stale():
+        conn = database.get_read_connection()
+        student_stats.recompute(repo.totals(conn), repo.city_counts(conn))
+        conn.close()
+    return student_stats.snapshot()
 
 # -------------------- Student Routes --------------------
-@app.route('/')
+@bp.route('/')
 @login_required
 def index():
-    conn = get_connection()
-    students = conn.execute("SELECT * FROM students").fetchall()
+    """Dashboard: one page of students, optionally searched and sorted"""
+    q = request.args.get('q', '').strip()
+    sort = request.args.get('sort', 'id')
+    if sort not in repository.SORT_COLUMNS:
+        sort = 'id'
+    order = 'desc' if request.args.get('order') == 'desc' else 'asc'
+    try:
+        page = int_arg(request.args, 'page', 1, minimum=1)
+        per_page = int_arg(request.args, 'per_page', INDEX_PER_PAGE, minimum=1, maximum=INDEX_MAX_PER_PAGE)
+    except QueryError:
+        page, per_page = 1, INDEX_PER_PAGE
+    
+    params = {'q': q, 'sort': sort, 'order': order, 'page': page, 'per_page': per_page}
+    students_table = render_fragment('_students_table.html', params,
+                                     lambda: students_page(q, sort, order, page, per_page))
+    return render_template('index.html', students_table=students_table, user=current_user.username,
+                           q=q, sort=sort, order=order)
+
+def students_page(q, sort, order, page, per_page):
+    """Query one dashboard page; the template context for _students_table.html"""
+    conn = database.get_read_connection()
+    if q:
+        where, params = repo.search_clause(database.get_search_backend(conn), q)
+        total = repo.count_matching(conn, where, params)
+    else:
+        # Unfiltered totals come from the in-memory stats, not a COUNT(*)
+        where, params = None, []
+        total = current_stats()[0]['total_students']
+    
+    pages = max(1, -(-total // per_page))
+    page = min(page, pages)
+    
+    students = repo.page(conn, INDEX_COLUMNS, where, params, sort, order, per_page, (page - 1) * per_page)
     conn.close()
-    return render_template('index.html', students=students, user=current_user.username)
+    
+    return dict(students=students, total=total, page=page, pages=pages, per_page=per_page,
+                q=q, sort=sort, order=order)
+
+def form_age(value):
+    """The age form field as an int, or None if left blank; ValueError if it isn't a whole number"""
+    value = value.strip()
+    return int(value) if value else None
 
-@app.route('/add', methods=['GET', 'POST'])
+@bp.route('/add', methods=['GET', 'POST'])
 @login_required
 def add_student():
     if request.method == 'POST':
         name = request.form['name']
-        age = request.form['age']
         city = request.form['city']
+        try:
+            age = form_age(request.form['age'])
+        except ValueError:
+            flash("Age must be a whole number.", "danger")
+            return redirect(url_for('main.add_student'))
         
         # Handle file upload
-        image_filename = None
+        image_filename, image_size, restore = None, 0, None
         if 'image' in request.files:
             file = request.files['image']
             if file and file.filename != '' and allowed_file(file.filename):
-                filename = secure_filename(file.filename)
-                # Create unique filename
-                import time
-                unique_filename = f"{int(time.time())}_{filename}"
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], unique_filename))
-                image_filename = unique_filename
+                image_filename, image_size, restore = store_upload(file)
         
-        conn = get_connection()
-        conn.execute("INSERT INTO students (name, age, city, image) VALUES (?, ?, ?, ?)", 
-                     (name, age, city, image_filename))
-        conn.commit()
-        conn.close()
+        student_id = database.run_write(insert_student, name, age, city, image_filename, image_size, restore)
+        student_changed(student_id, new={'age': age, 'city': city})
+        queue_image_processing(student_id, image_filename)
         flash("Student added successfully!", "success")
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     return render_template('add.html')
 
-@app.route('/edit/<int:id>', methods=['GET', 'POST'])
+@bp.route('/edit/<int:id>', methods=['GET', 'POST'])
 @login_required
 def edit_student(id):
-    conn = get_connection()
-    
     if request.method == 'POST':
         name = request.form['name']
-        age = request.form['age']
         city = request.form['city']
-        
-        # Get current student data
-        student = conn.execute("SELECT * FROM students WHERE id=?", (id,)).fetchone()
-        current_image = student['image'] if student else None
+        try:
+            age = form_age(request.form['age'])
+        except ValueError:
+            flash("Age must be a whole number.", "danger")
+            return redirect(url_for('main.edit_student', id=id))
         
         # Handle file upload
-        image_filename = current_image
+        image_filename, image_size, restore = None, 0, None
         if 'image' in request.files:
             file = request.files['image']
             if file and file.filename != '' and allowed_file(file.filename):
-                # Delete old image if exists
-                if current_image:
-                    old_image_path = os.path.join(app.config['UPLOAD_FOLDER'], current_image)
-                    if os.path.exists(old_image_path):
-                        os.remove(old_image_path)
-                
                 # Save new image
-                filename = secure_filename(file.filename)
-                import time
-                unique_filename = f"{int(time.time())}_{filename}"
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], unique_filename))
-                image_filename = unique_filename
+                image_filename, image_size, restore = store_upload(file)
         
-        conn.execute("UPDATE students SET name=?, age=?, city=?, image=? WHERE id=?", 
-                     (name, age, city, image_filename, id))
-        conn.commit()
-        conn.close()
+        student = database.run_write(edit_student_row, id, name, age, city, image_filename, image_size,
+                                     restore)
+        if student is None:
+            flash("Student not found.", "danger")
+            return redirect(url_for('main.index'))
+        student_changed(id, old=student, new={'age': age, 'city': city})
+        if image_filename:
+            if student_image_keys(student):
+                schedule_storage_gc()
+            queue_image_processing(id, image_filename)
         flash("Student updated successfully!", "success")
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
     # GET request - fetch student data
-    student = conn.execute("SELECT * FROM students WHERE id=?", (id,)).fetchone()
-    conn.close()
+    student = get_student(id)
     
     if student is None:
         flash("Student not found.", "danger")
-        return redirect(url_for('index'))
+        return redirect(url_for('main.index'))
     
-    return render_template('edit.html', student=student)
+    edit_form = render_fragment('_edit_form.html', {'id': id}, lambda: {'student': student})
+    return render_template('edit.html', edit_form=edit_form)
 
-@app.route('/delete/<int:id>', methods=['POST'])
+@bp.route('/delete/<int:id>', methods=['POST'])
 @login_required
 def delete_student(id):
-    conn = get_connection()
     try:
-        student = conn.execute("SELECT * FROM students WHERE id=?", (id,)).fetchone()
+        student = database.run_write(delete_student_row, id)
         
         if student is None:
             flash("Student not found.", "danger")
         else:
-            # Delete image file if exists
-            if student['image']:
-                image_path = os.path.join(app.config['UPLOAD_FOLDER'], student['image'])
-                if os.path.exists(image_path):
-                    os.remove(image_path)
-            
-            conn.execute("DELETE FROM students WHERE id=?", (id,))
-            conn.commit()
+            student_changed(id, old=student)
+            if student_image_keys(student):
+                schedule_storage_gc()
             flash("Student deleted successfully!", "success")
     except Exception as e:
         print(f"Delete error: {e}")
         flash("An error occurred while deleting the student.", "danger")
-    finally:
-        conn.close()
     
-    return redirect(url_for('index'))
+    return redirect(url_for('main.index'))
+
+# -------------------- API Query Helpers --------------------
+API_DEFAULT_LIMIT = 100
+API_MAX_LIMIT = 1000
+# image_url in API responses points at this thumbnail size
+API_IMAGE_SIZE = 256
+
+# Public field name -> column(s) it needs
+STUDENT_FIELDS = {
+    'id': ('id',),
+    'name': ('name',),
+    'age': ('age',),
+    'city': ('city',),
+    'image': ('image',),
+    'image_url': ('image', 'image_variants'),
+    'created_at': ('created_at',),
+    'updated_at': ('updated_at',),
+}
+
+class QueryError(ValueError):
+    """Invalid query string parameter (reported as HTTP 400)"""
+
+def int_arg(args, name, default=None, minimum=None, maximum=None):
+    """Read an integer query parameter, raising QueryError if malformed"""
+    value = args.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise QueryError(f"'{name}' must be an integer")
+    if minimum is not None and value < minimum:
+        raise QueryError(f"'{name}' must be >= {minimum}")
+    if maximum is not None and value > maximum:
+        raise QueryError(f"'{name}' must be <= {maximum}")
+    return value
+
+def parse_student_filters(args):
+    """Read the city/age/name filters of the student API
+    
+    Returns keyword arguments for StudentRepository.filter_clauses().
+    """
+    return {
+        'city': args.get('city') or None,
+        'min_age': int_arg(args, 'min_age'),
+        'max_age': int_arg(args, 'max_age'),
+        'name_prefix': args.get('name') or None,
+    }
+
+def parse_student_fields(args):
+    """Parse the fields= projection, defaulting to every field"""
+    fields = args.get('fields')
+    if not fields:
+        return list(STUDENT_FIELDS)
+    fields = [f.strip() for f in fields.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in STUDENT_FIELDS]
+    if unknown:
+        raise QueryError(f"Unknown field(s): {', '.join(unknown)}")
+    return fields
+
+def student_columns(fields):
+    """Columns to SELECT for a projection (id is always needed for the cursor)"""
+    columns = ['id']
+    for field in fields:
+        for column in STUDENT_FIELDS[field]:
+            if column not in columns:
+                columns.append(column)
+    return columns
+
+STUDENT_COMPUTED_FIELDS = {
+    'image_url': lambda student: student_image_url(student, API_IMAGE_SIZE, external=True),
+}
+
+@lru_cache(maxsize=256)
+def _student_serializer(fields):
+    return repository.make_serializer(fields, STUDENT_COMPUTED_FIELDS)
+
+def student_serializer(fields):
+    """serialize(rows) -> API dicts limited to `fields`, one pass per row
+    
+    Built once per field list, so its generated loops are reused.
+    """
+    return _student_serializer(tuple(fields))
+
+def serialize_student(student, fields):
+    """Build the API representation of one student row, limited to `fields`"""
+    return student_serializer(fields)([student])[0]
+
+def student_list_query(args):
+    """SQL for one page of GET /api/students: (query, params, limit, fields)
+    
+    Raises QueryError for malformed parameters. Shared with the async API
+    (asgi.py) so both serve the same contract. The query uses `?`
+    placeholders (see StudentRepository.sql()).
+    """
+    limit = int_arg(args, 'limit', API_DEFAULT_LIMIT, minimum=1, maximum=API_MAX_LIMIT)
+    filters = parse_student_filters(args)
+    filters['after_id'] = int_arg(args, 'cursor')
+    fields = parse_student_fields(args)
+    # Fetch one extra row to know whether another page exists
+    query, params = repo.list_query(student_columns(fields), filters, limit + 1)
+    return query, params, limit, fields
+
+def student_list_payload(students, limit, fields, args):
+    """Response body for a page fetched with student_list_query()"""
+    has_more = len(students) > limit
+    students = students[:limit]
+    students_list = student_serializer(fields)(students)
+    
+    next_cursor = students[-1]['id'] if has_more else None
+    next_url = None
+    if next_cursor is not None:
+        next_args = args.to_dict()
+        next_args['cursor'] = next_cursor
+        next_url = url_for('main.api_get_students', _external=True, **next_args)
+    
+    return {
+        'success': True,
+        'count': len(students_list),
+        'data': students_list,
+        'next_cursor': next_cursor,
+        'next': next_url
+    }
+
+# -------------------- Conditional GET --------------------
+def utc_timestamp(value):
+    """A stored timestamp as an aware UTC datetime, to the second
+    
+    SQLite returns timestamps as text; both databases store UTC.
+    """
+    if not value:
+        return None
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc).replace(microsecond=0)
+
+def student_validators(student):
+    """(etag, last_modified) for one student row
+    
+    Rows last written before change tracking have no updated_at, so their
+    created_at stands in.
+    """
+    etag = f"student-{student['id']}-{student.get('version') or 0}"
+    return etag, utc_timestamp(student.get('updated_at') or student.get('created_at'))
+
+def list_validators(version, updated_at):
+    """(etag, last_modified) for every student list, from the change counter
+    
+    Read the counter before the rows: a write landing in between then
+    makes the page newer than its ETag, which only costs one extra 200.
+    """
+    return f"students-{version}", utc_timestamp(updated_at)
+
+def validator_headers(etag, last_modified):
+    headers = {'ETag': quote_etag(etag), 'Cache-Control': 'no-cache'}
+    if last_modified is not None:
+        headers['Last-Modified'] = http_date(last_modified)
+    return headers
+
+def matched_etag(etag, last_modified):
+    """The tag to answer 304 with if the request's validators are current, else None
+    
+    If-None-Match wins over If-Modified-Since (RFC 9110). Compressed
+    responses carry `<etag>-gzip`/`-br` tags (encoding.py), which match
+    too, so the 304 echoes the tag the client holds.
+    """
+    if_none_match = request.if_none_match
+    if if_none_match:
+        return next((tag for tag in encoding.etag_variants(etag) if if_none_match.contains_weak(tag)), None)
+    since = request.if_modified_since
+    if since is not None and last_modified is not None and last_modified <= since:
+        return etag
+    return None
+
+def not_modified(etag, last_modified):
+    """A 304 response if the client's copy is current, else None"""
+    tag = matched_etag(etag, last_modified)
+    if tag is None:
+        return None
+    return Response(status=304, headers=validator_headers(tag, last_modified))
+
+def with_validators(response, etag, last_modified):
+    response.headers.update(validator_headers(etag, last_modified))
+    return response
 
 # -------------------- API Routes --------------------
-@app.route('/api/students', methods=['GET'])
+@bp.route('/api/students', methods=['GET'])
 @api_key_required
 def api_get_students():
-    """Get all students"""
+    """Get students, one keyset-paginated page at a time
+    
+    Query parameters: limit, cursor (id of the last student on the previous
+    page), city, min_age, max_age, name (prefix) and fields (comma-separated).
+    Pollers sending If-None-Match / If-Modified-Since get a 304 until a
+    student is written.
+    """
     try:
-        conn = get_connection()
-        students = conn.execute("SELECT * FROM students").fetchall()
+        query, params, limit, fields = student_list_query(request.args)
+    except QueryError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    try:
+        conn = database.get_read_connection()
+        # Every page changes with the change counter, so an unchanged
+        # counter answers 304 before any student row is read
+        etag, last_modified = list_validators(*repo.change_version(conn))
+        response = not_modified(etag, last_modified)
+        if response is None:
+            students = repo.fetch(conn, query, params)
+            response = with_validators(jsonify(student_list_payload(students, limit, fields, request.args)),
+                                       etag, last_modified)
         conn.close()
-        
-        students_list = []
-        for student in students:
-            students_list.append({
-                'id': student['id'],
-                'name': student['name'],
-                'age': student['age'],
-                'city': student['city'],
-                'image': student['image'],
-                'image_url': url_for('static', filename=f"uploads/{student['image']}", _external=True) if student['image'] else None,
-                'created_at': student['created_at']
-            })
-        
+        return response
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+
+EXPORT_BATCH_SIZE = 1000
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+def export_chunks(rows, fields, fmt):
+    """Encode rows as NDJSON lines or CSV, one chunk per batch"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if fmt == 'csv' else None
+    if writer:
+        writer.writerow(fields)
+    
+    serialize = student_serializer(fields)
+    pending = 0
+    for row in rows:
+        data = serialize([row])[0]
+        if writer:
+            writer.writerow([data[field] for field in fields])
+        else:
+            buffer.write(json.dumps(data, default=str))
+            buffer.write("\n")
+        pending += 1
+        if pending >= EXPORT_BATCH_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+    
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def gzip_chunks(chunks):
+    """Gzip a stream of text chunks incrementally"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits=31 -> gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+@bp.route('/api/students/export', methods=['GET'])
+@api_key_required
+def api_export_students():
+    """Stream every matching student as NDJSON or CSV
+    
+    Accepts the same filters and fields= projection as GET /api/students.
+    Rows are read from a server-side cursor and encoded batch by batch, so
+    memory use does not grow with the size of the table.
+    """
+    fmt = request.args.get('format', 'ndjson')
+    if fmt not in EXPORT_FORMATS:
+        return jsonify({'success': False, 'error': f"'format' must be one of: {', '.join(EXPORT_FORMATS)}"}), 400
+    try:
+        fields = parse_student_fields(request.args)
+        filters = parse_student_filters(request.args)
+    except QueryError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    def generate():
+        conn = database.get_read_connection()
+        rows = repo.iter_students(conn, student_columns(fields), filters, batch_size=EXPORT_BATCH_SIZE)
+        yield from export_chunks(rows, fields, fmt)
+    
+    chunks = generate()
+    headers = {
+        'Content-Disposition': f'attachment; filename=students.{fmt}',
+        'Vary': 'Accept-Encoding'
+    }
+    if request.accept_encodings['gzip']:
+        chunks = gzip_chunks(chunks)
+        headers['Content-Encoding'] = 'gzip'
+    
+    return Response(stream_with_context(chunks), mimetype=EXPORT_FORMATS[fmt], headers=headers)
+
+# -------------------- Change Feed --------------------
+def student_changes(conn, since, limit, fields):
+    """One page of the change feed after `since`: (changes, next_since, has_more)
+    
+    The page is compacted per student: only its latest change is sent,
+    as an upsert with the student's current data or, when the student no
+    longer exists, a tombstone. Applying pages in order mirrors the table.
+    """
+    entries = repo.changes_since(conn, since, limit + 1)
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+    if not entries:
+        return [], since, False
+    
+    latest = {}
+    for seq, student_id, op in entries:
+        latest.pop(student_id, None)
+        latest[student_id] = (seq, op)
+    rows = repo.get_many(conn, [student_id for student_id, (_, op) in latest.items() if op != 'delete'])
+    data = dict(zip(rows, student_serializer(fields)(list(rows.values()))))
+    
+    changes = []
+    for student_id, (seq, _) in latest.items():
+        if student_id in data:
+            changes.append({'seq': seq, 'op': 'upsert', 'id': student_id, 'data': data[student_id]})
+        else:
+            changes.append({'seq': seq, 'op': 'delete', 'id': student_id})
+    return changes, entries[-1]['seq'], has_more
+
+def read_change_version():
+    """The current change counter, without keeping a pooled connection"""
+    conn = database.get_read_connection()
+    try:
+        return repo.change_version(conn)['version']
+    finally:
+        database.release_connection()
+
+def wait_for_changes(since, timeout):
+    """Block until a student changes after `since` (or `timeout` passes); returns the version"""
+    return change_notifier.wait(since, timeout, read_change_version)
+
+def changes_gone(pruned_through, latest):
+    """410 for a `since` older than the pruned part of the change log"""
+    return jsonify({
+        'success': False,
+        'error': f"Changes up to {pruned_through} have been pruned; resync from /api/students",
+        'latest': latest
+    }), 410
+
+def parse_change_args(args, since=None):
+    """(since, limit, fields) for the change feed; raises QueryError"""
+    since = int_arg({'since': since} if since else args, 'since', 0, minimum=0)
+    limit = int_arg(args, 'limit', API_DEFAULT_LIMIT, minimum=1, maximum=API_MAX_LIMIT)
+    return since, limit, parse_student_fields(args)
+
+@bp.route('/api/students/changes', methods=['GET'])
+@api_key_required
+def api_get_student_changes():
+    """Student changes after a sequence number, for mirroring the table
+    
+    Query parameters: since (next_since from the previous page, 0 for the
+    whole log), limit, fields and wait (seconds to long-poll when there is
+    nothing new, up to CHANGES_MAX_WAIT). To bootstrap a mirror, note
+    `latest`, copy GET /api/students, then follow changes since `latest`.
+    """
+    try:
+        since, limit, fields = parse_change_args(request.args)
+        wait = int_arg(request.args, 'wait', 0, minimum=0, maximum=current_app.config['CHANGES_MAX_WAIT'])
+    except QueryError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    try:
+        conn = database.get_read_connection()
+        pruned_through, latest = repo.change_log_bounds(conn)
+        if since < pruned_through:
+            return changes_gone(pruned_through, latest)
+        changes, next_since, has_more = student_changes(conn, since, limit, fields)
+        if not changes and wait:
+            # Don't hold a pooled connection while waiting
+            database.release_connection()
+            if wait_for_changes(since, wait) > since:
+                conn = database.get_read_connection()
+                changes, next_since, has_more = student_changes(conn, since, limit, fields)
         return jsonify({
             'success': True,
-            'count': len(students_list),
-            'data': students_list
+            'changes': changes,
+            'next_since': next_since,
+            'has_more': has_more,
+            'latest': max(latest, next_since)
         }), 200
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/students/<int:id>', methods=['GET'])
+@bp.route('/api/students/changes/stream', methods=['GET'])
+@api_key_required
+def api_stream_student_changes():
+    """The change feed as server-sent events, one `change` event per change
+    
+    Event ids are sequence numbers, so a reconnecting EventSource resumes
+    from its Last-Event-ID (or pass since=). While idle a comment is sent
+    every CHANGES_HEARTBEAT seconds. Each stream holds a worker thread,
+    so it ends after CHANGES_STREAM_MAX_SECONDS and the client reconnects.
+    """
+    try:
+        since, limit, fields = parse_change_args(request.args, request.headers.get('Last-Event-ID'))
+    except QueryError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    try:
+        pruned_through, latest = repo.change_log_bounds(database.get_read_connection())
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        database.release_connection()
+    if since < pruned_through:
+        return changes_gone(pruned_through, latest)
+    
+    config = current_app.config
+    
+    def events(since):
+        deadline = time.monotonic() + config['CHANGES_STREAM_MAX_SECONDS']
+        yield f"retry: {int(config['CHANGES_POLL_INTERVAL'] * 1000)}\n\n"
+        while time.monotonic() < deadline:
+            conn = database.get_read_connection()
+            changes, since, has_more = student_changes(conn, since, limit, fields)
+            database.release_connection()
+            for change in changes:
+                yield f"id: {change['seq']}\nevent: change\ndata: {current_app.json.dumps(change)}\n\n"
+            if has_more:
+                continue
+            timeout = min(config['CHANGES_HEARTBEAT'], deadline - time.monotonic())
+            if timeout > 0 and wait_for_changes(since, timeout) <= since:
+                yield ": keepalive\n\n"
+    
+    response = Response(stream_with_context(events(since)), mimetype='text/event-stream')
+    response.cache_control.no_cache = True
+    # Stop nginx from buffering the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+@bp.route('/api/students/<int:id>', methods=['GET'])
 @api_key_required
 def api_get_student(id):
-    """Get a single student by ID"""
+    """Get a single student by ID
+    
+    The ETag is the row's version and Last-Modified its updated_at, so a
+    cached student is revalidated without reading its row (an in-process
+    cache first checks the change counter; see sync_student_cache()).
+    """
     try:
-        conn = get_connection()
-        student = conn.execute("SELECT * FROM students WHERE id=?", (id,)).fetchone()
-        conn.close()
+        student = get_student(id)
         
         if student is None:
             return jsonify({'success': False, 'error': 'Student not found'}), 404
         
-        student_data = {
-            'id': student['id'],
-            'name': student['name'],
-            'age': student['age'],
-            'city': student['city'],
-            'image': student['image'],
-            'image_url': url_for('static', filename=f"uploads/{student['image']}", _external=True) if student['image'] else None,
-            'created_at': student['created_at']
-        }
+        etag, last_modified = student_validators(student)
+        response = not_modified(etag, last_modified)
+        if response is not None:
+            return response
         
-        return jsonify({
+        student_data = serialize_student(student, list(STUDENT_FIELDS))
+        
+        return with_validators(jsonify({
             'success': True,
             'data': student_data
-        }), 200
+        }), etag, last_modified)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/students', methods=['POST'])
+@bp.route('/api/students', methods=['POST'])
 @api_key_required
 def api_create_student():
     """Create a new student"""
@@ -319,14 +1311,8 @@ def api_create_student():
         age = data.get('age')
         city = data.get('city')
         
-        conn = get_connection()
-        cursor = conn.execute(
-            "INSERT INTO students (name, age, city) VALUES (?, ?, ?)",
-            (name, age, city)
-        )
-        student_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
+        student_id = database.run_write(insert_student, name, age, city)
+        student_changed(student_id, new={'age': age, 'city': city})
         
         return jsonify({
             'success': True,
@@ -341,7 +1327,7 @@ def api_create_student():
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/students/<int:id>', methods=['PUT'])
+@bp.route('/api/students/<int:id>', methods=['PUT'])
 @api_key_required
 def api_update_student(id):
     """Update a student"""
@@ -351,23 +1337,13 @@ def api_update_student(id):
         if not data:
             return jsonify({'success': False, 'error': 'No data provided'}), 400
         
-        conn = get_connection()
-        student = conn.execute("SELECT * FROM students WHERE id=?", (id,)).fetchone()
+        updated = database.run_write(update_student_row, id, data)
         
-        if student is None:
-            conn.close()
+        if updated is None:
             return jsonify({'success': False, 'error': 'Student not found'}), 404
         
-        name = data.get('name', student['name'])
-        age = data.get('age', student['age'])
-        city = data.get('city', student['city'])
-        
-        conn.execute(
-            "UPDATE students SET name=?, age=?, city=? WHERE id=?",
-            (name, age, city, id)
-        )
-        conn.commit()
-        conn.close()
+        student, name, age, city = updated
+        student_changed(id, old=student, new={'age': age, 'city': city})
         
         return jsonify({
             'success': True,
@@ -382,27 +1358,19 @@ def api_update_student(id):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/students/<int:id>', methods=['DELETE'])
+@bp.route('/api/students/<int:id>', methods=['DELETE'])
 @api_key_required
 def api_delete_student(id):
     """Delete a student"""
     try:
-        conn = get_connection()
-        student = conn.execute("SELECT * FROM students WHERE id=?", (id,)).fetchone()
+        student = database.run_write(delete_student_row, id)
         
         if student is None:
-            conn.close()
             return jsonify({'success': False, 'error': 'Student not found'}), 404
         
-        # Delete image file if exists
-        if student['image']:
-            image_path = os.path.join(app.config['UPLOAD_FOLDER'], student['image'])
-            if os.path.exists(image_path):
-                os.remove(image_path)
-        
-        conn.execute("DELETE FROM students WHERE id=?", (id,))
-        conn.commit()
-        conn.close()
+        student_changed(id, old=student)
+        if student_image_keys(student):
+            schedule_storage_gc()
         
         return jsonify({
             'success': True,
@@ -411,44 +1379,312 @@ def api_delete_student(id):
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/stats', methods=['GET'])
+# -------------------- Bulk API --------------------
+BULK_MAX_CHUNK_SIZE = 5000
+STUDENT_WRITABLE_FIELDS = ('name', 'age', 'city')
+
+class BulkError(Exception):
+    """A bulk request that cannot be processed at all (reported as HTTP 400)"""
+
+class BulkRollback(Exception):
+    """Raised inside an atomic bulk write to roll it back, carrying the item errors"""
+    
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} item(s) failed")
+        self.errors = errors
+
+def read_bulk_items():
+    """Read bulk items from a JSON array, {"items": [...]} or an NDJSON body"""
+    if request.mimetype in ('application/x-ndjson', 'application/jsonlines'):
+        items = []
+        for number, line in enumerate(request.get_data(as_text=True).splitlines(), start=1):
+            if line.strip():
+                try:
+                    items.append(json.loads(line))
+                except ValueError:
+                    raise BulkError(f"Invalid JSON on line {number}")
+    else:
+        data = request.get_json(silent=True)
+        items = data.get('items') if isinstance(data, dict) else data
+    
+    if not isinstance(items, list) or not items:
+        raise BulkError('Expected a non-empty JSON array, {"items": [...]} or NDJSON body')
+    if len(items) > current_app.config['BULK_MAX_ITEMS']:
+        raise BulkError(f"At most {current_app.config['BULK_MAX_ITEMS']} items per request")
+    return items
+
+def bulk_options():
+    """Read the atomic and chunk_size query parameters"""
+    atomic = request.args.get('atomic', 'false').lower() in ('1', 'true', 'yes')
+    try:
+        chunk_size = int_arg(request.args, 'chunk_size', current_app.config['BULK_CHUNK_SIZE'],
+                             minimum=1, maximum=BULK_MAX_CHUNK_SIZE)
+    except QueryError as e:
+        raise BulkError(str(e))
+    return atomic, chunk_size
+
+def validate_student_item(item, require_name=False, require_id=False):
+    """Validate one bulk item, returning an error message or None"""
+    if not isinstance(item, dict):
+        return 'Item must be an object'
+    if require_id and not (isinstance(item.get('id'), int) and not isinstance(item.get('id'), bool)):
+        return 'id is required and must be an integer'
+    if require_name and not item.get('name'):
+        return 'Name is required'
+    if 'name' in item and not (isinstance(item['name'], str) and item['name']):
+        return 'name must be a non-empty string'
+    if 'age' in item and item['age'] is not None and (not isinstance(item['age'], int) or isinstance(item['age'], bool)):
+        return 'age must be an integer or null'
+    if 'city' in item and item['city'] is not None and not isinstance(item['city'], str):
+        return 'city must be a string or null'
+    if not require_name and not any(field in item for field in STUDENT_WRITABLE_FIELDS):
+        return 'No fields to update'
+    return None
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def apply_bulk(chunks, apply_chunk, atomic):
+    """Run apply_chunk over each chunk of (index, item) pairs
+    
+    apply_chunk(conn, chunk) performs the writes and returns
+    (results, errors) lists; it runs through database.run_write(). In
+    atomic mode everything is one write and the first error rolls it all
+    back. Otherwise each chunk commits on its own, and a chunk that fails
+    at the database level is retried item by item so only the offending
+    items are reported.
+    """
+    if atomic:
+        def apply_all(conn):
+            results = []
+            for chunk in chunks:
+                chunk_results, chunk_errors = apply_chunk(conn, chunk)
+                if chunk_errors:
+                    raise BulkRollback(chunk_errors)
+                results.extend(chunk_results)
+            return results
+        
+        try:
+            return database.run_write(apply_all), []
+        except BulkRollback as e:
+            return [], e.errors
+        except Exception as e:
+            return [], [{'index': None, 'error': str(e)}]
+    
+    results, errors = [], []
+    for chunk in chunks:
+        try:
+            chunk_results, chunk_errors = database.run_write(apply_chunk, chunk)
+        except Exception:
+            chunk_results, chunk_errors = [], []
+            for pair in chunk:
+                try:
+                    item_results, item_errors = database.run_write(apply_chunk, [pair])
+                except Exception as item_error:
+                    item_results, item_errors = [], [{'index': pair[0], 'error': str(item_error)}]
+                chunk_results.extend(item_results)
+                chunk_errors.extend(item_errors)
+        results.extend(chunk_results)
+        errors.extend(chunk_errors)
+    return results, errors
+
+def bulk_response(action, total, results, errors, atomic, success_status=200):
+    """Build the per-item response for a bulk request"""
+    if errors:
+        status = 422 if atomic else 207
+    else:
+        status = success_status
+    return jsonify({
+        'success': not errors,
+        'atomic': atomic,
+        'total': total,
+        action: len(results),
+        'failed': total - len(results),
+        'results': results,
+        'errors': errors
+    }), status
+
+def run_bulk(validate, apply_chunk, action, success_status=200):
+    """Shared driver for the bulk endpoints"""
+    try:
+        items = read_bulk_items()
+        atomic, chunk_size = bulk_options()
+    except BulkError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    valid, errors = [], []
+    for index, item in enumerate(items):
+        error = validate(item)
+        if error:
+            errors.append({'index': index, 'error': error})
+        else:
+            valid.append((index, item))
+    
+    if errors and atomic:
+        return bulk_response(action, len(items), [], errors, atomic, success_status)
+    
+    try:
+        results, apply_errors = apply_bulk(chunked(valid, chunk_size), apply_chunk, atomic)
+        if results:
+            students_changed([r['id'] for r in results])
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
+    
+    errors = sorted(errors + apply_errors, key=lambda e: -1 if e['index'] is None else e['index'])
+    return bulk_response(action, len(items), results, errors, atomic, success_status)
+
+def bulk_create_chunk(conn, chunk):
+    rows = [(item['name'], item.get('age'), item.get('city')) for _, item in chunk]
+    ids = repo.insert_many(conn, rows)
+    return [{'index': index, 'id': student_id} for (index, _), student_id in zip(chunk, ids)], []
+
+def bulk_update_chunk(conn, chunk):
+    existing = repo.get_many(conn, {item['id'] for _, item in chunk})
+    results, errors = [], []
+    
+    # Items that set the same columns share one executemany() statement
+    groups = {}
+    for index, item in chunk:
+        if item['id'] not in existing:
+            errors.append({'index': index, 'id': item['id'], 'error': 'Student not found'})
+            continue
+        columns = tuple(field for field in STUDENT_WRITABLE_FIELDS if field in item)
+        groups.setdefault(columns, []).append((index, item))
+    
+    for columns, group in groups.items():
+        repo.update_many(conn, columns,
+                         [tuple(item[column] for column in columns) + (item['id'],) for _, item in group])
+        results.extend({'index': index, 'id': item['id']} for index, item in group)
+    
+    results.sort(key=lambda r: r['index'])
+    return results, errors
+
+def bulk_delete_chunk(conn, chunk):
+    """Delete a chunk's students; only rows the DELETE removed count (and release images)
+    
+    Returns (results, errors, whether any image references were released).
+    """
+    deleted = repo.delete_many(conn, [item['id'] for _, item in chunk])
+    results, errors = [], []
+    for index, item in chunk:
+        if item['id'] in deleted:
+            results.append({'index': index, 'id': item['id']})
+        else:
+            errors.append({'index': index, 'id': item['id'], 'error': 'Student not found'})
+    
+    released = False
+    for student in deleted.values():
+        release_student_images(conn, student)
+        released = released or bool(student_image_keys(student))
+    return results, errors, released
+
+@bp.route('/api/students/bulk', methods=['POST'])
+@api_key_required
+def api_bulk_create_students():
+    """Create many students in batched transactions"""
+    return run_bulk(lambda item: validate_student_item(item, require_name=True),
+                    bulk_create_chunk, 'created', success_status=201)
+
+@bp.route('/api/students/bulk', methods=['PUT'])
+@api_key_required
+def api_bulk_update_students():
+    """Update many students in batched transactions"""
+    return run_bulk(lambda item: validate_student_item(item, require_id=True),
+                    bulk_update_chunk, 'updated')
+
+@bp.route('/api/students/bulk', methods=['DELETE'])
+@api_key_required
+def api_bulk_delete_students():
+    """Delete many students by id (items may be ids or {"id": ...} objects)
+    
+    An id repeated in the request is reported as an error on each repeat.
+    """
+    seen = set()
+    released_images = False
+    
+    def validate(item):
+        student_id = item.get('id') if isinstance(item, dict) else item
+        if not isinstance(student_id, int) or isinstance(student_id, bool):
+            return 'Item must be an id or an object with an integer id'
+        if student_id in seen:
+            return f'Duplicate id {student_id}'
+        seen.add(student_id)
+        return None
+    
+    def apply_chunk(conn, chunk):
+        nonlocal released_images
+        chunk = [(index, item if isinstance(item, dict) else {'id': item}) for index, item in chunk]
+        results, errors, released = bulk_delete_chunk(conn, chunk)
+        released_images = released_images or released
+        return results, errors
+    
+    response = run_bulk(validate, apply_chunk, 'deleted')
+    if released_images:
+        schedule_storage_gc()
+    return response
+
+@bp.route('/api/stats', methods=['GET'])
 @api_key_required
 def api_get_stats():
-    """Get statistics about students"""
+    """Get statistics about students
+    
+    Served from the in-memory aggregates with an ETag and Last-Modified, so
+    pollers that send If-None-Match / If-Modified-Since get a 304.
+    """
     try:
-        conn = get_connection()
+        data, etag, last_modified = current_stats()
+        response = not_modified(etag, last_modified)
+        if response is not None:
+            return response
         
-        # Total students
-        total = conn.execute("SELECT COUNT(*) as count FROM students").fetchone()['count']
-        
-        # Average age
-        avg_age = conn.execute("SELECT AVG(age) as avg_age FROM students").fetchone()['avg_age']
-        
-        # Students by city
-        cities = conn.execute("""
-            SELECT city, COUNT(*) as count 
-            FROM students 
-            WHERE city IS NOT NULL 
-            GROUP BY city 
-            ORDER BY count DESC
-        """).fetchall()
-        
-        conn.close()
-        
-        cities_data = [{'city': c['city'], 'count': c['count']} for c in cities]
-        
-        return jsonify({
+        return with_validators(jsonify({
             'success': True,
-            'data': {
-                'total_students': total,
-                'average_age': round(avg_age, 2) if avg_age else 0,
-                'students_by_city': cities_data
-            }
-        }), 200
+            'data': data
+        }), etag, last_modified)
     except Exception as e:
         return jsonify({'success': False, 'error': str(e)}), 500
 
-@app.route('/api/docs', methods=['GET'])
+@bp.route('/api/pool', methods=['GET'])
+@api_key_required
+def api_get_pool_stats():
+    """Get database connection pool statistics"""
+    return jsonify({
+        'success': True,
+        'data': database.pool_stats(),
+        'writer': database.writer_stats(),
+        'replicas': database.replica_stats()
+    }), 200
+
+@bp.route('/api/cache', methods=['GET'])
+@api_key_required
+def api_get_cache_stats():
+    """Get student cache statistics"""
+    return jsonify({
+        'success': True,
+        'data': student_cache.stats(),
+        'render': render_cache.stats()
+    }), 200
+
+@bp.route('/api/hasher', methods=['GET'])
+@api_key_required
+def api_get_hasher_stats():
+    """Get password hashing pool statistics"""
+    return jsonify({
+        'success': True,
+        'data': hasher.stats()
+    }), 200
+
+@bp.route('/api/limits', methods=['GET'])
+@api_key_required
+def api_get_limit_stats():
+    """Get API admission control limits, running requests and rejections"""
+    return jsonify({
+        'success': True,
+        'data': admission.stats() if admission is not None else None
+    }), 200
+
+@bp.route('/api/docs', methods=['GET'])
 def api_docs():
     """API Documentation"""
     docs = {
@@ -457,19 +1693,58 @@ def api_docs():
         'authentication': {
             'type': 'API Key',
             'header': 'X-API-Key',
-            'example': 'X-API-Key: your-secret-api-key-123'
+            'example': 'X-API-Key: your-secret-api-key-123',
+            'limits': ('Per key and route class (read, list, feed, write): over the rate or concurrency limit is '
+                       'a 429 and a busy server a 503, both with Retry-After (seconds)')
         },
         'endpoints': [
             {
                 'method': 'GET',
                 'path': '/api/students',
-                'description': 'Get all students',
+                'description': 'Get students, keyset-paginated by id (ETag/Last-Modified; 304 until a student changes)',
+                'auth_required': True,
+                'query': {
+                    'limit': f'integer (optional, default {API_DEFAULT_LIMIT}, max {API_MAX_LIMIT})',
+                    'cursor': 'integer (optional, next_cursor from the previous page)',
+                    'city': 'string (optional, exact match)',
+                    'min_age': 'integer (optional)',
+                    'max_age': 'integer (optional)',
+                    'name': 'string (optional, name prefix)',
+                    'fields': 'comma-separated list (optional): ' + ', '.join(STUDENT_FIELDS)
+                }
+            },
+            {
+                'method': 'GET',
+                'path': '/api/students/export',
+                'description': 'Stream all matching students as NDJSON or CSV (gzip if accepted)',
+                'auth_required': True,
+                'query': {
+                    'format': 'ndjson | csv (optional, default ndjson)',
+                    'city, min_age, max_age, name, fields': 'same as GET /api/students'
+                }
+            },
+            {
+                'method': 'GET',
+                'path': '/api/students/changes',
+                'description': 'Changes after a sequence number: upserts with current data, tombstones for deletes (410 if pruned)',
+                'auth_required': True,
+                'query': {
+                    'since': 'integer (optional, next_since from the previous page, default 0)',
+                    'limit': f'integer (optional, default {API_DEFAULT_LIMIT}, max {API_MAX_LIMIT})',
+                    'wait': 'integer (optional, seconds to long-poll when nothing changed, max CHANGES_MAX_WAIT)',
+                    'fields': 'same as GET /api/students'
+                }
+            },
+            {
+                'method': 'GET',
+                'path': '/api/students/changes/stream',
+                'description': 'Server-sent events of the same changes; resumes from since= or Last-Event-ID',
                 'auth_required': True
             },
             {
                 'method': 'GET',
                 'path': '/api/students/<id>',
-                'description': 'Get a single student by ID',
+                'description': 'Get a single student by ID (ETag/Last-Modified, 304 if unchanged)',
                 'auth_required': True
             },
             {
@@ -500,28 +1775,195 @@ def api_docs():
                 'description': 'Delete a student',
                 'auth_required': True
             },
+            {
+                'method': 'POST',
+                'path': '/api/students/bulk',
+                'description': 'Create many students (JSON array, {"items": [...]} or NDJSON body)',
+                'auth_required': True,
+                'query': {
+                    'atomic': 'boolean (optional, all-or-nothing, default false)',
+                    'chunk_size': f'integer (optional, rows per transaction, max {BULK_MAX_CHUNK_SIZE})'
+                }
+            },
+            {
+                'method': 'PUT',
+                'path': '/api/students/bulk',
+                'description': 'Update many students; each item needs an id',
+                'auth_required': True,
+                'query': {
+                    'atomic': 'boolean (optional)',
+                    'chunk_size': 'integer (optional)'
+                }
+            },
+            {
+                'method': 'DELETE',
+                'path': '/api/students/bulk',
+                'description': 'Delete many students by id',
+                'auth_required': True,
+                'query': {
+                    'atomic': 'boolean (optional)',
+                    'chunk_size': 'integer (optional)'
+                }
+            },
             {
                 'method': 'GET',
                 'path': '/api/stats',
-                'description': 'Get statistics about students',
+                'description': 'Get statistics about students (ETag/Last-Modified, 304 if unchanged)',
+                'auth_required': True
+            },
+            {
+                'method': 'GET',
+                'path': '/api/pool',
+                'description': 'Get database pool, SQLite write queue and read replica statistics (in use, waits, batch sizes, replica health)',
                 'auth_required': True
+            },
+            {
+                'method': 'GET',
+                'path': '/api/cache',
+                'description': 'Get student and render cache statistics (hits, misses, evictions)',
+                'auth_required': True
+            },
+            {
+                'method': 'GET',
+                'path': '/api/hasher',
+                'description': 'Get password hashing statistics (latency, queue depth, rejections)',
+                'auth_required': True
+            },
+            {
+                'method': 'GET',
+                'path': '/api/limits',
+                'description': 'Get API admission control limits per route class (running requests, rejections)',
+                'auth_required': True
+            },
+            {
+                'method': 'GET',
+                'path': '/metrics',
+                'description': 'Prometheus metrics: per-route latency, DB queries and time, payload sizes, pool waits',
+                'auth_required': False
             }
         ]
     }
     return jsonify(docs), 200
 
-@app.route('/api-test')
+@bp.route('/api-test')
 def api_test_page():
     """Serve the API testing page"""
     return render_template('api_test.html')
 
 # Test route to check if templates are working
-@app.route('/test')
+@bp.route('/test')
 def test():
     return "<h1>Test Route Works!</h1><p>If you can see this, Flask is working!</p>"
 
+# -------------------- App Factory --------------------
+def init_services(app):
+    """Build the per-process services from the app config
+    
+    Nothing here opens a database connection or starts a thread: pools,
+    executors and the write queue are created on first use in each
+    process, so gunicorn --preload can fork safely after create_app().
+    """
+    global repo, upload_storage, image_processor, hasher, user_cache, render_cache, student_cache, student_cache_sync
+    global student_stats, change_notifier
+    global api_keys, admission
+    config = app.config
+    repo = StudentRepository(database.get_db_config()['type'])
+    upload_storage = storage.create_storage(config['STORAGE_BACKEND'], root=config['UPLOAD_FOLDER'],
+                                            bucket=config['STORAGE_BUCKET'],
+                                            public_url=config['STORAGE_PUBLIC_URL'])
+    image_processor = images.ImageProcessor(config['IMAGE_PROCESSING_WORKERS'])
+    hasher = PasswordHasher(rounds=config['BCRYPT_LOG_ROUNDS'],
+                            workers=config['PASSWORD_HASH_WORKERS'],
+                            max_pending=config['PASSWORD_HASH_MAX_PENDING'],
+                            queue_timeout=config['PASSWORD_HASH_QUEUE_TIMEOUT'],
+                            timeout=config['PASSWORD_HASH_TIMEOUT'])
+    user_cache = create_cache(config['USER_CACHE_BACKEND'], config['USER_CACHE_URL'],
+                              maxsize=config['USER_CACHE_SIZE'], ttl=config['USER_CACHE_TTL'],
+                              namespace='user')
+    render_cache = create_cache(config['RENDER_CACHE_BACKEND'], config['RENDER_CACHE_URL'],
+                                maxsize=config['RENDER_CACHE_SIZE'], ttl=config['RENDER_CACHE_TTL'],
+                                namespace='render')
+    student_cache = create_cache(config['STUDENT_CACHE_BACKEND'], config['STUDENT_CACHE_URL'],
+                                 maxsize=config['STUDENT_CACHE_SIZE'], ttl=config['STUDENT_CACHE_TTL'],
+                                 namespace='student')
+    # Only an in-process cache misses other workers' writes
+    student_cache_sync = CacheInvalidator(student_cache, config['CHANGES_POLL_INTERVAL']
+                                          if config['STUDENT_CACHE_BACKEND'] == 'memory' else None)
+    student_stats = StudentStats(config['STATS_RECOMPUTE_INTERVAL'])
+    change_notifier = ChangeNotifier(config['CHANGES_POLL_INTERVAL'])
+    api_keys = load_api_keys(config)
+    admission = None
+    if config['RATE_LIMIT_ENABLED']:
+        limits = {name: ratelimit.Limit.parse(config[f'RATE_LIMIT_{name.upper()}'])
+                  for name in ratelimit.ROUTE_CLASSES}
+        admission = ratelimit.Admission(limits, ratelimit.create_buckets(config['RATE_LIMIT_BACKEND'],
+                                                                          config['RATE_LIMIT_URL']))
+
+db_checked_pid = None
+db_check_lock = threading.Lock()
+
+@bp.before_app_request
+def check_db():
+    """Check the schema version on the first request of each process
+    
+    Deferred from startup so importing the app (and forking workers)
+    doesn't touch the database.
+    """
+    global db_checked_pid
+    if db_checked_pid != os.getpid():
+        with db_check_lock:
+            if db_checked_pid != os.getpid():
+                init_db()
+                db_checked_pid = os.getpid()
+
+def create_app(config=None):
+    """Application factory
+    
+    `config` is a config class or object, a name from config.config
+    ('development', 'production'), or None for FLASK_ENV. The services
+    are module-level, so build one app per process.
+    """
+    if config is None or isinstance(config, str):
+        config = get_config(config)
+    
+    app = Flask(__name__)
+    app.config.from_object(config)
+    
+    # Return pooled DB connections at the end of every request
+    database.init_app(app)
+    # Per-route latency, DB and payload metrics, served at /metrics
+    metrics.init_app(app)
+    # JSON provider and response compression (registered after metrics so
+    # it records the bytes actually sent)
+    encoding.init_app(app)
+    # Enable CORS for API endpoints
+    CORS(app, resources={r"/api/*": {"origins": "*"}})
+    login_manager.init_app(app)
+    
+    init_services(app)
+    app.register_blueprint(bp)
+    init_templates(app)
+    return app
+
+default_app = None
+default_app_lock = threading.Lock()
+
+def __getattr__(name):
+    # `gunicorn app:app`, `flask --app app` and `from app import app` get
+    # an app built on first access instead of at import time
+    global default_app
+    if name == 'app':
+        with default_app_lock:
+            if default_app is None:
+                default_app = create_app()
+        return default_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 if __name__ == '__main__':
+    app = create_app()
     print("Starting Flask application...")
     print(f"Debug mode: {app.debug}")
     print(f"Templates directory: {app.template_folder}")
+    # The dev server reloads templates, so always read the sources
+    app.jinja_env.loader = app.extensions['template_source_loader']
     app.run(debug=True, port=5001)  # Changed port to 5001 to avoid conflicts
\ No newline at end of file
@@ -0,0 +1,221 @@
+"""ASGI entry point: `uvicorn asgi:app`
+
+GET /api/students and GET /api/students/<id> are served on the event
+loop with async database drivers (async_db.py), so one worker can keep
+many slow reads in flight without a thread each. Everything else -- the
+dashboard, writes, bulk endpoints -- goes to the Flask app through
+asgiref's WsgiToAsgi, which runs it on a thread pool as before.
+
+Both paths share the request parsing, serialization and student cache
+from app.py, so responses are identical. Set ASYNC_STUDENT_API=false to
+send the read API through Flask too. Async reads always use the primary:
+replica routing (database.ReplicaRouter) is only on the Flask path.
+"""
+import asyncio
+import re
+import time
+
+from asgiref.wsgi import WsgiToAsgi
+from flask import request
+
+import app as app_module
+import async_db
+import encoding
+import metrics
+import ratelimit
+from cache import LRUCache
+
+flask_app = app_module.create_app()
+wsgi = WsgiToAsgi(flask_app)
+db = async_db.AsyncDatabase()
+
+STUDENT_PATH = re.compile(r'^/api/students(?:/(\d+))?$')
+
+
+def async_enabled():
+    return flask_app.config['ASYNC_STUDENT_API'] and async_db.is_available()
+
+
+async def cache_call(method, *args):
+    """Call the student cache, off the event loop unless it's in-process"""
+    if isinstance(app_module.student_cache, LRUCache):
+        return method(*args)
+    return await asyncio.to_thread(method, *args)
+
+
+async def send_json(send, status, payload, origin=None, accept_encoding=None, validators=None,
+                    extra_headers=()):
+    # Serialized and compressed like jsonify() plus encoding.compress_response;
+    # `validators` is (etag, last_modified), and a 304 has no body
+    body = flask_app.json.response(payload).get_data() if status != 304 else b''
+    headers = [(b'content-type', b'application/json')] if status != 304 else []
+    content_encoding = None
+    if status in (200, 201) and flask_app.config['COMPRESS_ENABLED']:
+        headers.append((b'vary', b'Accept-Encoding'))
+        body, content_encoding = encoding.compress_body(body, accept_encoding, flask_app.config)
+        if content_encoding:
+            headers.append((b'content-encoding', content_encoding.encode()))
+    if validators is not None:
+        etag, last_modified = validators
+        if content_encoding:
+            etag = encoding.encoded_etag(etag, content_encoding)
+        headers.extend((name.lower().encode(), value.encode('latin-1'))
+                       for name, value in app_module.validator_headers(etag, last_modified).items())
+    if status != 304:
+        headers.append((b'content-length', str(len(body)).encode()))
+    headers.extend(extra_headers)
+    if origin is not None:
+        # Same headers Flask-CORS adds for /api/* with origins="*"
+        headers.append((b'access-control-allow-origin', origin))
+        headers.append((b'vary', b'Origin'))
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+    return len(body)
+
+
+def request_context(scope):
+    """Flask request context for url_for(), request.args and request headers in shared helpers"""
+    headers = dict(scope['headers'])
+    host = headers.get(b'host', b'localhost').decode('latin-1')
+    return flask_app.test_request_context(
+        scope['path'],
+        base_url=f"{scope['scheme']}://{host}{scope.get('root_path', '')}",
+        query_string=scope['query_string'].decode('latin-1'),
+        headers=[(name.decode('latin-1'), value.decode('latin-1')) for name, value in scope['headers']],
+    )
+
+
+def conditional(validators):
+    """(304, None, validators) if the client's copy is current, else None"""
+    tag = app_module.matched_etag(*validators)
+    if tag is None:
+        return None
+    return 304, None, (tag, validators[1])
+
+
+async def list_students():
+    try:
+        query, params, limit, fields = app_module.student_list_query(request.args)
+    except app_module.QueryError as e:
+        return 400, {'success': False, 'error': str(e)}, None
+    counter = await db.fetchone(*app_module.repo.change_version_query())
+    validators = app_module.list_validators(counter['version'], counter['updated_at'])
+    unchanged = conditional(validators)
+    if unchanged:
+        return unchanged
+    students = await db.fetchall(query, params)
+    return 200, app_module.student_list_payload(students, limit, fields, request.args), validators
+
+
+async def sync_student_cache(force=False):
+    """app.sync_student_cache() with async reads"""
+    sync = app_module.student_cache_sync
+    if not sync.due(force):
+        return
+    since = sync.version
+    pruned_through, latest = await db.fetchone(*app_module.repo.change_log_bounds_query())
+    changes = []
+    if since is not None and since < latest:
+        changes = await db.fetchall(*app_module.repo.changes_since_query(since, sync.batch_size))
+    sync.apply(since, pruned_through, latest, [(seq, student_id) for seq, student_id, _ in changes])
+
+
+async def get_student(id):
+    await sync_student_cache(force=app_module.conditional_request())
+    student = await cache_call(app_module.student_cache.get, id)
+    if student is None:
+        generation = app_module.student_cache_sync.generation
+        row = await db.fetchone(*app_module.repo.get_query(id))
+        if row is None:
+            return 404, {'success': False, 'error': 'Student not found'}, None
+        student = row.as_dict()
+        await cache_call(app_module.student_cache_sync.store, id, student, generation)
+    validators = app_module.student_validators(student)
+    unchanged = conditional(validators)
+    if unchanged:
+        return unchanged
+    data = app_module.serialize_student(student, list(app_module.STUDENT_FIELDS))
+    return 200, {'success': True, 'data': data}, validators
+
+
+async def student_api(scope, send, student_id):
+    started = time.perf_counter()
+    route = '/api/students' if student_id is None else '/api/students/<int:id>'
+    headers = dict(scope['headers'])
+    origin = headers.get(b'origin')
+    api_key = headers.get(b'x-api-key', b'').decode('latin-1')
+    key_name = app_module.api_keys.get(api_key)
+    if key_name is None:
+        size = await send_json(send, 401, {'error': 'Invalid or missing API key'}, origin)
+        observe(route, 401, started, size)
+        return
+
+    # Same admission as api_key_required; the slot is held until the body is sent
+    release = None
+    if app_module.admission is not None:
+        route_class = 'list' if student_id is None else 'read'
+        try:
+            release = app_module.admission.admit(key_name, route_class)
+        except ratelimit.Rejected as e:
+            payload = app_module.admission_rejected(e, route_class, flask_app.config)
+            size = await send_json(send, e.status, payload, origin,
+                                   extra_headers=[(b'retry-after', str(e.retry_after).encode())])
+            observe(route, e.status, started, size)
+            return
+
+    try:
+        ctx = request_context(scope)
+        ctx.push()
+        try:
+            if student_id is None:
+                status, payload, validators = await list_students()
+            else:
+                status, payload, validators = await get_student(int(student_id))
+        except Exception as e:
+            status, payload, validators = 500, {'success': False, 'error': str(e)}, None
+        finally:
+            ctx.pop()
+        accept_encoding = headers.get(b'accept-encoding', b'').decode('latin-1')
+        size = await send_json(send, status, payload, origin, accept_encoding, validators)
+    finally:
+        if release is not None:
+            release()
+    observe(route, status, started, size)
+
+
+def observe(route, status, started, response_size):
+    # Same series as the Flask routes; DB counters aren't tracked here
+    if flask_app.config['METRICS_ENABLED']:
+        metrics.observe_request(route, 'GET', status, time.perf_counter() - started,
+                                response_size=response_size)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            try:
+                if async_enabled():
+                    # Same schema check the Flask app runs on its first request
+                    await asyncio.to_thread(app_module.check_db)
+                    await db.open()
+            except Exception as e:
+                await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                return
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await db.close()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await lifespan(receive, send)
+        return
+    if scope['type'] == 'http' and scope['method'] == 'GET' and async_enabled():
+        match = STUDENT_PATH.match(scope['path'])
+        if match:
+            await student_api(scope, send, match.group(1))
+            return
+    await wsgi(scope, receive, send)
@@ -0,0 +1,112 @@
+"""Async database access for the ASGI student API (asgi.py)
+
+aiosqlite on SQLite and psycopg_pool's AsyncConnectionPool on PostgreSQL.
+Both are optional: without them the async API is disabled and every
+request is served by the Flask app.
+"""
+import asyncio
+import contextlib
+import importlib.util
+
+import database
+from repository import record_type
+
+AIOSQLITE_AVAILABLE = importlib.util.find_spec('aiosqlite') is not None
+PSYCOPG_POOL_AVAILABLE = importlib.util.find_spec('psycopg_pool') is not None
+
+
+def is_available():
+    """True if the async driver for the configured database is installed"""
+    if database.get_db_config()['type'] == 'postgresql':
+        return PSYCOPG_POOL_AVAILABLE
+    return AIOSQLITE_AVAILABLE
+
+
+class AsyncSQLitePool:
+    """Fixed-size pool of aiosqlite connections (each runs on its own thread)"""
+
+    def __init__(self, path, size=10):
+        self.path = path
+        self.size = size
+        self._idle = asyncio.LifoQueue()
+        self._conns = []
+
+    async def open(self):
+        import aiosqlite
+        sqlite_config = database.get_sqlite_config()
+        for _ in range(self.size):
+            conn = await aiosqlite.connect(self.path, timeout=sqlite_config['busy_timeout'] / 1000,
+                                           cached_statements=sqlite_config['cached_statements'])
+            await conn.execute(f"PRAGMA busy_timeout = {int(sqlite_config['busy_timeout'])}")
+            await conn.execute(f"PRAGMA cache_size = {int(sqlite_config['cache_size'])}")
+            await conn.execute(f"PRAGMA mmap_size = {int(sqlite_config['mmap_size'])}")
+            self._conns.append(conn)
+            self._idle.put_nowait(conn)
+
+    async def close(self):
+        for conn in self._conns:
+            await conn.close()
+        self._conns = []
+
+    @contextlib.asynccontextmanager
+    async def connection(self):
+        conn = await self._idle.get()
+        try:
+            yield conn
+        finally:
+            self._idle.put_nowait(conn)
+
+
+class AsyncDatabase:
+    """Read-only query helper over the configured async pool, opened on first use"""
+
+    def __init__(self):
+        self.dialect = None
+        self._pool = None
+        self._lock = None
+
+    async def open(self):
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._pool is not None:
+                return
+            config = database.get_db_config()
+            pool_config = database.get_pool_config()
+            if config['type'] == 'postgresql':
+                from psycopg.rows import tuple_row
+                from psycopg_pool import AsyncConnectionPool
+                pool = AsyncConnectionPool(config['url'], min_size=pool_config['min_size'],
+                                           max_size=pool_config['max_size'], timeout=pool_config['timeout'],
+                                           max_idle=pool_config['max_idle'],
+                                           max_lifetime=pool_config['max_lifetime'],
+                                           kwargs={'row_factory': tuple_row}, open=False)
+                await pool.open()
+            else:
+                pool = AsyncSQLitePool(config['path'], size=pool_config['max_size'])
+                await pool.open()
+            self.dialect = config['type']
+            self._pool = pool
+
+    async def close(self):
+        if self._pool is not None:
+            pool, self._pool = self._pool, None
+            await pool.close()
+
+    async def fetchall(self, query, params=()):
+        """Rows as Records, like StudentRepository's"""
+        if self._pool is None:
+            await self.open()
+        if self.dialect == 'postgresql':
+            query = query.replace('%', '%%').replace('?', '%s')
+        async with self._pool.connection() as conn:
+            cursor = await conn.execute(query, params)
+            try:
+                rows = await cursor.fetchall()
+                return list(map(record_type(cursor.description), rows)) if rows else []
+            finally:
+                await cursor.close()
+
+    async def fetchone(self, query, params=()):
+        rows = await self.fetchall(query, params)
+        return rows[0] if rows else None
@@ -0,0 +1,113 @@
+"""Read API throughput under uvicorn: async handlers vs Flask on threads
+
+Usage: python benchmarks/bench_async.py [requests] [concurrency] [rows]
+
+Starts `uvicorn asgi:app` twice against a seeded throwaway database
+(SQLITE_PATH): once with the native async student API and once with
+ASYNC_STUDENT_API=false, where the same requests go through the Flask
+app on asgiref's thread pool. Each run drives a mix of list and
+single-student GETs with `concurrency` clients in flight and reports
+requests/s with p50/p99 latency.
+"""
+import asyncio
+import os
+import random
+import socket
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HEADERS = {'X-API-Key': os.environ.get('API_KEY', 'your-secret-api-key-123')}
+
+def seed(env, rows):
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app:create_app()', 'db-migrate'],
+                   env=env, cwd=ROOT, capture_output=True, check=True)
+    conn = sqlite3.connect(env['SQLITE_PATH'])
+    conn.executemany("INSERT INTO students (name, age, city) VALUES (?, ?, ?)",
+                     ((f"Student {i}", 18 + i % 10, f"City {i % 50}") for i in range(rows)))
+    conn.commit()
+    conn.close()
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def paths(total, rows):
+    rng = random.Random(42)
+    result = []
+    for _ in range(total):
+        if rng.random() < 0.5:
+            result.append(f"/api/students/{rng.randint(1, rows)}")
+        else:
+            result.append(f"/api/students?limit=50&city=City {rng.randint(0, 49)}")
+    return result
+
+async def drive(base_url, requests, concurrency):
+    latencies = []
+    queue = asyncio.Queue()
+    for path in requests:
+        queue.put_nowait(path)
+
+    async def client_loop(client):
+        while not queue.empty():
+            path = queue.get_nowait()
+            started = time.perf_counter()
+            response = await client.get(path, headers=HEADERS)
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200, (path, response.status_code, response.text[:200])
+
+    limits = httpx.Limits(max_connections=concurrency)
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=60) as client:
+        # Warm up connections, caches and the schema check
+        await client.get('/api/students?limit=1', headers=HEADERS)
+        started = time.perf_counter()
+        await asyncio.gather(*(client_loop(client) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return elapsed, latencies
+
+def run(env, async_api, requests, concurrency):
+    port = free_port()
+    env = dict(env, ASYNC_STUDENT_API='true' if async_api else 'false')
+    server = subprocess.Popen([sys.executable, '-m', 'uvicorn', 'asgi:app', '--port', str(port),
+                               '--log-level', 'warning'], env=env, cwd=ROOT)
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        for _ in range(100):
+            try:
+                httpx.get(base_url + '/login', timeout=1)
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        return asyncio.run(drive(base_url, requests, concurrency))
+    finally:
+        server.terminate()
+        server.wait()
+
+def report(label, elapsed, latencies):
+    latencies = sorted(latency * 1000 for latency in latencies)
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{label:18s} {len(latencies) / elapsed:8.0f} req/s  "
+          f"p50 {statistics.median(latencies):7.2f}ms  p99 {p99:7.2f}ms")
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 64
+    rows = int(sys.argv[3]) if len(sys.argv) > 3 else 20000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, SQLITE_PATH=os.path.join(tmp, 'bench.db'), FLASK_ENV='production')
+        seed(env, rows)
+        requests = paths(total, rows)
+        print(f"requests={total} concurrency={concurrency} rows={rows}")
+        report('flask (threads)', *run(env, False, requests, concurrency))
+        report('async', *run(env, True, requests, concurrency))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,50 @@
+"""Compare single-row POST /api/students against POST /api/students/bulk
+
+Usage: python benchmarks/bench_bulk.py [rows] [chunk_size]
+
+Runs against a throwaway SQLite database (SQLITE_PATH) through the Flask
+test client, so the numbers measure the app and database, not the network.
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+HEADERS = {'X-API-Key': os.environ.get('API_KEY', 'your-secret-api-key-123')}
+
+def make_rows(count, prefix):
+    return [{'name': f"{prefix}{i}", 'age': 18 + i % 10, 'city': f"City {i % 50}"} for i in range(count)]
+
+def bench_single(client, rows):
+    start = time.perf_counter()
+    for row in rows:
+        response = client.post('/api/students', json=row, headers=HEADERS)
+        assert response.status_code == 201, response.get_json()
+    return time.perf_counter() - start
+
+def bench_bulk(client, rows, chunk_size):
+    start = time.perf_counter()
+    response = client.post(f'/api/students/bulk?chunk_size={chunk_size}', json=rows, headers=HEADERS)
+    assert response.status_code == 201, response.get_json()
+    return time.perf_counter() - start
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['SQLITE_PATH'] = os.path.join(tmp, 'bench.db')
+        from app import app
+        client = app.test_client()
+        
+        single = bench_single(client, make_rows(count, 'single-'))
+        bulk = bench_bulk(client, make_rows(count, 'bulk-'), chunk_size)
+    
+    print(f"rows={count} chunk_size={chunk_size}")
+    print(f"single-row: {single:8.3f}s  {count / single:10.0f} rows/s")
+    print(f"bulk:       {bulk:8.3f}s  {count / bulk:10.0f} rows/s  ({single / bulk:.1f}x)")
+
+if __name__ == '__main__':
+    main()
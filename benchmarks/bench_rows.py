@@ -0,0 +1,123 @@
+"""Allocation and time per row on the student list path: driver rows vs Records
+
+Usage: python benchmarks/bench_rows.py [rows] [page_size] [rounds]
+
+Seeds a throwaway SQLite database (SQLITE_PATH) and fetches pages the
+way GET /api/students does, serializing every field (image_url
+included). The "row objects" path fetches sqlite3.Row objects and builds
+each API dict field by field; the "records" path goes through
+StudentRepository (plain tuples wrapped in Records) and
+student_serializer(). tracemalloc reports the bytes still held by the
+fetched rows and the peak while serializing, both per row.
+"""
+import gc
+import os
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+def seed(path, rows):
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app:create_app()', 'db-migrate'],
+                   env=dict(os.environ, SQLITE_PATH=path), cwd=ROOT, capture_output=True, check=True)
+    conn = sqlite3.connect(path)
+    conn.executemany("INSERT INTO students (name, age, city) VALUES (?, ?, ?)",
+                     ((f"Student {i}", 18 + i % 10, f"City {i % 50}") for i in range(rows)))
+    conn.commit()
+    conn.close()
+
+def fetch_rows(conn, query, params):
+    return conn.execute(query, params).fetchall()
+
+def serialize_rows(app_module, rows, fields):
+    # What serialize_student() did per row before the repository
+    result = []
+    for row in rows:
+        data = {}
+        for field in fields:
+            if field == 'image_url':
+                data[field] = app_module.student_image_url(row, app_module.API_IMAGE_SIZE, external=True)
+            else:
+                data[field] = row[field]
+        result.append(data)
+    return result
+
+def measure(fetch, serialize, pages, repeat=5):
+    """(seconds, bytes held by fetched rows, serialization peak bytes) summed over pages
+
+    Timing and allocation tracking are separate passes, since tracemalloc
+    slows every allocation down. The time is the best of `repeat` passes.
+    """
+    elapsed = float('inf')
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for query, params in pages:
+            serialize(fetch(query, params))
+        elapsed = min(elapsed, time.perf_counter() - started)
+
+    held = peak = 0
+    for query, params in pages:
+        # Full collections empty the tuple free list, so tuples reused from
+        # it aren't missed and freed ones (the driver tuples Records were
+        # copied from) aren't counted
+        gc.collect()
+        tracemalloc.start()
+        rows = fetch(query, params)
+        gc.collect()
+        held += tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        data = serialize(rows)
+        peak += tracemalloc.get_traced_memory()[1] - baseline
+        tracemalloc.stop()
+        del rows, data
+    return elapsed, held, peak
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    page_size = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    rounds = int(sys.argv[3]) if len(sys.argv) > 3 else 20
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.environ['SQLITE_PATH'] = os.path.join(tmp, 'bench.db')
+        seed(path, total)
+        import app as app_module
+        import database
+        app = app_module.create_app('production')
+
+        with app.test_request_context('/api/students'):
+            fields = list(app_module.STUDENT_FIELDS)
+            pages = []
+            for i in range(rounds):
+                args = {'limit': str(page_size), 'cursor': str((i * page_size) % max(1, total - page_size))}
+                query, params, _, _ = app_module.student_list_query(args)
+                pages.append((query, params))
+
+            conn = database.connect()
+            repo = app_module.repo
+            serializer = app_module.student_serializer(fields)
+            # Warm up statement caches and the serializer's layout lookup
+            for fetch, serialize in ((lambda q, p: fetch_rows(conn, q, p), lambda rows: serialize_rows(app_module, rows, fields)),
+                                     (lambda q, p: repo.fetch(conn, q, p), serializer)):
+                measure(fetch, serialize, pages[:1])
+
+            results = {
+                'row objects': measure(lambda q, p: fetch_rows(conn, q, p),
+                                       lambda rows: serialize_rows(app_module, rows, fields), pages),
+                'records': measure(lambda q, p: repo.fetch(conn, q, p), serializer, pages),
+            }
+            conn.close()
+
+    rows = rounds * (page_size + 1)
+    print(f"rows={total} page_size={page_size} rounds={rounds}")
+    for label, (elapsed, held, peak) in results.items():
+        print(f"{label:12s} {elapsed / rows * 1e6:7.2f}us/row  held {held / rows:7.1f}B/row  "
+              f"serialize peak {peak / rows:7.1f}B/row")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+"""Measure worker cold start: import, create_app() and the first requests
+
+Usage: python benchmarks/bench_startup.py [runs]
+
+Each run is a fresh Python process (like a new gunicorn worker) against a
+throwaway, already-migrated SQLite database (SQLITE_PATH). Reports the
+median and worst time for each phase.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, os, sys, time
+sys.path.insert(0, os.environ['BENCH_ROOT'])
+timings = {}
+start = time.perf_counter()
+import app as app_module
+timings['import'] = time.perf_counter() - start
+
+start = time.perf_counter()
+app = app_module.create_app()
+timings['create_app'] = time.perf_counter() - start
+
+client = app.test_client()
+headers = {'X-API-Key': app.config['API_KEY']}
+start = time.perf_counter()
+response = client.get('/api/students?limit=10', headers=headers)
+timings['first_request'] = time.perf_counter() - start
+assert response.status_code == 200, response.status_code
+
+start = time.perf_counter()
+client.get('/api/students?limit=10', headers=headers)
+timings['second_request'] = time.perf_counter() - start
+
+timings['modules'] = len(sys.modules)
+print(json.dumps(timings))
+"""
+
+PHASES = ('import', 'create_app', 'first_request', 'second_request')
+
+def run_child(env):
+    output = subprocess.run([sys.executable, '-c', CHILD], env=env, cwd=ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, BENCH_ROOT=ROOT, SQLITE_PATH=os.path.join(tmp, 'bench.db'))
+        # Migrate once up front so every run measures a warm-schema start
+        subprocess.run([sys.executable, '-m', 'flask', '--app', 'app:create_app()', 'db-migrate'],
+                       env=env, cwd=ROOT, capture_output=True, check=True)
+        results = [run_child(env) for _ in range(runs)]
+
+    print(f"runs={runs}  modules loaded={results[-1]['modules']}")
+    for phase in PHASES:
+        values = [result[phase] * 1000 for result in results]
+        print(f"{phase:15s} median {statistics.median(values):8.1f}ms  max {max(values):8.1f}ms")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+"""Concurrent single-row inserts on SQLite, with and without the write queue
+
+Usage: python benchmarks/bench_writes.py [rows] [threads]
+
+Each thread POSTs /api/students through its own Flask test client against
+a throwaway database (SQLITE_PATH). With the queue, inserts from all
+threads are group-committed by one writer; without it every request
+commits on its own and waits on the database lock.
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+HEADERS = {'X-API-Key': os.environ.get('API_KEY', 'your-secret-api-key-123')}
+
+def bench(app, rows, threads, prefix):
+    errors = []
+
+    def worker(offset):
+        client = app.test_client()
+        for i in range(offset, rows, threads):
+            response = client.post('/api/students', json={'name': f"{prefix}{i}", 'age': 20, 'city': 'Bench'},
+                                   headers=HEADERS)
+            if response.status_code != 201:
+                errors.append(response.get_json())
+
+    workers = [threading.Thread(target=worker, args=(offset,)) for offset in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    assert not errors, errors[:3]
+    return elapsed
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ['SQLITE_PATH'] = os.path.join(tmp, 'bench.db')
+        os.environ['DB_POOL_MAX_SIZE'] = str(threads + 2)
+        from app import app
+        import database
+
+        # The queue setting is read per write, so both runs share one app
+        os.environ['SQLITE_WRITE_QUEUE'] = 'false'
+        direct = bench(app, rows, threads, 'direct-')
+        os.environ['SQLITE_WRITE_QUEUE'] = 'true'
+        queued = bench(app, rows, threads, 'queued-')
+        stats = database.writer_stats()
+        database.close_writer()
+
+    print(f"rows={rows} threads={threads}")
+    print(f"direct commits: {direct:8.3f}s  {rows / direct:10.0f} rows/s")
+    print(f"write queue:    {queued:8.3f}s  {rows / queued:10.0f} rows/s  ({direct / queued:.1f}x)")
+    print(f"avg batch size: {stats['avg_batch_size']}  largest: {stats['largest_batch']}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,401 @@
+"""Reproducible load test for the main read endpoints, with stored baselines
+
+Usage: python benchmarks/loadtest.py [--rows N] [--mode inprocess|http|both]
+                                     [--concurrency C] [--requests R]
+                                     [--page-size N] [--accept-encoding gzip]
+                                     [--save NAME] [--compare NAME]
+
+Seeds a throwaway SQLite database (SQLITE_PATH) with --rows students
+(1k to 1M), a share of them with photos in a throwaway UPLOAD_FOLDER.
+Pass --postgres URL to seed and test a local PostgreSQL database instead;
+its students, users and blobs tables are emptied first.
+
+Each endpoint (GET /api/students, /api/students/<id>, /api/stats and
+the dashboard) is driven by --concurrency clients, either in-process
+through Flask test clients or over HTTP against `flask run` (or
+--server-cmd, e.g. gunicorn). The request sequence comes from --seed,
+so two runs send exactly the same requests. Reports requests/s, p50,
+p99 and the serving process's RSS per endpoint.
+
+--save NAME writes the results to benchmarks/baselines/NAME.json;
+--compare NAME prints the change against that baseline and exits with
+status 1 when throughput or p99 regressed by more than --tolerance.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import resource
+import shlex
+import socket
+import sqlite3
+import statistics
+import struct
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_DIR = os.path.join(ROOT, 'benchmarks', 'baselines')
+HEADERS = {'X-API-Key': os.environ.get('API_KEY', 'your-secret-api-key-123')}
+BENCH_USER = ('bench', 'bench-password')
+SEED_BATCH = 10000
+CITIES = 50
+PHOTOS = 64
+
+sys.path.insert(0, ROOT)
+
+# -------------------- Dataset --------------------
+def png_bytes(width, height, color):
+    """A solid-colour PNG, built without Pillow"""
+    def chunk(kind, data):
+        body = kind + data
+        return struct.pack('>I', len(data)) + body + struct.pack('>I', zlib.crc32(body))
+    row = b'\x00' + bytes(color) * width
+    return (b'\x89PNG\r\n\x1a\n'
+            + chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+            + chunk(b'IDAT', zlib.compress(row * height))
+            + chunk(b'IEND', b''))
+
+def store_photos(upload_folder, count, seed):
+    """Write `count` distinct photos into content-addressed storage, returning (key, size) pairs"""
+    import storage
+    rng = random.Random(seed)
+    local = storage.LocalStorage(upload_folder)
+    return [local.save_bytes(png_bytes(64, 64, [rng.randrange(256) for _ in range(3)]), 'png')
+            for _ in range(count)]
+
+def student_rows(rows, photos, image_ratio, seed):
+    rng = random.Random(seed)
+    for i in range(rows):
+        image = rng.choice(photos)[0] if photos and rng.random() < image_ratio else None
+        yield (f"Student {i}", 18 + rng.randrange(12), f"City {rng.randrange(CITIES)}", image)
+
+def blob_rows(rows, photos, image_ratio, seed):
+    """blobs rows with refcounts matching student_rows()"""
+    counts = {}
+    for _, _, _, image in student_rows(rows, photos, image_ratio, seed):
+        if image:
+            counts[image] = counts.get(image, 0) + 1
+    sizes = dict(photos)
+    return [(key, sizes[key], count) for key, count in counts.items()]
+
+def migrate(env):
+    subprocess.run([sys.executable, '-m', 'flask', '--app', 'app:create_app()', 'db-migrate'],
+                   env=env, cwd=ROOT, capture_output=True, check=True)
+
+def seed_sqlite(path, rows, photos, image_ratio, seed):
+    conn = sqlite3.connect(path)
+    students = student_rows(rows, photos, image_ratio, seed)
+    while True:
+        batch = [row for _, row in zip(range(SEED_BATCH), students)]
+        if not batch:
+            break
+        conn.executemany("INSERT INTO students (name, age, city, image) VALUES (?, ?, ?, ?)", batch)
+    conn.executemany("INSERT INTO blobs (key, size, refcount) VALUES (?, ?, ?)",
+                     blob_rows(rows, photos, image_ratio, seed))
+    conn.commit()
+    conn.close()
+
+def seed_postgres(url, rows, photos, image_ratio, seed):
+    import psycopg
+    with psycopg.connect(url) as conn:
+        conn.execute("TRUNCATE students, users, blobs RESTART IDENTITY")
+        with conn.cursor().copy("COPY students (name, age, city, image) FROM STDIN") as copy:
+            for row in student_rows(rows, photos, image_ratio, seed):
+                copy.write_row(row)
+        conn.cursor().executemany("INSERT INTO blobs (key, size, refcount) VALUES (%s, %s, %s)",
+                                  blob_rows(rows, photos, image_ratio, seed))
+        conn.execute("ANALYZE students")
+
+def seed(env, args):
+    started = time.perf_counter()
+    migrate(env)
+    photos = store_photos(env['UPLOAD_FOLDER'], PHOTOS, args.seed) if args.image_ratio else []
+    if args.postgres:
+        seed_postgres(args.postgres, args.rows, photos, args.image_ratio, args.seed)
+    else:
+        seed_sqlite(env['SQLITE_PATH'], args.rows, photos, args.image_ratio, args.seed)
+    print(f"seeded {args.rows} students in {time.perf_counter() - started:.1f}s")
+
+# -------------------- Workload --------------------
+def endpoint_paths(name, total, rows, seed, page_size=100):
+    """The request paths for one endpoint, the same on every run with the same seed"""
+    rng = random.Random(f"{seed}:{name}")
+    paths = []
+    for _ in range(total):
+        if name == 'api_students':
+            query = {'limit': page_size}
+            if rng.random() < 0.5:
+                query['cursor'] = rng.randrange(rows)
+            if rng.random() < 0.3:
+                query['city'] = f"City {rng.randrange(CITIES)}"
+            paths.append('/api/students?' + urlencode(query))
+        elif name == 'api_student':
+            paths.append(f"/api/students/{rng.randint(1, rows)}")
+        elif name == 'api_stats':
+            paths.append('/api/stats')
+        elif name == 'index':
+            page = rng.randint(1, max(1, min(rows // 25, 200)))
+            paths.append(f"/?page={page}")
+    return paths
+
+ENDPOINTS = ('api_students', 'api_student', 'api_stats', 'index')
+
+def rss_bytes(pid=None):
+    """Current resident set size of a process (this one by default)"""
+    try:
+        with open(f"/proc/{pid or 'self'}/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        if pid is None:
+            # ru_maxrss is the peak, in KiB on Linux and bytes on macOS
+            peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            return peak if sys.platform == 'darwin' else peak * 1024
+        return None
+
+def drive(make_client, paths, concurrency):
+    """Send `paths` from `concurrency` threads, returning (elapsed, latencies)"""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    chunks = [paths[i::concurrency] for i in range(concurrency)]
+    clients = [make_client() for _ in range(concurrency)]
+    barrier = threading.Barrier(concurrency + 1)
+
+    def worker(client, chunk):
+        local = []
+        barrier.wait()
+        for path in chunk:
+            started = time.perf_counter()
+            status = client(path)
+            local.append(time.perf_counter() - started)
+            if status not in (200, 304):
+                errors.append((path, status))
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker, args=args) for args in zip(clients, chunks)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    assert not errors, errors[:3]
+    return elapsed, latencies
+
+def summarize(elapsed, latencies, rss):
+    latencies = sorted(latency * 1000 for latency in latencies)
+    return {
+        'requests': len(latencies),
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies), 3),
+        'p99_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 3),
+        'rss_mb': round(rss / 2**20, 1) if rss is not None else None,
+    }
+
+# -------------------- In-process --------------------
+def run_inprocess(args, paths_by_endpoint):
+    from app import create_app
+    app = create_app(os.environ.get('FLASK_ENV', 'production'))
+    app.test_client().post('/register', data=dict(zip(('username', 'password'), BENCH_USER)))
+
+    def make_client():
+        client = app.test_client()
+        client.post('/login', data=dict(zip(('username', 'password'), BENCH_USER)))
+        return lambda path: client.get(path, headers=HEADERS).status_code
+
+    results = {}
+    for name, paths in paths_by_endpoint.items():
+        drive(make_client, paths[:args.warmup], 1)
+        results[name] = summarize(*drive(make_client, paths, args.concurrency), rss_bytes())
+    return results
+
+# -------------------- Over HTTP --------------------
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_server(args, env):
+    port = free_port()
+    if args.server_cmd:
+        command = shlex.split(args.server_cmd.format(port=port))
+    else:
+        command = [sys.executable, '-m', 'flask', '--app', 'app:create_app()', 'run',
+                   '--port', str(port), '--with-threads', '--no-reload', '--no-debugger']
+    server = subprocess.Popen(command, env=env, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    for _ in range(200):
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=1):
+                return server, port
+        except OSError:
+            time.sleep(0.05)
+    server.terminate()
+    raise RuntimeError(f"Server did not start: {' '.join(command)}")
+
+def http_request(conn, method, path, body=None, headers=None):
+    conn.request(method, path, body=body, headers=headers or {})
+    response = conn.getresponse()
+    response.read()
+    return response
+
+def login_cookie(port):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    form = {'Content-Type': 'application/x-www-form-urlencoded'}
+    body = urlencode(dict(zip(('username', 'password'), BENCH_USER)))
+    http_request(conn, 'POST', '/register', body, form)
+    response = http_request(conn, 'POST', '/login', body, form)
+    conn.close()
+    cookie = response.getheader('Set-Cookie', '')
+    return cookie.split(';', 1)[0]
+
+def run_http(args, env, paths_by_endpoint):
+    server, port = start_server(args, env)
+    try:
+        headers = dict(HEADERS, Cookie=login_cookie(port))
+
+        def make_client():
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+
+            def get(path):
+                try:
+                    return http_request(conn, 'GET', path, headers=headers).status
+                except (http.client.HTTPException, OSError):
+                    # The server closed a keep-alive connection; retry once
+                    conn.close()
+                    return http_request(conn, 'GET', path, headers=headers).status
+            return get
+
+        results = {}
+        for name, paths in paths_by_endpoint.items():
+            drive(make_client, paths[:args.warmup], 1)
+            results[name] = summarize(*drive(make_client, paths, args.concurrency), rss_bytes(server.pid))
+        return results
+    finally:
+        server.terminate()
+        server.wait()
+
+# -------------------- Baselines --------------------
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def save_baseline(name, report):
+    os.makedirs(BASELINE_DIR, exist_ok=True)
+    path = os.path.join(BASELINE_DIR, f"{name}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2, sort_keys=True)
+    print(f"saved baseline {path}")
+
+def compare_baseline(name, report, tolerance):
+    """Print changes against a saved baseline; True if anything regressed"""
+    with open(os.path.join(BASELINE_DIR, f"{name}.json")) as f:
+        baseline = json.load(f)
+    if baseline['params'] != report['params']:
+        print(f"warning: baseline '{name}' was recorded with different parameters: {baseline['params']}")
+    print(f"\ncompared with '{name}' (revision {baseline.get('revision')}):")
+    regressed = False
+    for mode, endpoints in report['results'].items():
+        for endpoint, current in endpoints.items():
+            previous = baseline['results'].get(mode, {}).get(endpoint)
+            if previous is None:
+                continue
+            rps = current['rps'] / previous['rps'] - 1
+            p99 = current['p99_ms'] / previous['p99_ms'] - 1 if previous['p99_ms'] else 0.0
+            bad = rps < -tolerance or p99 > tolerance
+            regressed = regressed or bad
+            print(f"{mode:10s} {endpoint:14s} rps {rps:+7.1%}  p99 {p99:+7.1%}{'  REGRESSION' if bad else ''}")
+    return regressed
+
+# -------------------- Main --------------------
+def print_results(results):
+    for mode, endpoints in results.items():
+        for endpoint, r in endpoints.items():
+            rss = f"{r['rss_mb']:7.1f}MB" if r['rss_mb'] is not None else '      n/a'
+            print(f"{mode:10s} {endpoint:14s} {r['rps']:9.1f} req/s  "
+                  f"p50 {r['p50_ms']:8.2f}ms  p99 {r['p99_ms']:8.2f}ms  rss {rss}")
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n', 1)[0])
+    parser.add_argument('--rows', type=int, default=10000, help='students to seed (default 10000)')
+    parser.add_argument('--image-ratio', type=float, default=0.5, help='share of students with a photo')
+    parser.add_argument('--postgres', metavar='URL', help='seed and test this PostgreSQL database instead of SQLite')
+    parser.add_argument('--mode', choices=('inprocess', 'http', 'both'), default='both')
+    parser.add_argument('--endpoints', default=','.join(ENDPOINTS), help='comma-separated subset of ' + ', '.join(ENDPOINTS))
+    parser.add_argument('--requests', type=int, default=2000, help='requests per endpoint')
+    parser.add_argument('--warmup', type=int, default=50, help='unmeasured requests per endpoint first')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--page-size', type=int, default=100, help='limit for GET /api/students (default 100)')
+    parser.add_argument('--accept-encoding', default='', help="Accept-Encoding sent with every request, e.g. 'gzip, br'")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--server-cmd', help="HTTP server command, '{port}' is substituted "
+                                             "(default: flask run --with-threads)")
+    parser.add_argument('--save', metavar='NAME', help='store results as a baseline')
+    parser.add_argument('--compare', metavar='NAME', help='compare results with a stored baseline')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='allowed relative regression (default 0.1)')
+    args = parser.parse_args()
+    if args.accept_encoding:
+        HEADERS['Accept-Encoding'] = args.accept_encoding
+    unknown = set(args.endpoints.split(',')) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoint(s): {', '.join(sorted(unknown))}")
+    return args
+
+def main():
+    args = parse_args()
+    endpoints = [name for name in ENDPOINTS if name in args.endpoints.split(',')]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = {key: value for key, value in os.environ.items() if key != 'DATABASE_URL'}
+        env.update(FLASK_ENV='production', UPLOAD_FOLDER=os.path.join(tmp, 'uploads'),
+                   SQLITE_PATH=os.path.join(tmp, 'bench.db'),
+                   # Registering the bench user shouldn't dominate the run
+                   BCRYPT_LOG_ROUNDS=os.environ.get('BCRYPT_LOG_ROUNDS', '4'),
+                   # Measures serving capacity, not the per-key limits
+                   RATE_LIMIT_ENABLED=os.environ.get('RATE_LIMIT_ENABLED', 'false'))
+        if args.postgres:
+            env['DATABASE_URL'] = args.postgres
+        seed(env, args)
+        os.environ.clear()
+        os.environ.update(env)
+
+        paths = {name: endpoint_paths(name, args.requests, args.rows, args.seed, args.page_size)
+                 for name in endpoints}
+        print(f"rows={args.rows} requests={args.requests} concurrency={args.concurrency} "
+              f"database={'postgresql' if args.postgres else 'sqlite'}")
+        results = {}
+        if args.mode in ('inprocess', 'both'):
+            results['inprocess'] = run_inprocess(args, paths)
+        if args.mode in ('http', 'both'):
+            results['http'] = run_http(args, env, paths)
+        print_results(results)
+
+    report = {
+        'params': {'rows': args.rows, 'image_ratio': args.image_ratio, 'requests': args.requests,
+                   'concurrency': args.concurrency, 'seed': args.seed, 'page_size': args.page_size,
+                   'accept_encoding': args.accept_encoding,
+                   'database': 'postgresql' if args.postgres else 'sqlite'},
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'recorded_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'results': results,
+    }
+    if args.save:
+        save_baseline(args.save, report)
+    if args.compare and compare_baseline(args.compare, report, args.tolerance):
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
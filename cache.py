@@ -0,0 +1,215 @@
+import fnmatch
+import importlib.util
+import json
+import threading
+import time
+from collections import OrderedDict
+
+# redis (shared cache backend) is imported only when that backend is built
+REDIS_AVAILABLE = importlib.util.find_spec('redis') is not None
+
+
+class CacheStats:
+    """Hit/miss/eviction counters shared by every cache backend"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.errors = 0
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def as_dict(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations,
+                'errors': self.errors,
+            }
+
+
+class LRUCache:
+    """In-process LRU cache with a size bound and per-entry TTL"""
+
+    backend = 'memory'
+
+    def __init__(self, maxsize=10000, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.counters = CacheStats()
+        self._lock = threading.Lock()
+        self._data = OrderedDict()  # key -> (expires_at, value)
+
+    def get(self, key):
+        """Return the cached value, or None on a miss"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self._data.move_to_end(key)
+                    self.counters.incr('hits')
+                    return value
+                del self._data[key]
+                self.counters.incr('expirations')
+        self.counters.incr('misses')
+        return None
+
+    def set(self, key, value):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.counters.incr('evictions')
+
+    def delete(self, key):
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self.counters.incr('invalidations')
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        data = self.counters.as_dict()
+        with self._lock:
+            data.update({'backend': self.backend, 'size': len(self._data),
+                         'maxsize': self.maxsize, 'ttl': self.ttl})
+        return data
+
+
+class LocalSharedClient:
+    """In-process stand-in for a Redis client (get / set(ex=) / delete / scan_iter)
+
+    Lets the shared cache backend be exercised without a Redis server.
+    Values are stored as bytes, exactly as Redis would return them.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._data = {}
+
+    def get(self, name):
+        with self._lock:
+            entry = self._data.get(name)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._data[name]
+                return None
+            return value
+
+    def set(self, name, value, ex=None):
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        with self._lock:
+            self._data[name] = (time.monotonic() + ex if ex else None, value)
+        return True
+
+    def delete(self, *names):
+        with self._lock:
+            return sum(1 for name in names if self._data.pop(name, None) is not None)
+
+    def scan_iter(self, match=None, count=None):
+        # Like SCAN, keys added or removed while iterating may be missed
+        with self._lock:
+            names = list(self._data)
+        return (name for name in names if match is None or fnmatch.fnmatchcase(name, match))
+
+    def dbsize(self):
+        with self._lock:
+            return len(self._data)
+
+
+class SharedCache:
+    """Cache stored in a shared key/value server so every worker sees it
+
+    Values are JSON-encoded; anything JSON can't represent natively (e.g.
+    PostgreSQL timestamps) comes back as a string. Eviction is left to the
+    server's own maxmemory policy.
+    """
+
+    backend = 'shared'
+
+    def __init__(self, client, namespace='cache', ttl=300):
+        self.client = client
+        self.namespace = namespace
+        self.ttl = ttl
+        self.counters = CacheStats()
+
+    def _key(self, key):
+        return f"{self.namespace}:{key}"
+
+    # A cache outage must never fail the request: errors count as misses
+    def get(self, key):
+        try:
+            raw = self.client.get(self._key(key))
+        except Exception:
+            self.counters.incr('errors')
+            raw = None
+        if raw is None:
+            self.counters.incr('misses')
+            return None
+        self.counters.incr('hits')
+        return json.loads(raw)
+
+    def set(self, key, value):
+        try:
+            self.client.set(self._key(key), json.dumps(value, default=str), ex=self.ttl or None)
+        except Exception:
+            self.counters.incr('errors')
+
+    def delete(self, key):
+        try:
+            if self.client.delete(self._key(key)):
+                self.counters.incr('invalidations')
+        except Exception:
+            self.counters.incr('errors')
+
+    def clear(self, batch_size=500):
+        """Delete this namespace's entries (SCAN, so the server isn't blocked)"""
+        try:
+            batch = []
+            for name in self.client.scan_iter(match=f"{self.namespace}:*", count=batch_size):
+                batch.append(name)
+                if len(batch) >= batch_size:
+                    self.client.delete(*batch)
+                    batch = []
+            if batch:
+                self.client.delete(*batch)
+        except Exception:
+            self.counters.incr('errors')
+
+    def stats(self):
+        data = self.counters.as_dict()
+        data.update({'backend': self.backend, 'namespace': self.namespace, 'ttl': self.ttl})
+        return data
+
+
+def create_cache(backend='memory', url=None, maxsize=10000, ttl=300, namespace='cache'):
+    """Build a cache for the configured backend: memory, local or redis"""
+    if backend == 'memory':
+        return LRUCache(maxsize=maxsize, ttl=ttl)
+    if backend == 'local':
+        return SharedCache(LocalSharedClient(), namespace=namespace, ttl=ttl)
+    if backend == 'redis':
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("Cache backend 'redis' requires the redis package")
+        import redis
+        return SharedCache(redis.Redis.from_url(url or 'redis://localhost:6379/0'), namespace=namespace, ttl=ttl)
+    raise ValueError(f"Unknown cache backend: {backend}")
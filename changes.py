@@ -0,0 +1,112 @@
+import contextlib
+import threading
+import time
+
+
+class ChangeNotifier:
+    """Wakes change-feed waiters (long-polls, SSE streams) after student writes
+
+    Writes committed in this process call notify(), so waiters here see
+    them at once. Writes from other worker processes are only seen by
+    re-reading the change counter, which waiters do at least every
+    `poll_interval` seconds.
+    """
+
+    def __init__(self, poll_interval=1.0):
+        self.poll_interval = poll_interval
+        self._condition = threading.Condition()
+        self._generation = 0
+
+    def notify(self):
+        with self._condition:
+            self._generation += 1
+            self._condition.notify_all()
+
+    def wait(self, since, timeout, current_version):
+        """Block until the change counter passes `since` or `timeout` seconds pass
+
+        `current_version()` reads the counter (and must not hold a pooled
+        connection afterwards). Returns the last version read.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._condition:
+                generation = self._generation
+            version = current_version()
+            remaining = deadline - time.monotonic()
+            if version > since or remaining <= 0:
+                return version
+            with self._condition:
+                # A notify() between the read and here is not lost
+                if self._generation == generation:
+                    self._condition.wait(min(self.poll_interval, remaining))
+
+
+class CacheInvalidator:
+    """Evicts students written by other workers from a per-process cache
+
+    A 'memory' cache only hears about writes made in its own worker (see
+    evict()). For the rest, callers read the change counter when due() says
+    so -- every `poll_interval` seconds, or at once when forced -- and pass
+    the change log entries after `version` to apply(), which evicts those
+    ids, or everything if the log no longer reaches back that far.
+
+    Rows read from the database are cached with store(), which drops them
+    if an eviction ran since `generation` was read before the query: the
+    row may predate the write that caused it. Without `poll_interval` (a
+    shared cache, which every worker invalidates) nothing is polled and
+    cache calls are not made under the lock.
+    """
+
+    def __init__(self, cache, poll_interval=1.0, batch_size=1000):
+        self.cache = cache
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.version = None
+        self.generation = 0
+        self._checked = None
+        self._lock = threading.Lock()
+
+    def due(self, force=False):
+        """True if the caller should read the change log now (polling only when `poll_interval` is set)"""
+        if self.poll_interval is None:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._checked is not None and now - self._checked < self.poll_interval:
+                return False
+            self._checked = now
+            return True
+
+    def apply(self, since, pruned_through, latest, changes):
+        """Evict what changed after `since` (the `version` read before the query)
+
+        `pruned_through` and `latest` are the change log's bounds, and
+        `changes` its (seq, student_id) entries after `since`, up to
+        `batch_size` of them.
+        """
+        with self._lock:
+            if since is None or since < pruned_through or len(changes) >= self.batch_size:
+                self.cache.clear()
+                self.generation += 1
+            elif changes:
+                for _, student_id in changes:
+                    self.cache.delete(student_id)
+                self.generation += 1
+            seen = max(latest, changes[-1][0] if changes else latest)
+            self.version = seen if self.version is None else max(self.version, seen)
+
+    def _cache_lock(self):
+        return self._lock if self.poll_interval is not None else contextlib.nullcontext()
+
+    def evict(self, ids):
+        """Drop students this worker has just written"""
+        with self._cache_lock():
+            self.generation += 1
+            for student_id in ids:
+                self.cache.delete(student_id)
+
+    def store(self, student_id, student, generation):
+        with self._cache_lock():
+            if generation == self.generation:
+                self.cache.set(student_id, student)
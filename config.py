@@ -3,12 +3,152 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+def env_bool(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.lower() in ('1', 'true', 'yes')
+
 class Config:
     """Base configuration"""
     SECRET_KEY = os.environ.get('SECRET_KEY', 'ahmed')
     UPLOAD_FOLDER = os.environ.get('UPLOAD_FOLDER', 'static/uploads')
     MAX_CONTENT_LENGTH = int(os.environ.get('MAX_CONTENT_LENGTH', 5242880))
     API_KEY = os.environ.get('API_KEY', 'your-secret-api-key-123')
+    # More keys as comma-separated name:key pairs; API_KEY is named 'default'
+    API_KEYS = os.environ.get('API_KEYS')
+    
+    # Database: PostgreSQL at DATABASE_URL, else SQLite at SQLITE_PATH
+    DATABASE_URL = os.environ.get('DATABASE_URL')
+    SQLITE_PATH = os.environ.get('SQLITE_PATH')  # default: students.db next to the app
+    DB_AUTO_MIGRATE = os.environ.get('DB_AUTO_MIGRATE')  # default: on for SQLite, off for PostgreSQL
+    
+    # Database connection pool
+    DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', 1))
+    DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 10))
+    DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+    DB_POOL_MAX_IDLE = float(os.environ.get('DB_POOL_MAX_IDLE', 300))
+    DB_POOL_MAX_LIFETIME = float(os.environ.get('DB_POOL_MAX_LIFETIME', 3600))
+    DB_POOL_CHECK_INTERVAL = float(os.environ.get('DB_POOL_CHECK_INTERVAL', 30))
+    
+    # Read replicas (comma-separated); SQLite paths are local stand-ins
+    DATABASE_REPLICA_URLS = os.environ.get('DATABASE_REPLICA_URLS')
+    SQLITE_REPLICA_PATHS = os.environ.get('SQLITE_REPLICA_PATHS')
+    REPLICA_RETRY_INTERVAL = float(os.environ.get('REPLICA_RETRY_INTERVAL', 30))
+    REPLICA_STICKY_SECONDS = float(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+    
+    # SQLite tuning (ignored with PostgreSQL)
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+    SQLITE_CACHE_SIZE = int(os.environ.get('SQLITE_CACHE_SIZE', -64000))
+    SQLITE_BUSY_TIMEOUT = int(os.environ.get('SQLITE_BUSY_TIMEOUT', 5000))
+    SQLITE_CACHED_STATEMENTS = int(os.environ.get('SQLITE_CACHED_STATEMENTS', 256))
+    SQLITE_WRITE_QUEUE = env_bool('SQLITE_WRITE_QUEUE', True)
+    SQLITE_WRITE_BATCH = int(os.environ.get('SQLITE_WRITE_BATCH', 64))
+    SQLITE_WRITE_DELAY = float(os.environ.get('SQLITE_WRITE_DELAY', 0))
+    
+    # Templates: auto-reload follows DEBUG unless set; precompiled templates
+    # (flask compile-templates) are loaded from TEMPLATES_COMPILED_DIR
+    TEMPLATES_AUTO_RELOAD = env_bool('TEMPLATES_AUTO_RELOAD', None)
+    TEMPLATES_COMPILED_DIR = os.environ.get('TEMPLATES_COMPILED_DIR', 'compiled_templates')
+    
+    # Recompute dashboard stats from the database at most this often (seconds)
+    STATS_RECOMPUTE_INTERVAL = int(os.environ.get('STATS_RECOMPUTE_INTERVAL', 60))
+    
+    # Read-through cache for single-student lookups. A 'memory' cache
+    # re-reads the change counter every CHANGES_POLL_INTERVAL seconds (and
+    # on conditional requests) to drop students other workers changed
+    STUDENT_CACHE_BACKEND = os.environ.get('STUDENT_CACHE_BACKEND', 'memory')
+    STUDENT_CACHE_URL = os.environ.get('STUDENT_CACHE_URL')
+    STUDENT_CACHE_SIZE = int(os.environ.get('STUDENT_CACHE_SIZE', 10000))
+    STUDENT_CACHE_TTL = int(os.environ.get('STUDENT_CACHE_TTL', 300))
+    
+    # Logged-in user lookups: signed session payload, then this cache
+    USER_CACHE_BACKEND = os.environ.get('USER_CACHE_BACKEND', 'memory')
+    USER_CACHE_URL = os.environ.get('USER_CACHE_URL')
+    USER_CACHE_SIZE = int(os.environ.get('USER_CACHE_SIZE', 10000))
+    USER_CACHE_TTL = int(os.environ.get('USER_CACHE_TTL', 300))
+    USER_SESSION_CACHE = env_bool('USER_SESSION_CACHE', True)
+    USER_SESSION_TTL = int(os.environ.get('USER_SESSION_TTL', 300))
+    
+    # Password hashing runs on a bounded process pool
+    BCRYPT_LOG_ROUNDS = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', 2))
+    PASSWORD_HASH_MAX_PENDING = int(os.environ.get('PASSWORD_HASH_MAX_PENDING', 8))
+    PASSWORD_HASH_QUEUE_TIMEOUT = float(os.environ.get('PASSWORD_HASH_QUEUE_TIMEOUT', 2))
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+    
+    # Rendered HTML fragment cache
+    RENDER_CACHE_BACKEND = os.environ.get('RENDER_CACHE_BACKEND', 'memory')
+    RENDER_CACHE_URL = os.environ.get('RENDER_CACHE_URL')
+    RENDER_CACHE_SIZE = int(os.environ.get('RENDER_CACHE_SIZE', 1000))
+    RENDER_CACHE_TTL = int(os.environ.get('RENDER_CACHE_TTL', 60))
+    
+    # Under `uvicorn asgi:app`, serve GET /api/students natively on asyncio
+    # instead of through the Flask app's thread pool
+    ASYNC_STUDENT_API = env_bool('ASYNC_STUDENT_API', True)
+
+    # Instrumentation: per-route metrics at /metrics, slow-query log and
+    # cProfile dumps of a sampled fraction of requests (0 turns it off)
+    METRICS_ENABLED = env_bool('METRICS_ENABLED', True)
+    SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 500))
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0))
+    PROFILE_DIR = os.environ.get('PROFILE_DIR', 'profiles')
+
+    # API responses: JSON encoder ('auto' is orjson when installed, else the
+    # stdlib) and gzip/br compression of bodies of at least COMPRESS_MIN_SIZE
+    JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'auto')
+    COMPRESS_ENABLED = env_bool('COMPRESS_ENABLED', True)
+    COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+    COMPRESS_GZIP_LEVEL = int(os.environ.get('COMPRESS_GZIP_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4))
+
+    # Change feed (GET /api/students/changes and its SSE stream). Waiting
+    # clients re-read the change counter every CHANGES_POLL_INTERVAL seconds
+    # to see writes from other workers; `flask prune-changes` keeps
+    # CHANGES_RETENTION_DAYS of the log
+    CHANGES_POLL_INTERVAL = float(os.environ.get('CHANGES_POLL_INTERVAL', 1))
+    CHANGES_MAX_WAIT = int(os.environ.get('CHANGES_MAX_WAIT', 30))
+    CHANGES_HEARTBEAT = int(os.environ.get('CHANGES_HEARTBEAT', 15))
+    CHANGES_STREAM_MAX_SECONDS = int(os.environ.get('CHANGES_STREAM_MAX_SECONDS', 300))
+    CHANGES_RETENTION_DAYS = int(os.environ.get('CHANGES_RETENTION_DAYS', 30))
+
+    # API admission control per key and route class ('read': single
+    # students and stats, 'list': list/export, 'feed': change feed long
+    # polls and streams, 'write': any non-GET), as
+    # rate:burst:concurrency:key_concurrency -- a token bucket of `rate`
+    # requests/s up to `burst`, then at most `concurrency` requests of the
+    # class running in each worker, `key_concurrency` of them for one key
+    # (0 turns a part off). Token buckets are per process ('memory') or
+    # shared by all workers ('redis', 'local' as its stand-in)
+    RATE_LIMIT_ENABLED = env_bool('RATE_LIMIT_ENABLED', True)
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+    RATE_LIMIT_URL = os.environ.get('RATE_LIMIT_URL')
+    RATE_LIMIT_READ = os.environ.get('RATE_LIMIT_READ', '50:100:32:16')
+    RATE_LIMIT_LIST = os.environ.get('RATE_LIMIT_LIST', '5:10:4:2')
+    RATE_LIMIT_FEED = os.environ.get('RATE_LIMIT_FEED', '1:5:16:2')
+    RATE_LIMIT_WRITE = os.environ.get('RATE_LIMIT_WRITE', '10:20:8:4')
+
+    # Bulk API
+    BULK_CHUNK_SIZE = int(os.environ.get('BULK_CHUNK_SIZE', 500))
+    BULK_MAX_ITEMS = int(os.environ.get('BULK_MAX_ITEMS', 50000))
+    
+    # Uploads are normalized and thumbnailed in the background
+    IMAGE_PROCESSING_WORKERS = int(os.environ.get('IMAGE_PROCESSING_WORKERS', 2))
+    
+    # Content-addressed upload storage: local (UPLOAD_FOLDER) or s3
+    STORAGE_BACKEND = os.environ.get('STORAGE_BACKEND', 'local')
+    STORAGE_BUCKET = os.environ.get('STORAGE_BUCKET')
+    STORAGE_PUBLIC_URL = os.environ.get('STORAGE_PUBLIC_URL')
+    STORAGE_GC_INTERVAL = int(os.environ.get('STORAGE_GC_INTERVAL', 3600))
+    STORAGE_GC_GRACE = int(os.environ.get('STORAGE_GC_GRACE', 3600))
+    
+    # Serving uploads: content-addressed files are immutable
+    UPLOADS_IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+    UPLOADS_MAX_AGE = int(os.environ.get('UPLOADS_MAX_AGE', 3600))
+    UPLOADS_ACCEL_REDIRECT = os.environ.get('UPLOADS_ACCEL_REDIRECT')  # e.g. /protected-uploads/
+    USE_X_SENDFILE = env_bool('UPLOADS_X_SENDFILE', False)
 
 class DevelopmentConfig(Config):
     """Development configuration - uses SQLite"""
@@ -27,6 +167,7 @@ config = {
     'default': DevelopmentConfig
 }
 
-def get_config():
-    env = os.environ.get('FLASK_ENV', 'development')
+def get_config(name=None):
+    """Config class for `name`, or for FLASK_ENV when not given"""
+    env = name or os.environ.get('FLASK_ENV', 'development')
     return config.get(env, config['default'])
\ No newline at end of file
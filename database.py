@@ -1,133 +1,696 @@
+import importlib.util
+import logging
 import sqlite3
 import os
+import threading
+import time
 from urllib.parse import urlparse
+from flask import g, has_app_context, has_request_context, session
+from pool import ConnectionPool
+from writer import WriteQueue
+import migrations
 
-# Try to import psycopg (version 3)
-try:
-    import psycopg
-    from psycopg.rows import dict_row
-    PSYCOPG_AVAILABLE = True
-except ImportError:
-    PSYCOPG_AVAILABLE = False
+# psycopg (version 3) is only imported when PostgreSQL is actually used;
+# it is slow to import and SQLite deployments never need it
+PSYCOPG_AVAILABLE = importlib.util.find_spec('psycopg') is not None
+
+def _split_list(value):
+    return [item.strip() for item in (value or '').split(',') if item.strip()]
+
+# Settings from the Flask app config, set by init_app(); code that uses the
+# database without an app (scripts, benchmarks) falls back to the environment
+_app_config = {}
+
+def _setting(name, default=None):
+    """A database setting: the app config's value, else the environment's, else `default`
+    
+    A setting present in the app config wins even when it is None (which
+    means `default`), so the environment can't override a config object.
+    """
+    if name in _app_config:
+        value = _app_config[name]
+    else:
+        value = os.environ.get(name)
+    return default if value is None else value
+
+def _bool_setting(name, default):
+    value = _setting(name, default)
+    if isinstance(value, str):
+        return value.lower() in ('1', 'true', 'yes')
+    return bool(value)
 
 def get_db_config():
-    """Get database configuration from environment"""
-    database_url = os.environ.get('DATABASE_URL')
+    """Get database configuration from the app config or environment
+    
+    `replicas` lists read replicas: DATABASE_REPLICA_URLS for PostgreSQL,
+    or SQLITE_REPLICA_PATHS (copies of the database file) as stand-ins
+    when testing the routing locally.
+    """
+    database_url = _setting('DATABASE_URL')
     
     if database_url and PSYCOPG_AVAILABLE:
         # Parse PostgreSQL URL
         parsed = urlparse(database_url)
         return {
             'type': 'postgresql',
-            'url': database_url
+            'url': database_url,
+            'replicas': _split_list(_setting('DATABASE_REPLICA_URLS'))
         }
     else:
         # Use SQLite for local development
         return {
             'type': 'sqlite',
-            'path': os.path.join(os.path.dirname(os.path.abspath(__file__)), 'students.db')
+            'path': _setting('SQLITE_PATH') or os.path.join(os.path.dirname(os.path.abspath(__file__)), 'students.db'),
+            'replicas': _split_list(_setting('SQLITE_REPLICA_PATHS'))
         }
 
-def get_connection():
-    """Get database connection (SQLite or PostgreSQL)"""
+def get_replica_config():
+    """Get read-replica routing settings (REPLICA_*)"""
+    return {
+        # Seconds a replica that failed a checkout is skipped before retrying
+        'retry_interval': float(_setting('REPLICA_RETRY_INTERVAL', 30)),
+        # Seconds after a write during which that session reads the primary
+        'sticky_seconds': float(_setting('REPLICA_STICKY_SECONDS', 5)),
+    }
+
+def get_pool_config():
+    """Get connection pool sizing (DB_POOL_*)"""
+    return {
+        'min_size': int(_setting('DB_POOL_MIN_SIZE', 1)),
+        'max_size': int(_setting('DB_POOL_MAX_SIZE', 10)),
+        'timeout': float(_setting('DB_POOL_TIMEOUT', 30)),
+        'max_idle': float(_setting('DB_POOL_MAX_IDLE', 300)),
+        'max_lifetime': float(_setting('DB_POOL_MAX_LIFETIME', 3600)),
+        'check_interval': float(_setting('DB_POOL_CHECK_INTERVAL', 30)),
+    }
+
+SQLITE_JOURNAL_MODES = {'WAL', 'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY'}
+SQLITE_SYNCHRONOUS_MODES = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+
+def get_sqlite_config():
+    """Get SQLite tuning (SQLITE_*; unused with PostgreSQL)
+    
+    The defaults are a production profile: WAL lets readers run alongside
+    the writer, and synchronous=NORMAL is durable in WAL mode except for
+    the last transactions before a power loss.
+    """
+    journal_mode = _setting('SQLITE_JOURNAL_MODE', 'WAL').upper()
+    synchronous = _setting('SQLITE_SYNCHRONOUS', 'NORMAL').upper()
+    if journal_mode not in SQLITE_JOURNAL_MODES:
+        raise ValueError(f"Invalid SQLITE_JOURNAL_MODE: {journal_mode}")
+    if synchronous not in SQLITE_SYNCHRONOUS_MODES:
+        raise ValueError(f"Invalid SQLITE_SYNCHRONOUS: {synchronous}")
+    return {
+        'journal_mode': journal_mode,
+        'synchronous': synchronous,
+        'mmap_size': int(_setting('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)),
+        # Negative values are KiB, positive values are pages
+        'cache_size': int(_setting('SQLITE_CACHE_SIZE', -64000)),
+        'busy_timeout': int(_setting('SQLITE_BUSY_TIMEOUT', 5000)),  # ms
+        'cached_statements': int(_setting('SQLITE_CACHED_STATEMENTS', 256)),
+        'write_queue': _bool_setting('SQLITE_WRITE_QUEUE', True),
+        'write_batch': int(_setting('SQLITE_WRITE_BATCH', 64)),
+        'write_delay': float(_setting('SQLITE_WRITE_DELAY', 0)),
+    }
+
+def apply_sqlite_pragmas(conn, sqlite_config):
+    """Per-connection tuning; journal_mode is persistent and set by init_db()"""
+    conn.execute(f"PRAGMA busy_timeout = {int(sqlite_config['busy_timeout'])}")
+    conn.execute(f"PRAGMA synchronous = {sqlite_config['synchronous']}")
+    conn.execute(f"PRAGMA cache_size = {int(sqlite_config['cache_size'])}")
+    conn.execute(f"PRAGMA mmap_size = {int(sqlite_config['mmap_size'])}")
+
+def connect(target=None):
+    """Open a new, unpooled database connection (SQLite or PostgreSQL)
+    
+    `target` is a replica URL (or SQLite path); the default is the primary.
+    """
     config = get_db_config()
     
     if config['type'] == 'postgresql':
         # PostgreSQL connection with psycopg3
-        conn = psycopg.connect(config['url'], row_factory=dict_row)
+        import psycopg
+        from psycopg.rows import dict_row
+        conn = psycopg.connect(target or config['url'], row_factory=dict_row)
         return conn
     else:
-        # SQLite connection
-        conn = sqlite3.connect(config['path'])
+        # SQLite connection; pooled connections move between request threads
+        sqlite_config = get_sqlite_config()
+        conn = sqlite3.connect(target or config['path'], check_same_thread=False,
+                               timeout=sqlite_config['busy_timeout'] / 1000,
+                               cached_statements=sqlite_config['cached_statements'])
         conn.row_factory = sqlite3.Row
+        apply_sqlite_pragmas(conn, sqlite_config)
         return conn
 
+def _reset_connection(conn):
+    """Drop any uncommitted work before a connection goes back to the pool"""
+    conn.rollback()
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Get the process-wide connection pool, creating it on first use"""
+    global _pool
+    pool = _pool
+    # A pool inherited across fork() holds the parent's sockets; start fresh.
+    if pool is None or pool.pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool.pid != os.getpid():
+                _pool = ConnectionPool(connect, reset=_reset_connection, **get_pool_config())
+            pool = _pool
+    return pool
+
+def close_pool():
+    """Close the connection pool (e.g. on shutdown or in tests)"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None and _pool.pid == os.getpid():
+            _pool.close()
+        _pool = None
+
+def pool_stats():
+    """Get connection pool statistics"""
+    return get_pool().stats()
+
+def get_query_log_config():
+    """Slow-query log threshold in seconds (SLOW_QUERY_MS; 0 turns it off)"""
+    return {
+        'slow_query_threshold': float(_setting('SLOW_QUERY_MS', 500)) / 1000,
+    }
+
+slow_query_log = logging.getLogger('slow_queries')
+_slow_queries = 0
+
+def slow_query_count():
+    """Statements logged as slow by this process"""
+    return _slow_queries
+
+def _request_db_stats():
+    """Per-request DB counters (kept on g), or None outside an app context"""
+    if not has_app_context():
+        return None
+    stats = g.get('_db_stats')
+    if stats is None:
+        stats = g._db_stats = {'queries': 0, 'query_time': 0.0, 'pool_wait': 0.0}
+    return stats
+
+def request_db_stats():
+    """Queries run, time spent in them and time waiting for pool connections in this request"""
+    return dict(_request_db_stats() or {'queries': 0, 'query_time': 0.0, 'pool_wait': 0.0})
+
+def _record_query(sql, elapsed, total=None, new=True):
+    """Account for time spent running (new=True) or fetching a statement
+    
+    `total` is the statement's time so far; it's logged once when it
+    crosses the slow-query threshold. Returns True when it was logged.
+    """
+    global _slow_queries
+    stats = _request_db_stats()
+    if stats is not None:
+        if new:
+            stats['queries'] += 1
+        stats['query_time'] += elapsed
+    total = elapsed if total is None else total
+    threshold = get_query_log_config()['slow_query_threshold']
+    if threshold > 0 and total >= threshold:
+        _slow_queries += 1
+        slow_query_log.warning("Slow query (%.1fms): %s", total * 1000, ' '.join(str(sql).split()))
+        return True
+    return False
+
+def _record_pool_wait(elapsed):
+    stats = _request_db_stats()
+    if stats is not None:
+        stats['pool_wait'] += elapsed
+
+class TimedCursor:
+    """Cursor proxy that adds execute and fetch time to the request's DB stats
+    
+    SQLite produces most rows while they are fetched, not in execute(), so
+    fetches count towards the statement's time too.
+    """
+
+    def __init__(self, cursor, sql=None):
+        self._cursor = cursor
+        self._sql = sql
+        self._elapsed = 0.0
+        self._logged = False
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        # e.g. cursor.itersize on psycopg's named cursors
+        if name.startswith('_'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._cursor, name, value)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __enter__(self):
+        self._cursor.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._cursor.__exit__(*exc)
+
+    def _timed(self, method, args, sql=None):
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            if sql is not None:
+                self._sql, self._elapsed, self._logged = sql, 0.0, False
+            self._elapsed += elapsed
+            if self._sql is not None:
+                logged = _record_query(self._sql, elapsed, self._elapsed, new=sql is not None)
+                self._logged = self._logged or logged
+                if self._logged:
+                    # Only log a statement once, however many fetches it takes
+                    self._elapsed = float('-inf')
+
+    def execute(self, sql, *args, **kwargs):
+        self._timed(lambda: self._cursor.execute(sql, *args, **kwargs), (), sql)
+        return self
+
+    def executemany(self, sql, *args, **kwargs):
+        self._timed(lambda: self._cursor.executemany(sql, *args, **kwargs), (), sql)
+        return self
+
+    def fetchone(self):
+        return self._timed(self._cursor.fetchone, ())
+
+    def fetchmany(self, *args):
+        return self._timed(self._cursor.fetchmany, args)
+
+    def fetchall(self):
+        return self._timed(self._cursor.fetchall, ())
+
+class PooledConnection:
+    """Proxy around a pooled connection; close() hands it back to the pool
+    
+    Statements run through it are counted and timed for the request's
+    metrics and the slow-query log.
+    """
+
+    def __init__(self, conn, pool, scoped=False, replica=False):
+        self._conn = conn
+        self._pool = pool
+        self._scoped = scoped
+        self.replica = replica
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def execute(self, sql, *args, **kwargs):
+        return TimedCursor(self._conn.cursor()).execute(sql, *args, **kwargs)
+
+    def executemany(self, sql, *args, **kwargs):
+        return TimedCursor(self._conn.cursor()).executemany(sql, *args, **kwargs)
+
+    def cursor(self, *args, **kwargs):
+        return TimedCursor(self._conn.cursor(*args, **kwargs))
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def close(self):
+        # Request-scoped connections are returned by the teardown hook, so
+        # routes can keep calling close() as they always have.
+        if not self._scoped:
+            self.release()
+
+    def release(self, discard=False):
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.putconn(conn, discard=discard)
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_writer():
+    """Get the process-wide SQLite write queue, or None if writes go direct"""
+    global _writer
+    if get_db_config()['type'] != 'sqlite':
+        return None
+    sqlite_config = get_sqlite_config()
+    if not sqlite_config['write_queue']:
+        return None
+    writer = _writer
+    if writer is None or writer.pid != os.getpid():
+        with _writer_lock:
+            if _writer is None or _writer.pid != os.getpid():
+                _writer = WriteQueue(connect, max_batch=sqlite_config['write_batch'],
+                                     max_delay=sqlite_config['write_delay'])
+            writer = _writer
+    return writer
+
+def close_writer():
+    """Drain and stop the write queue (e.g. on shutdown or in tests)"""
+    global _writer
+    with _writer_lock:
+        if _writer is not None and _writer.pid == os.getpid():
+            _writer.close()
+        _writer = None
+
+def writer_stats():
+    """Get write queue statistics, or None when writes don't use the queue"""
+    writer = get_writer()
+    return writer.stats() if writer else None
+
+def run_write(func, *args):
+    """Run func(conn, *args) as one committed write and return its result
+    
+    On SQLite the job goes through the process's single writer thread and is
+    group-committed with other queued writes, so concurrent requests don't
+    fight over the database lock. Otherwise it runs on the request's pooled
+    connection. Either way `func` must not commit; the caller must not hold
+    uncommitted writes of its own, or the writer would wait on its lock.
+    """
+    writer = get_writer()
+    if writer is not None:
+        result = writer.run(func, *args)
+        mark_write()
+        return result
+    
+    conn = get_connection()
+    try:
+        result = func(conn, *args)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+    mark_write()
+    return result
+
+def get_connection():
+    """Get database connection (SQLite or PostgreSQL) from the pool
+    
+    Inside a Flask app context the connection is checked out once and shared
+    for the rest of the request; it goes back to the pool on teardown.
+    """
+    if has_app_context():
+        conn = g.get('_db_conn')
+        if conn is None:
+            pool = get_pool()
+            conn = PooledConnection(_timed_checkout(pool.getconn), pool, scoped=True)
+            g._db_conn = conn
+        return conn
+    
+    pool = get_pool()
+    return PooledConnection(pool.getconn(), pool)
+
+def _timed_checkout(getconn):
+    """Check out a connection, adding the wait to the request's pool_wait"""
+    started = time.perf_counter()
+    try:
+        return getconn()
+    finally:
+        _record_pool_wait(time.perf_counter() - started)
+
+# -------------------- Read replicas --------------------
+class ReplicaRouter:
+    """Round-robin over read replicas with failover to the primary
+    
+    Each replica has its own connection pool, whose checkout health check
+    catches dead connections. A replica that can't hand out a connection
+    is skipped for `retry_interval` seconds; when every replica is down,
+    getconn() returns None and the caller reads from the primary.
+    """
+
+    def __init__(self, targets, retry_interval=30.0):
+        self.targets = list(targets)
+        self.retry_interval = retry_interval
+        # Pools are only valid in the process that opened them
+        self.pid = os.getpid()
+
+        self._lock = threading.Lock()
+        self._next = 0
+        self._pools = {}
+        self._down_until = {}
+        self._reads = {target: 0 for target in self.targets}
+        self._failures = {target: 0 for target in self.targets}
+        self._fallbacks = 0
+
+    def _get_pool(self, target):
+        with self._lock:
+            pool = self._pools.get(target)
+            if pool is None:
+                pool = ConnectionPool(lambda: connect(target), reset=_reset_connection, **get_pool_config())
+                self._pools[target] = pool
+            return pool
+
+    def _candidates(self):
+        """Replicas in round-robin order, skipping ones marked down"""
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.targets)
+            now = time.monotonic()
+            ordered = self.targets[start:] + self.targets[:start]
+            return [target for target in ordered if self._down_until.get(target, 0) <= now]
+
+    def getconn(self):
+        """Check out a replica connection as (conn, pool), or None to use the primary"""
+        for target in self._candidates():
+            try:
+                pool = self._get_pool(target)
+                conn = pool.getconn()
+            except Exception as e:
+                with self._lock:
+                    self._failures[target] += 1
+                    self._down_until[target] = time.monotonic() + self.retry_interval
+                print(f"Read replica {_describe(target)} unavailable: {e}")
+                continue
+            with self._lock:
+                self._reads[target] += 1
+                self._down_until.pop(target, None)
+            return conn, pool
+        
+        with self._lock:
+            self._fallbacks += 1
+        return None
+
+    def close(self):
+        with self._lock:
+            pools, self._pools = list(self._pools.values()), {}
+        for pool in pools:
+            pool.close()
+
+    def stats(self):
+        with self._lock:
+            now = time.monotonic()
+            replicas = []
+            for target in self.targets:
+                pool = self._pools.get(target)
+                replicas.append({
+                    'replica': _describe(target),
+                    'healthy': self._down_until.get(target, 0) <= now,
+                    'reads': self._reads[target],
+                    'failures': self._failures[target],
+                    'pool': pool.stats() if pool else None,
+                })
+            return {'replicas': replicas, 'primary_fallbacks': self._fallbacks}
+
+def _describe(target):
+    """A replica URL without credentials, for logs and stats"""
+    parsed = urlparse(target)
+    if parsed.hostname:
+        return f"{parsed.hostname}:{parsed.port or 5432}{parsed.path}"
+    return os.path.basename(target)
+
+_router = None
+_router_lock = threading.Lock()
+
+def get_router():
+    """Get the process-wide replica router, or None if no replicas are configured"""
+    global _router
+    replicas = get_db_config()['replicas']
+    if not replicas:
+        return None
+    router = _router
+    if router is None or router.pid != os.getpid() or router.targets != replicas:
+        with _router_lock:
+            if _router is None or _router.pid != os.getpid() or _router.targets != replicas:
+                if _router is not None and _router.pid == os.getpid():
+                    _router.close()
+                _router = ReplicaRouter(replicas, get_replica_config()['retry_interval'])
+            router = _router
+    return router
+
+def close_router():
+    """Close the replica pools (e.g. on shutdown or in tests)"""
+    global _router
+    with _router_lock:
+        if _router is not None and _router.pid == os.getpid():
+            _router.close()
+        _router = None
+
+def replica_stats():
+    """Get replica routing statistics, or None when no replicas are configured"""
+    router = get_router()
+    return router.stats() if router else None
+
+_last_write = 0.0
+
+def mark_write():
+    """Record a committed write for read-your-writes routing
+    
+    The rest of the request, and the session's requests for the next
+    REPLICA_STICKY_SECONDS, read from the primary.
+    """
+    global _last_write
+    _last_write = time.monotonic()
+    if has_request_context() and get_db_config()['replicas']:
+        g._db_wrote = True
+        session['_db_write_at'] = time.time()
+
+def recently_written():
+    """True if replicas are in use and this process wrote within the stickiness window
+    
+    Replica reads in that window may predate the write, so they shouldn't
+    be put in caches.
+    """
+    if not get_db_config()['replicas']:
+        return False
+    return time.monotonic() - _last_write < get_replica_config()['sticky_seconds']
+
+def _reads_pinned_to_primary():
+    if not has_request_context():
+        return False
+    if g.get('_db_wrote'):
+        return True
+    wrote_at = session.get('_db_write_at')
+    return wrote_at is not None and time.time() - wrote_at < get_replica_config()['sticky_seconds']
+
+def get_read_connection():
+    """Get a connection for read-only work, from a replica when possible
+    
+    Falls back to the primary (get_connection()) when no replicas are
+    configured, when they are all down, or when the current session wrote
+    recently. Like get_connection(), it is request-scoped inside an app
+    context.
+    """
+    router = get_router()
+    if router is None or _reads_pinned_to_primary():
+        return get_connection()
+    
+    if has_app_context():
+        conn = g.get('_db_read_conn')
+        if conn is not None:
+            return conn
+    
+    checkout = _timed_checkout(router.getconn)
+    if checkout is None:
+        return get_connection()
+    conn, pool = checkout
+    if has_app_context():
+        g._db_read_conn = PooledConnection(conn, pool, scoped=True, replica=True)
+        return g._db_read_conn
+    return PooledConnection(conn, pool, replica=True)
+
+def release_connection(exception=None):
+    """Teardown hook: return the request's connections to their pools"""
+    for name in ('_db_conn', '_db_read_conn'):
+        conn = g.pop(name, None)
+        if conn is not None:
+            conn.release()
+
+# Settings init_app() takes from the app config
+CONFIG_KEYS = (
+    'DATABASE_URL', 'SQLITE_PATH', 'DATABASE_REPLICA_URLS', 'SQLITE_REPLICA_PATHS', 'DB_AUTO_MIGRATE',
+    'DB_POOL_MIN_SIZE', 'DB_POOL_MAX_SIZE', 'DB_POOL_TIMEOUT', 'DB_POOL_MAX_IDLE',
+    'DB_POOL_MAX_LIFETIME', 'DB_POOL_CHECK_INTERVAL',
+    'REPLICA_RETRY_INTERVAL', 'REPLICA_STICKY_SECONDS',
+    'SQLITE_JOURNAL_MODE', 'SQLITE_SYNCHRONOUS', 'SQLITE_MMAP_SIZE', 'SQLITE_CACHE_SIZE',
+    'SQLITE_BUSY_TIMEOUT', 'SQLITE_CACHED_STATEMENTS', 'SQLITE_WRITE_QUEUE', 'SQLITE_WRITE_BATCH',
+    'SQLITE_WRITE_DELAY',
+    'SLOW_QUERY_MS',
+)
+
+def init_app(app):
+    """Take the database settings from the app config and register
+    request-scoped connection handling
+    
+    The pool, writer and replica router are process-wide and built on
+    first use, so init_app() must run before the first query.
+    """
+    _app_config.clear()
+    _app_config.update((name, app.config[name]) for name in CONFIG_KEYS if name in app.config)
+    app.teardown_appcontext(release_connection)
+
+_search_backend = None
+
+def get_search_backend(conn):
+    """Which text search the database supports: 'fts5', 'trigram' or 'like'"""
+    global _search_backend
+    if _search_backend is None:
+        if get_db_config()['type'] == 'postgresql':
+            row = conn.execute("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'").fetchone()
+            _search_backend = 'trigram' if row else 'like'
+        else:
+            row = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type='table' AND name='students_fts'"
+            ).fetchone()
+            _search_backend = 'fts5' if row else 'like'
+    return _search_backend
+
+def get_migration_config():
+    """Whether startup applies pending migrations itself
+    
+    On by default for SQLite (a local file nobody else migrates); off for
+    PostgreSQL, where `flask db-migrate` runs once per deploy instead of
+    in every booting worker.
+    """
+    return _bool_setting('DB_AUTO_MIGRATE', get_db_config()['type'] == 'sqlite')
+
+def migrate(target=None):
+    """Apply pending schema migrations on a dedicated connection"""
+    config = get_db_config()
+    conn = connect()
+    try:
+        return migrations.migrate(conn, config['type'], target)
+    finally:
+        conn.close()
+
 def init_db():
-    """Initialize database tables"""
+    """Check the schema version at startup
+    
+    Only reads schema_migrations; DDL runs in migrate(), here only when
+    DB_AUTO_MIGRATE is on.
+    """
     config = get_db_config()
     conn = None
     
     try:
         conn = get_connection()
-        cursor = conn.cursor()
+        if config['type'] == 'sqlite':
+            # WAL (by default) is a property of the database file; setting
+            # it again is a no-op
+            conn.execute(f"PRAGMA journal_mode = {get_sqlite_config()['journal_mode']}")
+        version = migrations.current_version(conn)
+        conn.close()
+        conn = None
         
-        if config['type'] == 'postgresql':
-            # PostgreSQL schema
-            print("Initializing PostgreSQL database...")
-            
-            # Create users table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id SERIAL PRIMARY KEY,
-                    username VARCHAR(255) UNIQUE NOT NULL,
-                    password VARCHAR(255) NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Create students table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS students (
-                    id SERIAL PRIMARY KEY,
-                    name VARCHAR(255) NOT NULL,
-                    age INTEGER,
-                    city VARCHAR(255),
-                    image VARCHAR(255),
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Create indexes for better performance
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_students_name ON students(name)
-            """)
-            cursor.execute("""
-                CREATE INDEX IF NOT EXISTS idx_students_city ON students(city)
-            """)
-            
-        else:
-            # SQLite schema
-            print("Initializing SQLite database...")
-            
-            # Enable foreign keys
-            cursor.execute("PRAGMA foreign_keys = ON")
-            
-            # Create users table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS users (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    username TEXT UNIQUE NOT NULL,
-                    password TEXT NOT NULL,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Create students table
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS students (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    name TEXT NOT NULL,
-                    age INTEGER,
-                    city TEXT,
-                    image TEXT,
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                )
-            """)
-            
-            # Check if image column exists, if not add it (for existing databases)
-            cursor.execute("PRAGMA table_info(students)")
-            columns = [column[1] for column in cursor.fetchall()]
-            if 'image' not in columns:
-                cursor.execute("ALTER TABLE students ADD COLUMN image TEXT")
-                print("Added image column to students table")
-        
-        conn.commit()
-        print(f"Database initialized successfully! Using: {config['type']}")
+        if version < migrations.LATEST_VERSION:
+            if get_migration_config():
+                migrate()
+            else:
+                print(f"Database schema is at version {version}, latest is {migrations.LATEST_VERSION}: "
+                      f"run 'flask db-migrate'")
         
     except Exception as e:
         print(f"Database error: {e}")
-        if conn:
-            conn.rollback()
     finally:
         if conn:
-            conn.close()
\ No newline at end of file
+            conn.close()
@@ -0,0 +1,155 @@
+"""Response encoding: the app's JSON provider and gzip/br compression
+
+create_json_provider() picks orjson when it's installed (JSON_PROVIDER
+'auto') and Flask's stdlib provider otherwise. init_app() compresses
+responses of at least COMPRESS_MIN_SIZE bytes with the best encoding the
+client accepts. compress_body() is the same step for asgi.py's fast path.
+"""
+import gzip
+import importlib.util
+
+from flask import current_app, request
+from flask.json.provider import DefaultJSONProvider
+from werkzeug.http import parse_accept_header
+
+ORJSON_AVAILABLE = importlib.util.find_spec('orjson') is not None
+BROTLI_AVAILABLE = importlib.util.find_spec('brotli') is not None
+
+# By server preference; the client's q-values still win
+ENCODINGS = ('br', 'gzip') if BROTLI_AVAILABLE else ('gzip',)
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'application/x-ndjson', 'application/javascript', 'application/xml',
+    'image/svg+xml', 'text/css', 'text/csv', 'text/html', 'text/javascript', 'text/plain',
+}
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask's JSON provider with orjson doing the work
+
+    Output matches DefaultJSONProvider (sorted keys, HTTP dates, Decimal
+    and dataclass handling through default()) except that non-ASCII text
+    is sent as UTF-8 instead of \\u escapes.
+    """
+
+    def __init__(self, app):
+        super().__init__(app)
+        import orjson
+        self._orjson = orjson
+        self._options = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+                         | orjson.OPT_NON_STR_KEYS)
+
+    def _encode(self, obj, indent=False):
+        option = self._options
+        if self.sort_keys:
+            option |= self._orjson.OPT_SORT_KEYS
+        if indent:
+            option |= self._orjson.OPT_INDENT_2
+        return self._orjson.dumps(obj, default=self.default, option=option)
+
+    def dumps(self, obj, **kwargs):
+        # Anything beyond indentation (cls=, custom separators...) is the
+        # stdlib's job, as are integers too big for orjson
+        if set(kwargs) - {'indent'}:
+            return super().dumps(obj, **kwargs)
+        try:
+            return self._encode(obj, kwargs.get('indent')).decode('utf-8')
+        except self._orjson.JSONEncodeError:
+            return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return self._orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        try:
+            body = self._encode(obj, indent)
+        except self._orjson.JSONEncodeError:
+            return super().response(obj)
+        return self._app.response_class(body + b"\n", mimetype=self.mimetype)
+
+
+def create_json_provider(app, name='auto'):
+    """The configured JSON provider: auto, orjson or stdlib"""
+    if name == 'stdlib' or (name == 'auto' and not ORJSON_AVAILABLE):
+        return DefaultJSONProvider(app)
+    if name in ('auto', 'orjson'):
+        if not ORJSON_AVAILABLE:
+            raise RuntimeError("JSON provider 'orjson' requires the orjson package")
+        return OrjsonProvider(app)
+    raise ValueError(f"Unknown JSON provider: {name}")
+
+
+# -------------------- compression --------------------
+def choose_encoding(accept_encoding):
+    """The content coding to use for an Accept-Encoding header, or None"""
+    if not accept_encoding:
+        return None
+    return parse_accept_header(accept_encoding).best_match(ENCODINGS)
+
+
+def compress(body, encoding, config):
+    if encoding == 'br':
+        import brotli
+        return brotli.compress(body, quality=config['COMPRESS_BROTLI_QUALITY'])
+    return gzip.compress(body, compresslevel=config['COMPRESS_GZIP_LEVEL'], mtime=0)
+
+
+def compress_body(body, accept_encoding, config):
+    """(body, encoding) for a response body; encoding is None if left as is"""
+    if not config['COMPRESS_ENABLED'] or len(body) < config['COMPRESS_MIN_SIZE']:
+        return body, None
+    encoding = choose_encoding(accept_encoding)
+    if encoding is None:
+        return body, None
+    compressed = compress(body, encoding, config)
+    if len(compressed) >= len(body):
+        return body, None
+    return compressed, encoding
+
+
+def encoded_etag(etag, encoding):
+    """Strong ETag of the encoded representation (like uploaded_file's `<hash>-gzip`)"""
+    return f"{etag}-{encoding}"
+
+
+def etag_variants(etag):
+    """Every tag a client may hold for `etag`: identity first, then each encoding
+
+    Both encodings are listed even without brotli here, since another
+    worker may have it.
+    """
+    return [etag] + [encoded_etag(etag, name) for name in ('br', 'gzip')]
+
+
+def compress_response(response):
+    """after_request hook: encode eligible responses for this client
+
+    Streamed and file responses (exports, uploads) are left alone, as is
+    anything already encoded or partial. A strong ETag gets the encoding
+    appended, since the encoded bytes differ from the identity ones.
+    """
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code not in (200, 201)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+    response.vary.add('Accept-Encoding')
+    body, encoding = compress_body(response.get_data(), request.headers.get('Accept-Encoding'),
+                                   current_app.config)
+    if encoding is None:
+        return response
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(encoded_etag(etag, encoding))
+    return response
+
+
+def init_app(app):
+    app.json = create_json_provider(app, app.config['JSON_PROVIDER'])
+    if app.config['COMPRESS_ENABLED']:
+        app.after_request(compress_response)
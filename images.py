@@ -0,0 +1,102 @@
+import importlib.util
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Pillow is imported by the image jobs themselves, not at startup;
+# without it uploads are served as-is
+PILLOW_AVAILABLE = importlib.util.find_spec('PIL') is not None
+
+# Longest edge of the normalized original
+MAX_ORIGINAL_SIZE = 1600
+# Square thumbnail edge lengths, in pixels
+THUMBNAIL_SIZES = (64, 256)
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+
+
+def _thumbnail_format():
+    from PIL import features
+    if features.check('webp'):
+        return 'WEBP', 'webp', {'quality': WEBP_QUALITY, 'method': 4}
+    return 'JPEG', 'jpg', {'quality': JPEG_QUALITY, 'optimize': True, 'progressive': True}
+
+
+def _to_rgb(image):
+    """Flatten transparency onto white; JPEG has no alpha channel"""
+    from PIL import Image
+    if image.mode in ('RGBA', 'LA') or (image.mode == 'P' and 'transparency' in image.info):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, (255, 255, 255))
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def _encode(image, fmt, options):
+    buffer = io.BytesIO()
+    image.save(buffer, fmt, **options)
+    return buffer.getvalue()
+
+
+def render_variants(source):
+    """Normalize an uploaded image and render its thumbnails
+
+    `source` is a path or binary file object. Returns
+    {'original': (data, ext), 'thumbnails': {size: (data, ext)}} where the
+    original is rotated per EXIF and at most MAX_ORIGINAL_SIZE on its
+    longest edge. Metadata is dropped because Pillow only writes EXIF/ICC
+    data when asked to.
+    """
+    from PIL import Image, ImageOps
+    with Image.open(source) as opened:
+        image = _to_rgb(ImageOps.exif_transpose(opened))
+
+    original = image.copy()
+    original.thumbnail((MAX_ORIGINAL_SIZE, MAX_ORIGINAL_SIZE), Image.LANCZOS)
+    variants = {
+        'original': (_encode(original, 'JPEG', {'quality': JPEG_QUALITY, 'optimize': True, 'progressive': True}), 'jpg'),
+        'thumbnails': {},
+    }
+
+    fmt, extension, options = _thumbnail_format()
+    for size in THUMBNAIL_SIZES:
+        thumbnail = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        variants['thumbnails'][str(size)] = (_encode(thumbnail, fmt, options), extension)
+
+    return variants
+
+
+def variant_files(variants):
+    """Every stored key referenced by a variants mapping"""
+    if not variants:
+        return []
+    return [variants['original']] + list(variants.get('thumbnails', {}).values())
+
+
+class ImageProcessor:
+    """Runs image jobs on a background thread pool (Pillow releases the GIL)
+
+    With workers=0 jobs run inline, which is handy for tests and scripts.
+    """
+
+    def __init__(self, workers=2):
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def _get_executor(self):
+        # Threads don't survive fork(); start a fresh pool in each worker
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='images')
+                self._pid = os.getpid()
+            return self._executor
+
+    def submit(self, func, *args):
+        if not self.workers:
+            func(*args)
+            return None
+        return self._get_executor().submit(func, *args)
@@ -0,0 +1,276 @@
+import cProfile
+import os
+import random
+import re
+import threading
+import time
+
+from flask import Response, current_app, g, request
+
+import database
+
+# Latency buckets in seconds; DB time and pool waits share them
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (128, 512, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(labels, extra=None):
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, in Prometheus' layout"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # label values -> [bucket counts..., sum, count]
+
+    def observe(self, value, *label_values):
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def collect(self):
+        with self._lock:
+            series = {key: list(values) for key, values in self._series.items()}
+        lines = []
+        for label_values, values in sorted(series.items()):
+            labels = list(zip(self.labels, label_values))
+            for bound, count in zip(self.buckets, values):
+                lines.append(f"{self.name}_bucket{_format_labels(labels, ('le', _format_value(float(bound))))} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(labels, ('le', '+Inf'))} {values[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(values[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {values[-1]}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter per label set"""
+
+    kind = 'counter'
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._series[label_values] = self._series.get(label_values, 0) + amount
+
+    def collect(self):
+        with self._lock:
+            series = dict(self._series)
+        return [f"{self.name}{_format_labels(zip(self.labels, key))} {_format_value(value)}"
+                for key, value in sorted(series.items())]
+
+
+class Metrics:
+    """Process-local metric registry rendered in the Prometheus text format
+
+    Each gunicorn worker keeps its own numbers, so a scrape through the
+    load balancer sees one worker at a time; scrape workers individually
+    (or aggregate with `sum by`) when running more than one.
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self.requests = self.counter(
+            'http_requests_total', 'HTTP requests by route, method and status',
+            ('route', 'method', 'status'))
+        self.latency = self.histogram(
+            'http_request_duration_seconds', 'Request latency by route and method',
+            ('route', 'method'))
+        self.request_size = self.histogram(
+            'http_request_size_bytes', 'Request body size by route',
+            ('route',), SIZE_BUCKETS)
+        self.response_size = self.histogram(
+            'http_response_size_bytes', 'Response body size by route (streamed responses excluded)',
+            ('route',), SIZE_BUCKETS)
+        self.db_queries = self.histogram(
+            'db_queries_per_request', 'Database statements run per request',
+            ('route',), QUERY_COUNT_BUCKETS)
+        self.db_time = self.histogram(
+            'db_query_duration_seconds', 'Time spent running and fetching statements per request',
+            ('route',))
+        self.pool_wait = self.histogram(
+            'db_pool_wait_seconds', 'Time spent waiting for a pooled connection per request',
+            ('route',))
+        self.profiles = self.counter(
+            'http_request_profiles_total', 'Requests profiled and dumped by route', ('route',))
+        self.rejected = self.counter(
+            'http_requests_rejected_total', 'API requests turned away by admission control by route class and reason',
+            ('route_class', 'reason'))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        metric = Histogram(name, help, labels, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        metric = Counter(name, help, labels)
+        self._metrics.append(metric)
+        return metric
+
+    def add_collector(self, collect):
+        """Register collect() -> [(name, kind, help, value)] for point-in-time values"""
+        self._collectors.append(collect)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.collect())
+        for collect in self._collectors:
+            try:
+                samples = collect()
+            except Exception as e:
+                print(f"Metrics collector error: {e}")
+                continue
+            for name, kind, help, value in samples:
+                lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+def database_samples():
+    """Pool, write queue and slow-query numbers for /metrics"""
+    pool = database.pool_stats()
+    samples = [
+        ('db_pool_size', 'gauge', 'Open connections in the primary pool', pool['size']),
+        ('db_pool_in_use', 'gauge', 'Connections checked out of the primary pool', pool['in_use']),
+        ('db_pool_checkouts_total', 'counter', 'Connections checked out of the primary pool', pool['checkouts']),
+        ('db_pool_waits_total', 'counter', 'Checkouts that had to wait for a connection', pool['waits']),
+        ('db_pool_timeouts_total', 'counter', 'Checkouts that timed out', pool['timeouts']),
+        ('db_slow_queries_total', 'counter', 'Statements slower than SLOW_QUERY_MS', database.slow_query_count()),
+    ]
+    writer = database.writer_stats()
+    if writer:
+        samples.append(('db_write_queue_depth', 'gauge', 'Writes waiting on the SQLite write queue',
+                        writer['queue_depth']))
+    return samples
+
+
+metrics.add_collector(database_samples)
+
+
+def route_label():
+    """The matched URL rule, so /api/students/1 and /2 share a series"""
+    if request.url_rule is not None:
+        return request.url_rule.rule
+    return 'unmatched'
+
+
+def observe_request(route, method, status, duration, request_size=None, response_size=None):
+    """Record one request; also used by the ASGI fast path in asgi.py"""
+    metrics.requests.inc(route, method, str(status))
+    metrics.latency.observe(duration, route, method)
+    if request_size:
+        metrics.request_size.observe(request_size, route)
+    if response_size is not None:
+        metrics.response_size.observe(response_size, route)
+
+
+# -------------------- Sampled profiling --------------------
+def _start_profile():
+    rate = current_app.config['PROFILE_SAMPLE_RATE']
+    if rate <= 0 or random.random() >= rate:
+        return
+    profiler = cProfile.Profile()
+    try:
+        profiler.enable()
+    except ValueError:
+        # Another profiler is already active on this thread
+        return
+    g._profiler = profiler
+
+
+def _finish_profile(route):
+    profiler = g.pop('_profiler', None)
+    if profiler is None:
+        return
+    profiler.disable()
+    directory = current_app.config['PROFILE_DIR']
+    name = re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'
+    path = os.path.join(directory, f"{name}-{int(time.time() * 1000)}-{os.getpid()}.prof")
+    try:
+        os.makedirs(directory, exist_ok=True)
+        profiler.dump_stats(path)
+        metrics.profiles.inc(route)
+    except OSError as e:
+        print(f"Profile dump error: {e}")
+
+
+# -------------------- Flask hooks --------------------
+def before_request():
+    g._request_started = time.perf_counter()
+    _start_profile()
+
+
+def after_request(response):
+    started = g.pop('_request_started', None)
+    if started is None:
+        return response
+    route = route_label()
+    _finish_profile(route)
+
+    duration = time.perf_counter() - started
+    db_stats = database.request_db_stats()
+    metrics.db_queries.observe(db_stats['queries'], route)
+    metrics.db_time.observe(db_stats['query_time'], route)
+    metrics.pool_wait.observe(db_stats['pool_wait'], route)
+    # Streamed bodies (exports, files) have no length until they're sent
+    response_size = None if response.is_streamed else response.calculate_content_length()
+    observe_request(route, request.method, response.status_code, duration,
+                    request.content_length, response_size)
+    return response
+
+
+def metrics_view():
+    """Prometheus scrape endpoint"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    """Time every request and serve /metrics when METRICS_ENABLED is on"""
+    if not app.config['METRICS_ENABLED']:
+        return
+    app.before_request(before_request)
+    app.after_request(after_request)
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
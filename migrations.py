@@ -0,0 +1,394 @@
+"""Versioned, forward-only schema migrations for SQLite and PostgreSQL
+
+Each migration has a version number and a list of steps per dialect. A
+step is an SQL string or a callable taking a cursor. Applied versions are
+recorded in schema_migrations, so `flask db-migrate` only runs what is
+missing and app startup only has to compare version numbers.
+
+Migrations run in a transaction together with their version row, except
+PostgreSQL migrations marked `concurrent`: those build indexes with
+CREATE INDEX CONCURRENTLY, which doesn't block writes but can't run
+inside a transaction, so their steps autocommit one by one and must be
+safe to re-run.
+"""
+import sqlite3
+
+# Serializes migrators across processes on PostgreSQL (pg_advisory_lock key)
+ADVISORY_LOCK_KEY = 4_242_016
+
+
+class Migration:
+    def __init__(self, version, name, sqlite=(), postgresql=(), concurrent=False):
+        self.version = version
+        self.name = name
+        self.steps = {'sqlite': list(sqlite), 'postgresql': list(postgresql)}
+        self.concurrent = concurrent
+
+
+# -------------------- Steps --------------------
+def add_sqlite_columns(cursor):
+    """Columns added to students after the table first shipped"""
+    cursor.execute("PRAGMA table_info(students)")
+    columns = [column[1] for column in cursor.fetchall()]
+    if 'image' not in columns:
+        cursor.execute("ALTER TABLE students ADD COLUMN image TEXT")
+    if 'image_variants' not in columns:
+        cursor.execute("ALTER TABLE students ADD COLUMN image_variants TEXT")
+
+
+def create_sqlite_fts(cursor):
+    """Full-text index over name and city, kept in sync by triggers"""
+    try:
+        cursor.execute("SAVEPOINT fts")
+        cursor.execute("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS students_fts USING fts5(
+                name, city,
+                content='students', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+            )
+        """)
+    except sqlite3.OperationalError as e:
+        # SQLite built without FTS5; search falls back to LIKE
+        cursor.execute("ROLLBACK TO SAVEPOINT fts")
+        cursor.execute("RELEASE SAVEPOINT fts")
+        print(f"FTS5 search index unavailable: {e}")
+        return
+
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS students_fts_ai AFTER INSERT ON students BEGIN
+            INSERT INTO students_fts(rowid, name, city) VALUES (new.id, new.name, new.city);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS students_fts_ad AFTER DELETE ON students BEGIN
+            INSERT INTO students_fts(students_fts, rowid, name, city) VALUES ('delete', old.id, old.name, old.city);
+        END
+    """)
+    cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS students_fts_au AFTER UPDATE OF name, city ON students BEGIN
+            INSERT INTO students_fts(students_fts, rowid, name, city) VALUES ('delete', old.id, old.name, old.city);
+            INSERT INTO students_fts(rowid, name, city) VALUES (new.id, new.name, new.city);
+        END
+    """)
+    # Index the rows that were there before the FTS table existed
+    cursor.execute("INSERT INTO students_fts(students_fts) VALUES ('rebuild')")
+    cursor.execute("RELEASE SAVEPOINT fts")
+
+
+def create_pg_trigram(cursor):
+    """Trigram indexes behind the dashboard's substring search
+
+    The extension may need superuser rights, so failure is tolerated
+    (search then falls back to unindexed ILIKE).
+    """
+    cursor.execute("SAVEPOINT trigram")
+    try:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_students_name_trgm ON students USING gin (name gin_trgm_ops)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_students_city_trgm ON students USING gin (city gin_trgm_ops)")
+        cursor.execute("RELEASE SAVEPOINT trigram")
+    except Exception as e:
+        cursor.execute("ROLLBACK TO SAVEPOINT trigram")
+        print(f"Trigram search indexes unavailable: {e}")
+
+
+def pg_index_concurrently(name, definition):
+    """Step building an index without blocking writes
+
+    A failed CONCURRENTLY build leaves an INVALID index behind that
+    IF NOT EXISTS would happily skip, so drop that first.
+    """
+    def step(cursor):
+        cursor.execute("""
+            SELECT 1 FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid
+            WHERE c.relname = %s AND NOT i.indisvalid
+        """, (name,))
+        if cursor.fetchone():
+            cursor.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+        cursor.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {definition}")
+    return step
+
+
+# -------------------- Migrations --------------------
+MIGRATIONS = [
+    # The schema init_db() used to create; IF NOT EXISTS lets databases
+    # created before migrations adopt it as their baseline.
+    Migration(1, 'initial schema', sqlite=[
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS students (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            age INTEGER,
+            city TEXT,
+            image TEXT,
+            image_variants TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        add_sqlite_columns,
+        """
+        CREATE TABLE IF NOT EXISTS blobs (
+            key TEXT PRIMARY KEY,
+            size INTEGER NOT NULL DEFAULT 0,
+            refcount INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_blobs_unreferenced ON blobs(updated_at) WHERE refcount <= 0",
+    ], postgresql=[
+        """
+        CREATE TABLE IF NOT EXISTS users (
+            id SERIAL PRIMARY KEY,
+            username VARCHAR(255) UNIQUE NOT NULL,
+            password VARCHAR(255) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS students (
+            id SERIAL PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            age INTEGER,
+            city VARCHAR(255),
+            image VARCHAR(255),
+            image_variants TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "ALTER TABLE students ADD COLUMN IF NOT EXISTS image VARCHAR(255)",
+        "ALTER TABLE students ADD COLUMN IF NOT EXISTS image_variants TEXT",
+        """
+        CREATE TABLE IF NOT EXISTS blobs (
+            key VARCHAR(255) PRIMARY KEY,
+            size BIGINT NOT NULL DEFAULT 0,
+            refcount INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_blobs_unreferenced ON blobs(updated_at) WHERE refcount <= 0",
+        "CREATE INDEX IF NOT EXISTS idx_students_name ON students(name)",
+        "CREATE INDEX IF NOT EXISTS idx_students_city ON students(city)",
+    ]),
+    Migration(2, 'text search indexes', sqlite=[create_sqlite_fts], postgresql=[create_pg_trigram]),
+    # Filtering by city then age (API filters, stats) and sorting by
+    # created_at (dashboard)
+    Migration(3, 'city/age and created_at indexes', sqlite=[
+        "CREATE INDEX IF NOT EXISTS idx_students_city_age ON students(city, age)",
+        "CREATE INDEX IF NOT EXISTS idx_students_created_at ON students(created_at)",
+    ], postgresql=[
+        pg_index_concurrently('idx_students_city_age', 'students (city, age)'),
+        pg_index_concurrently('idx_students_created_at', 'students (created_at)'),
+    ], concurrent=True),
+    # Change tracking behind the API's ETags and Last-Modified. Every
+    # student write bumps the single change_counter row and stamps the
+    # rows it touched with that version. Existing rows keep a NULL
+    # updated_at (read as created_at) rather than rewriting the table.
+    Migration(4, 'change tracking', sqlite=[
+        "ALTER TABLE students ADD COLUMN updated_at TIMESTAMP",
+        "ALTER TABLE students ADD COLUMN version INTEGER NOT NULL DEFAULT 0",
+        """
+        CREATE TABLE IF NOT EXISTS change_counter (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL,
+            updated_at TIMESTAMP
+        )
+        """,
+        "INSERT OR IGNORE INTO change_counter (id, version, updated_at) VALUES (1, 0, CURRENT_TIMESTAMP)",
+    ], postgresql=[
+        "ALTER TABLE students ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP",
+        "ALTER TABLE students ADD COLUMN IF NOT EXISTS version BIGINT NOT NULL DEFAULT 0",
+        """
+        CREATE TABLE IF NOT EXISTS change_counter (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version BIGINT NOT NULL,
+            updated_at TIMESTAMP
+        )
+        """,
+        """
+        INSERT INTO change_counter (id, version, updated_at)
+        VALUES (1, 0, CURRENT_TIMESTAMP AT TIME ZONE 'UTC')
+        ON CONFLICT (id) DO NOTHING
+        """,
+    ]),
+    # Append-only log behind GET /api/students/changes: one row per student
+    # write, keyed by the change_counter version it committed under.
+    # pruned_through is the highest seq deleted by `flask prune-changes`.
+    Migration(5, 'student change log', sqlite=[
+        """
+        CREATE TABLE IF NOT EXISTS student_changes (
+            seq INTEGER PRIMARY KEY,
+            student_id INTEGER NOT NULL,
+            op TEXT NOT NULL,
+            changed_at TIMESTAMP
+        )
+        """,
+        "ALTER TABLE change_counter ADD COLUMN pruned_through INTEGER NOT NULL DEFAULT 0",
+    ], postgresql=[
+        """
+        CREATE TABLE IF NOT EXISTS student_changes (
+            seq BIGINT PRIMARY KEY,
+            student_id INTEGER NOT NULL,
+            op VARCHAR(16) NOT NULL,
+            changed_at TIMESTAMP
+        )
+        """,
+        "ALTER TABLE change_counter ADD COLUMN IF NOT EXISTS pruned_through BIGINT NOT NULL DEFAULT 0",
+    ]),
+    # Name prefix filter on the API. SQLite compares names with its binary
+    # collation, so a plain index serves the range it uses (migration 1
+    # only created it on PostgreSQL). There the filter is a LIKE, which
+    # only a text_pattern_ops index can serve under a non-C collation.
+    Migration(6, 'name prefix index', sqlite=[
+        "CREATE INDEX IF NOT EXISTS idx_students_name ON students(name)",
+    ], postgresql=[
+        pg_index_concurrently('idx_students_name_pattern', 'students (name text_pattern_ops)'),
+    ], concurrent=True),
+]
+
+LATEST_VERSION = max(migration.version for migration in MIGRATIONS)
+
+
+# -------------------- Engine --------------------
+def _placeholder(dialect):
+    return '%s' if dialect == 'postgresql' else '?'
+
+
+def _ensure_version_table(conn, dialect):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    conn.commit()
+
+
+def current_version(conn):
+    """Highest applied migration, or 0 for a database without the version table
+
+    This is the cheap check app startup runs: one indexed query, no DDL.
+    """
+    try:
+        row = conn.execute("SELECT MAX(version) FROM schema_migrations").fetchone()
+    except Exception:
+        # No schema_migrations table yet
+        conn.rollback()
+        return 0
+    value = row[0] if not isinstance(row, dict) else next(iter(row.values()))
+    return value or 0
+
+
+def applied(conn):
+    """[(version, name, applied_at)] for every applied migration"""
+    try:
+        rows = conn.execute("SELECT version, name, applied_at FROM schema_migrations ORDER BY version").fetchall()
+    except Exception:
+        conn.rollback()
+        return []
+    return [tuple(row.values()) if isinstance(row, dict) else tuple(row) for row in rows]
+
+
+def pending(conn):
+    """Migrations not yet applied, in order"""
+    version = current_version(conn)
+    return [migration for migration in MIGRATIONS if migration.version > version]
+
+
+def _run_steps(cursor, steps):
+    for step in steps:
+        if callable(step):
+            step(cursor)
+        else:
+            cursor.execute(step)
+
+
+def _record(conn, dialect, migration):
+    p = _placeholder(dialect)
+    conn.execute(f"INSERT INTO schema_migrations (version, name) VALUES ({p}, {p})",
+                 (migration.version, migration.name))
+
+
+def _apply_sqlite(conn, migration):
+    # Python's sqlite3 doesn't open transactions for DDL on its own;
+    # BEGIN IMMEDIATE also keeps a second migrator out until we commit.
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if current_version(conn) >= migration.version:
+            conn.rollback()
+            return False
+        _run_steps(conn.cursor(), migration.steps['sqlite'])
+        _record(conn, 'sqlite', migration)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return True
+
+
+def _apply_postgresql(conn, migration):
+    if migration.concurrent:
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cursor:
+                _run_steps(cursor, migration.steps['postgresql'])
+            _record(conn, 'postgresql', migration)
+        finally:
+            conn.autocommit = False
+        return True
+
+    try:
+        with conn.cursor() as cursor:
+            _run_steps(cursor, migration.steps['postgresql'])
+        _record(conn, 'postgresql', migration)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return True
+
+
+def migrate(conn, dialect, target=None, log=print):
+    """Apply pending migrations up to `target` (default: latest)
+
+    `conn` should be a dedicated connection, not a pooled one: concurrent
+    PostgreSQL migrations switch it to autocommit. Returns the versions
+    applied.
+    """
+    target = LATEST_VERSION if target is None else target
+    _ensure_version_table(conn, dialect)
+
+    if dialect == 'postgresql':
+        conn.execute("SELECT pg_advisory_lock(%s)", (ADVISORY_LOCK_KEY,))
+        conn.commit()
+    try:
+        done = []
+        for migration in MIGRATIONS:
+            if migration.version > target:
+                break
+            version = current_version(conn)
+            # Don't leave the version read's transaction open (PostgreSQL
+            # can't switch to autocommit inside one)
+            conn.commit()
+            if migration.version <= version:
+                continue
+            log(f"Applying migration {migration.version}: {migration.name}")
+            if dialect == 'postgresql':
+                applied_now = _apply_postgresql(conn, migration)
+            else:
+                applied_now = _apply_sqlite(conn, migration)
+            if applied_now:
+                done.append(migration.version)
+        return done
+    finally:
+        if dialect == 'postgresql':
+            conn.execute("SELECT pg_advisory_unlock(%s)", (ADVISORY_LOCK_KEY,))
+            conn.commit()
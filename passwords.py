@@ -0,0 +1,155 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+
+import bcrypt
+
+# bcrypt only looks at the first 72 bytes; older bcrypt releases truncated
+# silently and newer ones raise, so truncate explicitly to keep existing
+# hashes verifiable.
+BCRYPT_MAX_PASSWORD_BYTES = 72
+
+
+class HasherBusy(Exception):
+    """Raised when the hashing pool is saturated (caller should answer 503)"""
+
+
+def _encode(password):
+    if isinstance(password, str):
+        password = password.encode('utf-8')
+    return password[:BCRYPT_MAX_PASSWORD_BYTES]
+
+
+def _hash_password(password, rounds):
+    return bcrypt.hashpw(_encode(password), bcrypt.gensalt(rounds)).decode('utf-8')
+
+
+def _check_password(pw_hash, password):
+    if isinstance(pw_hash, str):
+        pw_hash = pw_hash.encode('utf-8')
+    try:
+        return bcrypt.checkpw(_encode(password), pw_hash)
+    except ValueError:
+        # Malformed hash in the database
+        return False
+
+
+def hash_rounds(pw_hash):
+    """Return the cost factor encoded in a bcrypt hash ($2b$<rounds>$...)"""
+    try:
+        return int(pw_hash.split('$')[2])
+    except (AttributeError, IndexError, ValueError):
+        return None
+
+
+class PasswordHasher:
+    """Runs bcrypt on a small dedicated process pool with admission control
+
+    At most `max_pending` hash/check jobs may be queued or running at once;
+    a caller that can't get a slot within `queue_timeout` seconds gets
+    HasherBusy instead of piling up behind a login storm. With workers=0 the
+    work runs inline on the calling thread (still admission-controlled).
+    """
+
+    def __init__(self, rounds=12, workers=2, max_pending=8, queue_timeout=2.0, timeout=10.0):
+        self.rounds = rounds
+        self.workers = workers
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self.timeout = timeout
+
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+        self._pending = 0
+        self._stats = {
+            'hashes': 0,
+            'checks': 0,
+            'rehashes': 0,
+            'rejected': 0,
+            'timeouts': 0,
+            'latency_total': 0.0,
+            'latency_max': 0.0,
+        }
+
+    def _get_executor(self):
+        # The pool is per process: gunicorn forks workers after import
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+                self._pid = os.getpid()
+            return self._executor
+
+    def _release(self, started):
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self._pending -= 1
+            self._stats['latency_total'] += elapsed
+            self._stats['latency_max'] = max(self._stats['latency_max'], elapsed)
+        self._slots.release()
+
+    def _run(self, kind, func, *args):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            with self._lock:
+                self._stats['rejected'] += 1
+            raise HasherBusy("Password hashing is saturated")
+
+        started = time.perf_counter()
+        with self._lock:
+            self._pending += 1
+            self._stats[kind] += 1
+
+        if not self.workers:
+            try:
+                return func(*args)
+            finally:
+                self._release(started)
+
+        try:
+            future = self._get_executor().submit(func, *args)
+        except Exception:
+            self._release(started)
+            raise
+        # The slot is held until the job really finishes, even if we stop
+        # waiting for it, so admission reflects the actual pool load.
+        future.add_done_callback(lambda _: self._release(started))
+        try:
+            return future.result(timeout=self.timeout)
+        except FutureTimeoutError:
+            with self._lock:
+                self._stats['timeouts'] += 1
+            raise HasherBusy("Password hashing timed out")
+
+    def hash(self, password):
+        """Hash a password with the configured cost factor"""
+        return self._run('hashes', _hash_password, password, self.rounds)
+
+    def check(self, pw_hash, password):
+        """Verify a password against a stored bcrypt hash"""
+        return self._run('checks', _check_password, pw_hash, password)
+
+    def needs_rehash(self, pw_hash):
+        """True if a stored hash was made with a different cost factor"""
+        return hash_rounds(pw_hash) != self.rounds
+
+    def record_rehash(self):
+        with self._lock:
+            self._stats['rehashes'] += 1
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            completed = data['hashes'] + data['checks'] - self._pending
+            data.update({
+                'rounds': self.rounds,
+                'workers': self.workers,
+                'max_pending': self.max_pending,
+                'queue_depth': self._pending,
+                'latency_avg': data['latency_total'] / completed if completed > 0 else 0.0,
+            })
+        for key in ('latency_total', 'latency_max', 'latency_avg'):
+            data[key] = round(data[key], 6)
+        return data
@@ -0,0 +1,196 @@
+import os
+import threading
+import time
+from collections import deque
+
+
+class PoolTimeout(Exception):
+    """Raised when no connection could be checked out in time"""
+
+
+class ConnectionPool:
+    """Thread-safe pool of DB-API connections with health checks and recycling"""
+
+    def __init__(self, connect, min_size=1, max_size=10, timeout=30.0,
+                 max_idle=300.0, max_lifetime=3600.0, check_interval=30.0,
+                 check_query="SELECT 1", reset=None):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("Invalid pool size: min=%s max=%s" % (min_size, max_size))
+
+        self._connect = connect
+        self._reset = reset
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.check_interval = check_interval
+        self.check_query = check_query
+
+        # Connections are only valid in the process that opened them
+        # (gunicorn --preload forks after import), so remember our pid.
+        self.pid = os.getpid()
+
+        self._lock = threading.Condition(threading.Lock())
+        self._idle = deque()  # (conn, created_at, last_used)
+        self._meta = {}       # id(conn) -> created_at for checked-out connections
+        self._size = 0
+        self._closed = False
+
+        self._stats = {
+            'connections_opened': 0,
+            'connections_closed': 0,
+            'checkouts': 0,
+            'waits': 0,
+            'wait_time': 0.0,
+            'timeouts': 0,
+            'health_check_failures': 0,
+        }
+
+        for _ in range(min_size):
+            conn = self._open()
+            self._idle.append((conn, time.monotonic(), time.monotonic()))
+            self._size += 1
+
+    # -------------------- internals --------------------
+    def _open(self):
+        conn = self._connect()
+        self._stats['connections_opened'] += 1
+        return conn
+
+    def _discard(self, conn):
+        self._stats['connections_closed'] += 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _is_healthy(self, conn):
+        try:
+            conn.execute(self.check_query).fetchone()
+            return True
+        except Exception:
+            self._stats['health_check_failures'] += 1
+            return False
+
+    def _expired(self, created_at, now):
+        return bool(self.max_lifetime) and now - created_at > self.max_lifetime
+
+    def _recycle_idle(self, now):
+        """Close idle connections above min_size that have sat unused too long"""
+        if not self.max_idle:
+            return
+        while self._size > self.min_size and self._idle:
+            conn, created_at, last_used = self._idle[0]
+            if now - last_used <= self.max_idle:
+                break
+            self._idle.popleft()
+            self._size -= 1
+            self._discard(conn)
+
+    # -------------------- public API --------------------
+    def getconn(self):
+        """Check out a connection, waiting up to `timeout` seconds"""
+        start = time.monotonic()
+        waited = False
+
+        with self._lock:
+            while True:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+
+                now = time.monotonic()
+                self._recycle_idle(now)
+
+                if self._idle:
+                    # LIFO keeps the hot connections warm and lets the
+                    # cold end of the deque age out through _recycle_idle.
+                    conn, created_at, last_used = self._idle.pop()
+                    break
+
+                if self._size < self.max_size:
+                    self._size += 1
+                    conn, created_at, last_used = None, now, now
+                    break
+
+                waited = True
+                remaining = self.timeout - (now - start)
+                if remaining <= 0:
+                    self._stats['timeouts'] += 1
+                    self._stats['waits'] += 1
+                    self._stats['wait_time'] += now - start
+                    raise PoolTimeout("Timed out after %.1fs waiting for a connection" % self.timeout)
+                self._lock.wait(remaining)
+
+            if waited:
+                self._stats['waits'] += 1
+                self._stats['wait_time'] += time.monotonic() - start
+            self._stats['checkouts'] += 1
+
+        # Opening and health-checking happen outside the lock so a slow
+        # server doesn't stall every other checkout.
+        try:
+            now = time.monotonic()
+            if conn is not None:
+                stale = self._expired(created_at, now)
+                if not stale and self.check_interval is not None and now - last_used > self.check_interval:
+                    stale = not self._is_healthy(conn)
+                if stale:
+                    self._discard(conn)
+                    conn = None
+            if conn is None:
+                conn = self._open()
+                created_at = time.monotonic()
+        except Exception:
+            with self._lock:
+                self._size -= 1
+                self._lock.notify()
+            raise
+
+        with self._lock:
+            self._meta[id(conn)] = created_at
+        return conn
+
+    def putconn(self, conn, discard=False):
+        """Return a connection to the pool (or close it if it is broken)"""
+        if not discard and self._reset is not None:
+            try:
+                self._reset(conn)
+            except Exception:
+                discard = True
+
+        with self._lock:
+            created_at = self._meta.pop(id(conn), time.monotonic())
+            now = time.monotonic()
+            if discard or self._closed or self._expired(created_at, now):
+                self._size -= 1
+                self._discard(conn)
+            else:
+                self._idle.append((conn, created_at, now))
+            self._lock.notify()
+
+    def close(self):
+        """Close every idle connection and refuse further checkouts"""
+        with self._lock:
+            self._closed = True
+            while self._idle:
+                conn = self._idle.popleft()[0]
+                self._size -= 1
+                self._discard(conn)
+            self._lock.notify_all()
+
+    def stats(self):
+        """Snapshot of pool sizing counters"""
+        with self._lock:
+            data = dict(self._stats)
+            data.update({
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'avg_wait_time': (data['wait_time'] / data['waits']) if data['waits'] else 0.0,
+            })
+        data['wait_time'] = round(data['wait_time'], 6)
+        data['avg_wait_time'] = round(data['avg_wait_time'], 6)
+        return data
@@ -0,0 +1,248 @@
+"""Admission control for the API: per-key token buckets and concurrency caps
+
+Every API route belongs to a route class ('read', 'list', 'feed' or
+'write'), and each class has a Limit:
+
+- a token bucket per API key: `rate` requests per second sustained, up
+  to `burst` at once. The buckets live in this process ('memory') or in a
+  shared key/value server ('redis', or 'local' for its in-process
+  stand-in), so that every worker draws from the same budget.
+- `concurrency`: requests of the class running at once in this worker.
+- `key_concurrency`: of those, how many one key may hold.
+
+Concurrency caps are always per process: they protect the worker's own
+threads. Over-limit requests are rejected at once (429 for the key's own
+limits, 503 when the worker is full) instead of queueing.
+"""
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from cache import LocalSharedClient, REDIS_AVAILABLE
+
+ROUTE_CLASSES = ('read', 'list', 'feed', 'write')
+REJECTION_MESSAGES = {
+    'rate': 'Rate limit exceeded for this API key',
+    'key_concurrency': 'Too many concurrent requests for this API key',
+    'concurrency': 'Server busy',
+}
+
+# Redis side of SharedBuckets: refill, take one token and keep the state
+# for as long as a full refill takes. Uses the server's clock so workers
+# with skewed clocks agree. Returns {allowed, seconds until a token}.
+TOKEN_BUCKET_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'at')
+local tokens = tonumber(state[1]) or burst
+local at = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - at) * rate)
+local allowed, retry_after = 0, (1 - tokens) / rate
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed, retry_after = 1, 0
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'at', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(retry_after)}
+"""
+
+
+class Limit:
+    """One route class's limits; 0 turns a part off"""
+
+    def __init__(self, rate=0.0, burst=0, concurrency=0, key_concurrency=0):
+        self.rate = rate
+        self.burst = burst or math.ceil(rate)
+        self.concurrency = concurrency
+        self.key_concurrency = key_concurrency
+
+    @classmethod
+    def parse(cls, spec):
+        """Limit from 'rate:burst:concurrency:key_concurrency' (trailing parts optional)"""
+        parts = [part.strip() for part in spec.split(':')] if spec else []
+        if len(parts) > 4:
+            raise ValueError(f"Invalid rate limit: {spec!r}")
+        values = [float(part) if part else 0 for part in parts] + [0] * (4 - len(parts))
+        return cls(values[0], int(values[1]), int(values[2]), int(values[3]))
+
+    def as_dict(self):
+        return {'rate': self.rate, 'burst': self.burst, 'concurrency': self.concurrency,
+                'key_concurrency': self.key_concurrency}
+
+
+class Rejected(Exception):
+    """A request turned away: respond with `status` and Retry-After"""
+
+    def __init__(self, status, reason, retry_after):
+        super().__init__(REJECTION_MESSAGES[reason])
+        self.status = status
+        self.reason = reason
+        self.retry_after = max(1, math.ceil(retry_after))
+
+
+def take_token(state, now, rate, burst):
+    """One token bucket step: (allowed, retry_after, new state)
+
+    `state` is (tokens, at) from the previous call, or None for a full
+    bucket. The same arithmetic as TOKEN_BUCKET_SCRIPT.
+    """
+    tokens, at = state if state is not None else (burst, now)
+    tokens = min(burst, tokens + max(0.0, now - at) * rate)
+    if tokens >= 1:
+        return True, 0.0, (tokens - 1, now)
+    return False, (1 - tokens) / rate, (tokens, now)
+
+
+# -------------------- Token bucket backends --------------------
+class MemoryBuckets:
+    """Token buckets in this process, least recently used evicted past `maxsize`"""
+
+    backend = 'memory'
+
+    def __init__(self, maxsize=100000):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._buckets = OrderedDict()
+
+    def take(self, key, rate, burst):
+        """(allowed, retry_after seconds) for one request on `key`"""
+        with self._lock:
+            allowed, retry_after, state = take_token(self._buckets.get(key), time.monotonic(), rate, burst)
+            self._buckets[key] = state
+            self._buckets.move_to_end(key)
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        return allowed, retry_after
+
+
+class LocalScriptClient(LocalSharedClient):
+    """LocalSharedClient that also runs TOKEN_BUCKET_SCRIPT, for SharedBuckets
+
+    register_script() mirrors redis-py's: the returned callable takes
+    keys= and args= and answers as the Lua script would, with the bucket
+    state stored in this client like any other key.
+    """
+
+    def register_script(self, script):
+        if script != TOKEN_BUCKET_SCRIPT:
+            raise NotImplementedError("LocalScriptClient only runs TOKEN_BUCKET_SCRIPT")
+
+        def run(keys, args):
+            rate, burst = float(args[0]), float(args[1])
+            with self._lock:
+                entry = self._data.get(keys[0])
+                now = time.time()
+                state = entry[1] if entry and (entry[0] is None or entry[0] > time.monotonic()) else None
+                allowed, retry_after, state = take_token(state, now, rate, burst)
+                self._data[keys[0]] = (time.monotonic() + burst / rate + 1, state)
+            return [int(allowed), str(retry_after).encode()]
+        return run
+
+
+class SharedBuckets:
+    """Token buckets in a shared key/value server, one atomic script call per request
+
+    A server outage must not take the API down with it, so errors let
+    the request through and are counted.
+    """
+
+    backend = 'shared'
+
+    def __init__(self, client, namespace='ratelimit'):
+        self.namespace = namespace
+        self.errors = 0
+        self._script = client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    def take(self, key, rate, burst):
+        try:
+            allowed, retry_after = self._script(keys=[f"{self.namespace}:{key}"], args=[rate, burst])
+        except Exception:
+            self.errors += 1
+            return True, 0.0
+        return bool(int(allowed)), float(retry_after)
+
+
+def create_buckets(backend='memory', url=None):
+    """Token bucket store for the configured backend: memory, local or redis"""
+    if backend == 'memory':
+        return MemoryBuckets()
+    if backend == 'local':
+        return SharedBuckets(LocalScriptClient())
+    if backend == 'redis':
+        if not REDIS_AVAILABLE:
+            raise RuntimeError("Rate limit backend 'redis' requires the redis package")
+        import redis
+        return SharedBuckets(redis.Redis.from_url(url or 'redis://localhost:6379/0'))
+    raise ValueError(f"Unknown rate limit backend: {backend}")
+
+
+# -------------------- Admission --------------------
+class Admission:
+    """Admit or reject requests by API key and route class
+
+    admit() returns a release callable for the request's concurrency
+    slots; call it once the response has been sent (streams included).
+    """
+
+    def __init__(self, limits, buckets):
+        self.limits = limits
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._running = {name: 0 for name in limits}
+        self._running_by_key = {}
+        self._rejected = {}
+
+    def admit(self, key, route_class):
+        limit = self.limits[route_class]
+        if limit.rate > 0:
+            allowed, retry_after = self.buckets.take(f"{route_class}:{key}", limit.rate, limit.burst)
+            if not allowed:
+                raise self._reject(route_class, Rejected(429, 'rate', retry_after))
+
+        slot = (route_class, key)
+        with self._lock:
+            if limit.concurrency and self._running[route_class] >= limit.concurrency:
+                raise self._reject(route_class, Rejected(503, 'concurrency', 1), locked=True)
+            if limit.key_concurrency and self._running_by_key.get(slot, 0) >= limit.key_concurrency:
+                raise self._reject(route_class, Rejected(429, 'key_concurrency', 1), locked=True)
+            self._running[route_class] += 1
+            self._running_by_key[slot] = self._running_by_key.get(slot, 0) + 1
+
+        released = False
+
+        def release():
+            nonlocal released
+            with self._lock:
+                if released:
+                    return
+                released = True
+                self._running[route_class] -= 1
+                if self._running_by_key[slot] <= 1:
+                    del self._running_by_key[slot]
+                else:
+                    self._running_by_key[slot] -= 1
+        return release
+
+    def _reject(self, route_class, rejected, locked=False):
+        if not locked:
+            with self._lock:
+                return self._reject(route_class, rejected, locked=True)
+        name = (route_class, rejected.reason)
+        self._rejected[name] = self._rejected.get(name, 0) + 1
+        return rejected
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': self.buckets.backend,
+                'classes': {
+                    name: dict(limit.as_dict(), running=self._running[name],
+                               rejected={reason: count for (route_class, reason), count in self._rejected.items()
+                                         if route_class == name})
+                    for name, limit in self.limits.items()
+                },
+            }
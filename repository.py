@@ -0,0 +1,626 @@
+"""Student and user data access for every route
+
+All SQL against the students, users and blobs tables lives here. Queries are
+written once with `?` placeholders and rewritten for psycopg's `%s` on
+PostgreSQL. Fixed-text statements on the hot paths are sent with
+prepare=True so PostgreSQL plans them once per connection; sqlite3 keeps
+its own per-connection statement cache (SQLITE_CACHED_STATEMENTS).
+
+Every student write also advances the change counter (change_counter),
+stamps the rows it touched with their new version and updated_at and
+appends them to the change log (student_changes), all in the same
+transaction; the API derives ETags, Last-Modified and the change feed
+from them.
+
+Reads return Records, tuples that also look up values by column name,
+instead of a sqlite3.Row or a dict per row. make_serializer() turns them
+into API dicts in one generated pass per result.
+"""
+import threading
+
+# Sortable column name -> SQL expression (dashboard)
+SORT_COLUMNS = {
+    'id': 'id',
+    'name': 'name',
+    'age': 'age',
+    'city': 'city',
+    'created_at': 'created_at',
+}
+
+
+class Record(tuple):
+    """A read-only row: the driver's values with lookups by column name
+
+    Each result layout gets its own subclass carrying the column names, so
+    a row costs one tuple and nothing else, and iteration stays in C.
+    Supports record['name'], record[0], record.get(), record.keys() and
+    dict(record), which is all the routes and templates need.
+    """
+
+    __slots__ = ()
+    _columns = ()
+    _index = {}
+
+    def __getitem__(self, key):
+        if key.__class__ is str:
+            key = self._index[key]
+        return tuple.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        i = self._index.get(key)
+        return default if i is None else tuple.__getitem__(self, i)
+
+    def keys(self):
+        return self._columns
+
+    def as_dict(self):
+        return dict(zip(self._columns, self))
+
+    def __repr__(self):
+        return f"Record({self.as_dict()!r})"
+
+
+_record_types = {}
+_record_types_lock = threading.Lock()
+
+
+def record_type(description):
+    """The Record subclass for a cursor description, shared by every query with the same columns"""
+    columns = tuple(column[0] for column in description)
+    cls = _record_types.get(columns)
+    if cls is None:
+        with _record_types_lock:
+            cls = _record_types.get(columns)
+            if cls is None:
+                index = {name: i for i, name in enumerate(columns)}
+                cls = _record_types[columns] = type('Record', (Record,), {
+                    '__slots__': (), '_columns': columns, '_index': index})
+    return cls
+
+
+def _compile_builder(columns, plain, computed):
+    """Source-generate build(rows) for one record type and projection
+
+    The generated loop unpacks each tuple into locals and builds the dict
+    from a literal, which is several times faster than assigning field by
+    field. Keys and computed-field names go in through repr(), never as
+    code.
+    """
+    missing = [field for field in plain if field not in columns]
+    if missing:
+        raise KeyError(missing[0])
+    targets = ''.join(f"v{i}, " if column in plain else "_, " for i, column in enumerate(columns))
+    items = [f"{column!r}: v{i}" for i, column in enumerate(columns) if column in plain]
+    items += [f"{name!r}: c{j}(row)" for j, (name, _) in enumerate(computed)]
+    params = ''.join(f", c{j}" for j in range(len(computed)))
+    source = (f"def build(rows{params}):\n"
+              f"    out = []\n"
+              f"    append = out.append\n"
+              f"    for row in rows:\n"
+              f"        {targets}= row\n"
+              f"        append({{{', '.join(items)}}})\n"
+              f"    return out\n")
+    namespace = {}
+    exec(source, namespace)
+    build = namespace['build']
+    functions = [compute for _, compute in computed]
+    return lambda rows: build(rows, *functions)
+
+
+def make_serializer(fields, computed=None):
+    """Build serialize(rows) -> [dict] for an API field projection
+
+    `computed` maps field names to functions of the row (e.g. image_url).
+    For Records the per-row work is one generated loop, compiled once per
+    record type; all rows in one call must then come from the same query.
+    Dicts (e.g. from the student cache) and driver rows also work.
+    """
+    computed = computed or {}
+    plain = [field for field in fields if field not in computed]
+    extra = [(field, computed[field]) for field in fields if field in computed]
+    builders = {}
+
+    def serialize(rows):
+        if not rows:
+            return []
+        cls = rows[0].__class__
+        if issubclass(cls, Record):
+            build = builders.get(cls)
+            if build is None:
+                build = builders[cls] = _compile_builder(cls._columns, set(plain), extra)
+            return build(rows)
+        result = []
+        for row in rows:
+            data = {field: row[field] for field in plain}
+            for field, compute in extra:
+                data[field] = compute(row)
+            result.append(data)
+        return result
+
+    return serialize
+
+
+class StudentRepository:
+    """Every student and user query, for one SQL dialect ('sqlite' or 'postgresql')"""
+
+    def __init__(self, dialect):
+        self.dialect = dialect
+        self._sql = {}
+        # Timestamps are stored as UTC (SQLite's CURRENT_TIMESTAMP already is)
+        self.now = "CURRENT_TIMESTAMP AT TIME ZONE 'UTC'" if dialect == 'postgresql' else "CURRENT_TIMESTAMP"
+
+    # -------------------- plumbing --------------------
+    def sql(self, query):
+        """The query with placeholders for this dialect (`?` -> `%s` on psycopg)"""
+        if self.dialect != 'postgresql':
+            return query
+        translated = self._sql.get(query)
+        if translated is None:
+            translated = self._sql[query] = query.replace('%', '%%').replace('?', '%s')
+        return translated
+
+    def _cursor(self, conn, name=None):
+        """A cursor yielding plain tuples"""
+        if self.dialect == 'postgresql':
+            from psycopg.rows import tuple_row
+            if name:
+                return conn.cursor(name=name, row_factory=tuple_row)
+            return conn.cursor(row_factory=tuple_row)
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        return cursor
+
+    def _execute(self, cursor, query, params=(), prepare=None):
+        if self.dialect == 'postgresql':
+            cursor.execute(self.sql(query), params, prepare=prepare)
+        else:
+            cursor.execute(query, params)
+        return cursor
+
+    def _write(self, conn, query, params=(), prepare=None):
+        """Run a statement on the connection's default cursor (rowcount, lastrowid)"""
+        if self.dialect == 'postgresql':
+            return conn.execute(self.sql(query), params, prepare=prepare)
+        return conn.execute(query, params)
+
+    def _fetchall(self, conn, query, params=(), prepare=None):
+        cursor = self._execute(self._cursor(conn), query, params, prepare)
+        try:
+            rows = cursor.fetchall()
+            if rows:
+                rows = list(map(record_type(cursor.description), rows))
+        finally:
+            cursor.close()
+        return rows
+
+    def _fetchone(self, conn, query, params=(), prepare=None):
+        rows = self._fetchall(conn, query, params, prepare)
+        return rows[0] if rows else None
+
+    def _scalar(self, conn, query, params=(), prepare=None):
+        cursor = self._execute(self._cursor(conn), query, params, prepare)
+        try:
+            row = cursor.fetchone()
+        finally:
+            cursor.close()
+        return row[0] if row else None
+
+    # -------------------- users --------------------
+    def get_user(self, conn, user_id):
+        """id and username only (no password hash), or None"""
+        return self._fetchone(conn, "SELECT id, username FROM users WHERE id=?", (user_id,), prepare=True)
+
+    def get_user_by_username(self, conn, username):
+        return self._fetchone(conn, "SELECT id, username, password FROM users WHERE username=?",
+                              (username,), prepare=True)
+
+    def insert_user(self, conn, username, password_hash):
+        self._write(conn, "INSERT INTO users (username, password) VALUES (?, ?)", (username, password_hash))
+
+    def update_password(self, conn, user_id, password_hash):
+        self._write(conn, "UPDATE users SET password=? WHERE id=?", (password_hash, user_id))
+
+    # -------------------- single students --------------------
+    def get_query(self, student_id):
+        """(query, params) for get(), for callers with their own driver (asgi.py)"""
+        return "SELECT * FROM students WHERE id=?", (student_id,)
+
+    def get(self, conn, student_id):
+        """One student with every column, or None"""
+        return self._fetchone(conn, *self.get_query(student_id), prepare=True)
+
+    def get_many(self, conn, ids):
+        """Students with the given ids, keyed by id"""
+        if not ids:
+            return {}
+        placeholders = ', '.join('?' for _ in ids)
+        rows = self._fetchall(conn, f"SELECT * FROM students WHERE id IN ({placeholders})", list(ids))
+        return {row['id']: row for row in rows}
+
+    def insert(self, conn, name, age, city, image=None):
+        """Insert a student, returning its id"""
+        version = self.bump_version(conn)
+        query = (f"INSERT INTO students (name, age, city, image, version, updated_at) "
+                 f"VALUES (?, ?, ?, ?, ?, {self.now})")
+        if self.dialect == 'postgresql':
+            student_id = self._scalar(conn, query + " RETURNING id", (name, age, city, image, version), prepare=True)
+        else:
+            student_id = self._write(conn, query, (name, age, city, image, version)).lastrowid
+        self.log_changes(conn, [(version, student_id, 'insert')])
+        return student_id
+
+    def update(self, conn, student_id, name, age, city, image=None, image_variants=None):
+        """Replace a student's fields, photo included; returns the number of rows updated
+
+        Callers check the student exists first (in the same write), so the
+        version is only skipped if it was deleted concurrently.
+        """
+        version = self.bump_version(conn)
+        cursor = self._write(conn, f"UPDATE students SET name=?, age=?, city=?, image=?, image_variants=?, "
+                                   f"version=?, updated_at={self.now} WHERE id=?",
+                             (name, age, city, image, image_variants, version, student_id), prepare=True)
+        if cursor.rowcount > 0:
+            self.log_changes(conn, [(version, student_id, 'update')])
+        return max(cursor.rowcount, 0)
+
+    def update_details(self, conn, student_id, name, age, city):
+        """Update name, age and city, leaving the photo alone; returns the number of rows updated"""
+        version = self.bump_version(conn)
+        cursor = self._write(conn, f"UPDATE students SET name=?, age=?, city=?, version=?, updated_at={self.now} "
+                                   f"WHERE id=?",
+                             (name, age, city, version, student_id), prepare=True)
+        if cursor.rowcount > 0:
+            self.log_changes(conn, [(version, student_id, 'update')])
+        return max(cursor.rowcount, 0)
+
+    def set_image_variants(self, conn, student_id, image, variants, expected_image):
+        """Swap in a processed photo unless it was replaced meanwhile; True if updated"""
+        version = self.bump_version(conn)
+        cursor = self._write(conn, f"UPDATE students SET image=?, image_variants=?, version=?, updated_at={self.now} "
+                                   f"WHERE id=? AND image=?",
+                             (image, variants, version, student_id, expected_image))
+        if cursor.rowcount <= 0:
+            # The skipped version just leaves a gap in the log
+            return False
+        self.log_changes(conn, [(version, student_id, 'update')])
+        return True
+
+    def delete(self, conn, student_id):
+        """Delete a student, returning the number of rows deleted
+
+        Only a deleted row advances the change counter and reaches the
+        change log.
+        """
+        deleted = max(self._write(conn, "DELETE FROM students WHERE id=?", (student_id,), prepare=True).rowcount, 0)
+        if deleted:
+            version = self.bump_version(conn)
+            self.log_changes(conn, [(version, student_id, 'delete')])
+        return deleted
+
+    # -------------------- bulk writes --------------------
+    def insert_many(self, conn, rows):
+        """Insert (name, age, city) tuples in one batch, returning the new ids in order"""
+        first = self.bump_version(conn, len(rows)) - len(rows) + 1
+        versions = range(first, first + len(rows))
+        query = f"INSERT INTO students (name, age, city, version, updated_at) VALUES (?, ?, ?, ?, {self.now})"
+        rows = [(*row, version) for row, version in zip(rows, versions)]
+        if self.dialect == 'postgresql':
+            cursor = self._cursor(conn)
+            cursor.executemany(self.sql(query + " RETURNING id"), rows, returning=True)
+            ids = []
+            while True:
+                ids.append(cursor.fetchone()[0])
+                if not cursor.nextset():
+                    break
+        else:
+            # sqlite3 runs in-process, so per-row execute inside the open
+            # transaction costs no round-trips and gives us each lastrowid.
+            ids = [conn.execute(query, row).lastrowid for row in rows]
+        self.log_changes(conn, [(version, student_id, 'insert') for version, student_id in zip(versions, ids)])
+        return ids
+
+    def update_many(self, conn, columns, rows):
+        """Set `columns` on many students; rows are (*values, id) tuples"""
+        first = self.bump_version(conn, len(rows)) - len(rows) + 1
+        rows = [(*row[:-1], version, row[-1]) for version, row in enumerate(rows, first)]
+        assignments = ', '.join(f"{column}=?" for column in columns)
+        conn.executemany(self.sql(f"UPDATE students SET {assignments}, version=?, updated_at={self.now} WHERE id=?"),
+                         rows)
+        self.log_changes(conn, [(row[-2], row[-1], 'update') for row in rows])
+
+    def delete_many(self, conn, ids):
+        """Delete students by id, returning the deleted rows keyed by id
+
+        Ids with no row are left out, and only deleted rows advance the
+        change counter and reach the change log.
+        """
+        if not ids:
+            return {}
+        placeholders = ', '.join('?' for _ in ids)
+        query = f"DELETE FROM students WHERE id IN ({placeholders})"
+        if self.dialect == 'postgresql':
+            rows = self._fetchall(conn, query + " RETURNING *", list(ids))
+        else:
+            # Writes are serialized on SQLite, so reading first is exact
+            rows = self._fetchall(conn, f"SELECT * FROM students WHERE id IN ({placeholders})", list(ids))
+            if rows:
+                self._write(conn, query, list(ids))
+        deleted = {row['id']: row for row in rows}
+        if deleted:
+            first = self.bump_version(conn, len(deleted)) - len(deleted) + 1
+            self.log_changes(conn, [(version, student_id, 'delete')
+                                    for version, student_id in enumerate(deleted, first)])
+        return deleted
+
+    # -------------------- blob reference counts --------------------
+    # The blobs table tracks how many students reference each stored file.
+    # These run inside the caller's transaction so the refcount always
+    # commits (or rolls back) together with the row that uses the blob.
+    def retain_blob(self, conn, key, size=0):
+        """Add a reference to a blob; True if it had none before
+
+        A blob with no live reference may have been deleted by the storage
+        sweep since its file was saved, so the caller must then check the
+        file is still there (see storage.collect_garbage()).
+        """
+        cursor = self._write(conn, f"UPDATE blobs SET refcount = refcount + 1, updated_at = {self.now} "
+                                   f"WHERE key = ? AND refcount > 0", (key,))
+        if cursor.rowcount > 0:
+            return False
+        self._write(conn, f"INSERT INTO blobs (key, size, refcount, updated_at) VALUES (?, ?, 1, {self.now}) "
+                          f"ON CONFLICT (key) DO UPDATE SET refcount = blobs.refcount + 1, updated_at = {self.now}",
+                    (key, size))
+        return True
+
+    def release_blob(self, conn, key):
+        """Drop a reference to a blob; unreferenced blobs are removed by storage.collect_garbage()"""
+        if not key:
+            return
+        cursor = self._write(conn, f"UPDATE blobs SET refcount = refcount - 1, updated_at = {self.now} "
+                                   f"WHERE key = ? AND refcount > 0", (key,))
+        if cursor.rowcount == 0:
+            # A file from before reference counting (or already at zero):
+            # record it so the sweep deletes it.
+            self._write(conn, f"INSERT INTO blobs (key, size, refcount, updated_at) VALUES (?, 0, 0, {self.now}) "
+                              f"ON CONFLICT (key) DO NOTHING", (key,))
+
+    def unreferenced_blobs(self, conn, before):
+        """Keys of blobs unreferenced since before `before` (a UTC timestamp)"""
+        return [row['key'] for row in self._fetchall(
+            conn, "SELECT key FROM blobs WHERE refcount <= 0 AND updated_at < ?", (before,))]
+
+    def blob_keys(self, conn):
+        return {row['key'] for row in self._fetchall(conn, "SELECT key FROM blobs")}
+
+    def delete_unreferenced_blob(self, conn, key):
+        """Delete a blob's row if it is still unreferenced; True if deleted
+
+        The refcount is re-checked in the DELETE itself in case the blob was
+        re-used since it was listed.
+        """
+        return self._write(conn, "DELETE FROM blobs WHERE key = ? AND refcount <= 0", (key,)).rowcount > 0
+
+    def delete_untracked_blob(self, conn, key):
+        """True if a stored file still has no blobs row
+
+        Claims the key with a row deleted again in the same transaction, so
+        a concurrent retain_blob() of it waits for this transaction and
+        then sees the blob as new.
+        """
+        if not self._write(conn, f"INSERT INTO blobs (key, size, refcount, updated_at) VALUES (?, 0, 0, {self.now}) "
+                                 f"ON CONFLICT (key) DO NOTHING", (key,)).rowcount:
+            return False
+        self._write(conn, "DELETE FROM blobs WHERE key = ?", (key,))
+        return True
+
+    # -------------------- change tracking --------------------
+    def bump_version(self, conn, count=1):
+        """Advance the change counter by `count`, returning the new (highest) version
+
+        Runs in the caller's transaction. The UPDATE holds the counter row's lock until commit, so on
+        PostgreSQL concurrent writers commit in version order and a reader
+        that sees version N has every change up to N.
+        """
+        query = f"UPDATE change_counter SET version = version + ?, updated_at = {self.now} WHERE id = 1"
+        if self.dialect == 'postgresql':
+            return self._scalar(conn, query + " RETURNING version", (count,), prepare=True)
+        # Writes are serialized on SQLite, so a separate read is safe
+        self._write(conn, query, (count,))
+        return self._scalar(conn, "SELECT version FROM change_counter WHERE id = 1")
+
+    def change_version_query(self):
+        """(query, params) for change_version(), for callers with their own driver (asgi.py)"""
+        return "SELECT version, updated_at FROM change_counter WHERE id = 1", ()
+
+    def change_version(self, conn):
+        """(version, updated_at) of the last committed student write"""
+        return self._fetchone(conn, *self.change_version_query(), prepare=True)
+
+    def log_changes(self, conn, entries):
+        """Append (seq, student_id, op) entries to the change log"""
+        conn.executemany(self.sql(f"INSERT INTO student_changes (seq, student_id, op, changed_at) "
+                                  f"VALUES (?, ?, ?, {self.now})"), entries)
+
+    def changes_since_query(self, since, limit):
+        """(query, params) for changes_since(), for callers with their own driver (asgi.py)"""
+        return "SELECT seq, student_id, op FROM student_changes WHERE seq > ? ORDER BY seq LIMIT ?", (since, limit)
+
+    def changes_since(self, conn, since, limit):
+        """(seq, student_id, op) log entries after `since`, oldest first"""
+        return self._fetchall(conn, *self.changes_since_query(since, limit), prepare=True)
+
+    def change_log_bounds_query(self):
+        """(query, params) for change_log_bounds(), for callers with their own driver (asgi.py)"""
+        return "SELECT pruned_through, version FROM change_counter WHERE id = 1", ()
+
+    def change_log_bounds(self, conn):
+        """(pruned_through, latest version): the range of seqs `since` can resume from"""
+        return self._fetchone(conn, *self.change_log_bounds_query(), prepare=True)
+
+    def prune_changes(self, conn, before):
+        """Delete log entries written before the `before` timestamp; returns how many"""
+        through = self._scalar(conn, "SELECT MAX(seq) FROM student_changes WHERE changed_at < ?", (before,))
+        if through is None:
+            return 0
+        cursor = self._write(conn, "DELETE FROM student_changes WHERE seq <= ?", (through,))
+        self._write(conn, "UPDATE change_counter SET pruned_through = ? WHERE id = 1 AND pruned_through < ?",
+                    (through, through))
+        return cursor.rowcount
+
+    # -------------------- API lists --------------------
+    def filter_clauses(self, city=None, min_age=None, max_age=None, name_prefix=None, after_id=None):
+        """WHERE clauses and params for the student API filters
+
+        Every filter can use an index: city (and age) idx_students_city_age,
+        the name prefix idx_students_name on SQLite and
+        idx_students_name_pattern on PostgreSQL. The name filter is a
+        case-sensitive prefix match: a range under SQLite's binary
+        collation, and an escaped LIKE on PostgreSQL, where a range would
+        follow the database's (usually linguistic) collation.
+        """
+        clauses, params = [], []
+        if city:
+            clauses.append("city = ?")
+            params.append(city)
+        if min_age is not None:
+            clauses.append("age >= ?")
+            params.append(min_age)
+        if max_age is not None:
+            clauses.append("age <= ?")
+            params.append(max_age)
+        if name_prefix and self.dialect == 'postgresql':
+            clauses.append("name LIKE ? ESCAPE '\\'")
+            params.append(like_escape(name_prefix) + '%')
+        elif name_prefix:
+            upper = prefix_upper_bound(name_prefix)
+            clauses.append("name >= ?" if upper is None else "name >= ? AND name < ?")
+            params.extend([name_prefix] if upper is None else [name_prefix, upper])
+        if after_id is not None:
+            clauses.append("id > ?")
+            params.append(after_id)
+        return clauses, params
+
+    def list_query(self, columns, filters, limit=None):
+        """(sql, params) for students matching `filters` in id order
+
+        The SQL keeps `?` placeholders; run it with fetch() or pass it
+        through sql() first. Shared with the async API (asgi.py).
+        """
+        clauses, params = self.filter_clauses(**filters)
+        query = f"SELECT {', '.join(columns)} FROM students"
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY id"
+        if limit is not None:
+            query += " LIMIT ?"
+            params.append(limit)
+        return query, params
+
+    def fetch(self, conn, query, params=()):
+        """Run a query from list_query() and return its Records"""
+        return self._fetchall(conn, query, params)
+
+    def iter_students(self, conn, columns, filters, batch_size=1000):
+        """Yield matching students without materializing the whole result
+
+        PostgreSQL uses a named (server-side) cursor so rows are pulled from
+        the server batch by batch; SQLite steps its cursor with fetchmany().
+        """
+        query, params = self.list_query(columns, filters)
+        name = f"iter_students_{threading.get_ident()}" if self.dialect == 'postgresql' else None
+        cursor = self._cursor(conn, name)
+        if name:
+            cursor.itersize = batch_size
+        try:
+            self._execute(cursor, query, params)
+            record = None
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    break
+                record = record or record_type(cursor.description)
+                yield from map(record, rows)
+        finally:
+            cursor.close()
+
+    # -------------------- dashboard search --------------------
+    def search_clause(self, backend, q):
+        """WHERE clause and params matching `q` against name and city
+
+        `backend` is database.get_search_backend(): the students_fts index
+        on SQLite, the pg_trgm indexes on PostgreSQL, or plain LIKE as a
+        fallback for databases without either.
+        """
+        if backend == 'fts5':
+            return "id IN (SELECT rowid FROM students_fts WHERE students_fts MATCH ?)", [fts_query(q)]
+        pattern = '%' + like_escape(q) + '%'
+        op = 'ILIKE' if backend == 'trigram' else 'LIKE'
+        return f"(name {op} ? ESCAPE '\\' OR city {op} ? ESCAPE '\\')", [pattern, pattern]
+
+    def count_matching(self, conn, where, params):
+        return self._scalar(conn, f"SELECT COUNT(*) FROM students WHERE {where}", params)
+
+    def page(self, conn, columns, where, params, sort, order, limit, offset):
+        """One page of students ordered by a SORT_COLUMNS key, ties broken by id"""
+        direction = 'DESC' if order == 'desc' else 'ASC'
+        query = f"SELECT {', '.join(columns)} FROM students"
+        if where:
+            query += f" WHERE {where}"
+        query += f" ORDER BY {SORT_COLUMNS[sort]} {direction}, id {direction} LIMIT ? OFFSET ?"
+        return self._fetchall(conn, query, list(params) + [limit, offset])
+
+    # -------------------- aggregates --------------------
+    def totals(self, conn):
+        """(count, sum of ages, count of ages) over every student
+
+        SQLite keeps an age that isn't a whole number as text or real (old
+        form posts, API strings); like stats._age(), those don't count.
+        """
+        if self.dialect == 'postgresql':
+            query = "SELECT COUNT(*), SUM(age), COUNT(age) FROM students"
+        else:
+            query = ("SELECT COUNT(*), SUM(CASE WHEN typeof(age) = 'integer' THEN age END), "
+                     "COUNT(CASE WHEN typeof(age) = 'integer' THEN 1 END) FROM students")
+        cursor = self._execute(self._cursor(conn), query, prepare=True)
+        try:
+            return cursor.fetchone()
+        finally:
+            cursor.close()
+
+    def city_counts(self, conn):
+        """{city: students} for every non-null city"""
+        cursor = self._execute(self._cursor(conn), """
+            SELECT city, COUNT(*)
+            FROM students
+            WHERE city IS NOT NULL
+            GROUP BY city
+        """, prepare=True)
+        try:
+            return dict(cursor.fetchall())
+        finally:
+            cursor.close()
+
+
+def like_escape(text):
+    """`text` with LIKE's wildcards (and the \\ escape itself) escaped"""
+    return text.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def prefix_upper_bound(prefix):
+    """The smallest string above every string starting with `prefix` (binary order)
+
+    None when there is none (a prefix of only U+10FFFF). Surrogates,
+    which can't be encoded, are skipped.
+    """
+    stripped = prefix.rstrip(chr(0x10FFFF))
+    if not stripped:
+        return None
+    code = ord(stripped[-1]) + 1
+    if 0xD800 <= code <= 0xDFFF:
+        code = 0xE000
+    return stripped[:-1] + chr(code)
+
+
+def fts_query(q):
+    """Turn free text into an FTS5 query: every word must match as a prefix"""
+    return ' '.join('"{}"*'.format(term.replace('"', '""')) for term in q.split())
@@ -0,0 +1,113 @@
+import hashlib
+import json
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+
+def _age(value):
+    """An age as the aggregates count it: whole numbers only, the values
+    SQLite stores as integers (StudentRepository.totals() skips the rest)"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return int(number) if number.is_integer() else None
+
+
+class StudentStats:
+    """Running student aggregates kept in memory and updated on every write
+
+    The write routes report inserts, updates and deletes so reads never hit
+    the database. Writes made by other worker processes are not seen here,
+    so the aggregates are also recomputed from the table every
+    `recompute_interval` seconds to correct any drift.
+    """
+
+    def __init__(self, recompute_interval=60):
+        self.recompute_interval = recompute_interval
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._computed_at = 0.0
+        self._total = 0
+        self._age_sum = 0
+        self._age_count = 0
+        self._cities = Counter()
+        self._snapshot = None
+        self.last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+
+    # -------------------- full recompute --------------------
+    def recompute(self, totals, cities):
+        """Reload every aggregate from a full scan of the students table
+
+        `totals` is (count, sum of ages, count of ages) and `cities` maps
+        each city to its student count (StudentRepository.totals() and
+        city_counts()).
+        """
+        count, age_sum, age_count = totals
+        with self._lock:
+            self._total = count
+            self._age_sum = age_sum or 0
+            self._age_count = age_count
+            self._cities = Counter(cities)
+            self._loaded = True
+            self._computed_at = time.monotonic()
+            self._changed()
+
+    def is_stale(self):
+        with self._lock:
+            return not self._loaded or time.monotonic() - self._computed_at > self.recompute_interval
+
+    def invalidate(self):
+        """Force a full recompute on the next read (e.g. after bulk writes)"""
+        with self._lock:
+            self._loaded = False
+
+    # -------------------- incremental updates --------------------
+    def _add(self, student, sign):
+        self._total += sign
+        age = _age(student['age'])
+        if age is not None:
+            self._age_sum += sign * age
+            self._age_count += sign
+        city = student['city']
+        if city is not None:
+            self._cities[city] += sign
+            if self._cities[city] <= 0:
+                del self._cities[city]
+
+    def record_change(self, old=None, new=None):
+        """Apply an insert (new only), update (both) or delete (old only)
+
+        `old` and `new` are mappings with at least 'age' and 'city'.
+        """
+        with self._lock:
+            if not self._loaded:
+                return
+            if old is not None:
+                self._add(old, -1)
+            if new is not None:
+                self._add(new, +1)
+            self._changed()
+
+    # -------------------- reads --------------------
+    def _changed(self):
+        """Rebuild the cached payload; bump Last-Modified if it differs"""
+        cities = sorted(self._cities.items(), key=lambda item: (-item[1], item[0]))
+        data = {
+            'total_students': self._total,
+            'average_age': round(self._age_sum / self._age_count, 2) if self._age_count else 0,
+            'students_by_city': [{'city': city, 'count': count} for city, count in cities]
+        }
+        # The ETag is derived from the content so every worker agrees on it
+        etag = hashlib.sha1(json.dumps(data, sort_keys=True).encode('utf-8')).hexdigest()
+        if self._snapshot is None or self._snapshot[1] != etag:
+            self.last_modified = datetime.now(timezone.utc).replace(microsecond=0)
+        self._snapshot = (data, etag)
+
+    def snapshot(self):
+        """Return (data, etag, last_modified) for the current aggregates"""
+        with self._lock:
+            data, etag = self._snapshot
+            return data, etag, self.last_modified
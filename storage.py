@@ -0,0 +1,231 @@
+import hashlib
+import importlib.util
+from abc import ABC, abstractmethod
+import io
+import os
+import re
+import tempfile
+import time
+
+# boto3 (object-store backend) is imported only when that backend is built
+BOTO3_AVAILABLE = importlib.util.find_spec('boto3') is not None
+
+CHUNK_SIZE = 64 * 1024
+
+# Content-addressed keys look like "ab/ab12...ef.jpg" (sha256 hex digest)
+CONTENT_KEY_RE = re.compile(r'^[0-9a-f]{2}/[0-9a-f]{64}\.[a-z0-9]+$')
+
+
+def content_key(digest, extension):
+    return f"{digest[:2]}/{digest}.{extension.lower().lstrip('.')}"
+
+
+def is_content_key(key):
+    return bool(key and CONTENT_KEY_RE.match(key))
+
+
+def _spool(stream, out):
+    """Copy a stream to `out` in chunks, hashing as we go"""
+    digest = hashlib.sha256()
+    size = 0
+    while True:
+        chunk = stream.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        out.write(chunk)
+        size += len(chunk)
+    return digest.hexdigest(), size
+
+
+class Storage(ABC):
+    """Content-addressed blob storage
+
+    Files are stored under the sha256 of their bytes, so identical uploads
+    share one blob. Backends implement save_stream, open, exists, delete
+    and list_keys; one missing any of them can't be instantiated.
+    """
+
+    @abstractmethod
+    def save_stream(self, stream, extension):
+        """Store a file-like object, returning (key, size)"""
+
+    def save_bytes(self, data, extension):
+        return self.save_stream(io.BytesIO(data), extension)
+
+    @abstractmethod
+    def open(self, key):
+        """Binary file object for a stored blob"""
+
+    @abstractmethod
+    def exists(self, key):
+        """True if a blob is stored under `key`"""
+
+    @abstractmethod
+    def delete(self, key):
+        """Remove a blob; a missing key is not an error"""
+
+    @abstractmethod
+    def list_keys(self):
+        """Yield (key, modified_timestamp) for every stored blob"""
+
+    def url(self, key):
+        """Public URL for a key, or None if the app serves it itself"""
+        return None
+
+
+class LocalStorage(Storage):
+    """Blobs on the local filesystem under `root` (e.g. static/uploads)"""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+
+    def save_stream(self, stream, extension):
+        # Hash while writing to a temp file in the same filesystem, then
+        # rename into place: the final path only ever holds complete files.
+        fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as out:
+                digest, size = _spool(stream, out)
+            key = content_key(digest, extension)
+            path = self.path(key)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return key, size
+
+    def open(self, key):
+        return open(self.path(key), 'rb')
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def delete(self, key):
+        path = self.path(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def list_keys(self):
+        for prefix in os.listdir(self.root):
+            directory = os.path.join(self.root, prefix)
+            if len(prefix) != 2 or not os.path.isdir(directory):
+                continue
+            for name in os.listdir(directory):
+                key = f"{prefix}/{name}"
+                if is_content_key(key):
+                    yield key, os.path.getmtime(os.path.join(directory, name))
+
+
+class ObjectStorage(Storage):
+    """Blobs in an S3-compatible bucket (boto3 client API)"""
+
+    def __init__(self, client, bucket, prefix='uploads/', public_url=None):
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+        self.public_url = public_url.rstrip('/') if public_url else None
+
+    def _name(self, key):
+        return self.prefix + key
+
+    def save_stream(self, stream, extension):
+        # The key depends on the hash, so spool locally before uploading
+        with tempfile.TemporaryFile() as spool:
+            digest, size = _spool(stream, spool)
+            key = content_key(digest, extension)
+            if not self.exists(key):
+                spool.seek(0)
+                self.client.upload_fileobj(spool, self.bucket, self._name(key))
+        return key, size
+
+    def open(self, key):
+        # Callers (e.g. Pillow) need a seekable file
+        body = self.client.get_object(Bucket=self.bucket, Key=self._name(key))['Body']
+        return io.BytesIO(body.read())
+
+    def exists(self, key):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._name(key))
+            return True
+        except Exception:
+            return False
+
+    def delete(self, key):
+        self.client.delete_object(Bucket=self.bucket, Key=self._name(key))
+
+    def list_keys(self):
+        paginator = self.client.get_paginator('list_objects_v2')
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for item in page.get('Contents', []):
+                key = item['Key'][len(self.prefix):]
+                if is_content_key(key):
+                    yield key, item['LastModified'].timestamp()
+
+    def url(self, key):
+        return f"{self.public_url}/{self._name(key)}" if self.public_url else None
+
+
+def create_storage(backend='local', root='static/uploads', bucket=None, public_url=None):
+    """Build the configured storage backend: local or s3"""
+    if backend == 'local':
+        return LocalStorage(root)
+    if backend == 's3':
+        if not BOTO3_AVAILABLE:
+            raise RuntimeError("Storage backend 's3' requires the boto3 package")
+        import boto3
+        return ObjectStorage(boto3.client('s3'), bucket, public_url=public_url)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+# -------------------- Garbage collection --------------------
+# The blobs table tracks how many students reference each stored file
+# (StudentRepository.retain_blob/release_blob, in the writes' transactions).
+
+def collect_garbage(storage, repo, conn, run_write, grace_seconds=3600):
+    """Delete blobs nobody references any more
+
+    Only blobs unreferenced for at least `grace_seconds` are removed, which
+    leaves in-flight uploads (stored but not yet committed) alone. Files
+    with no blobs row at all (an upload whose transaction rolled back) are
+    removed on the same terms. `conn` is only read from; the deletions go
+    through run_write (database.run_write). Returns the number of files
+    deleted.
+
+    Identical content can be uploaded again while a blob is being
+    collected: save_stream() finds (or rewrites) the file, which the sweep
+    then deletes. So each file is deleted inside the write that deletes
+    (or claims) its row, and repo.retain_blob() reports a blob that had no
+    live reference; the caller then checks the file exists and stores it
+    again if not, in its own write. The two writes are serialized on the
+    blob's row (and on SQLite's write lock), so whichever commits second
+    sees the other's outcome: either the sweep finds the blob referenced
+    again and keeps it, or the upload finds the file gone and restores it.
+    """
+    cutoff = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(time.time() - grace_seconds))
+    keys = repo.unreferenced_blobs(conn, cutoff)
+    known = repo.blob_keys(conn)
+    untracked = [key for key, modified in storage.list_keys()
+                 if key not in known and modified < time.time() - grace_seconds]
+    if not keys and not untracked:
+        return 0
+
+    def delete_blobs(conn):
+        deleted = 0
+        for key in keys:
+            if repo.delete_unreferenced_blob(conn, key):
+                storage.delete(key)
+                deleted += 1
+        for key in untracked:
+            if repo.delete_untracked_blob(conn, key):
+                storage.delete(key)
+                deleted += 1
+        return deleted
+
+    return run_write(delete_blobs)
@@ -0,0 +1,162 @@
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class WriteQueue:
+    """Serializes SQLite writes onto one connection and group-commits them
+
+    Jobs are callables taking the writer's connection. A single background
+    thread takes whatever jobs are queued (up to `max_batch`, waiting at most
+    `max_delay` seconds for more), runs each in its own savepoint inside one
+    BEGIN IMMEDIATE transaction and commits once, so a burst of small
+    inserts pays for one journal sync instead of one each. A job that raises
+    is rolled back on its own; the rest of the batch still commits.
+
+    Jobs must not commit or roll back themselves.
+    """
+
+    def __init__(self, connect, max_batch=64, max_delay=0.0):
+        if max_batch < 1:
+            raise ValueError("Invalid write batch size: %s" % max_batch)
+
+        self._connect = connect
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+
+        # The writer thread doesn't survive fork(); callers check the pid
+        self.pid = os.getpid()
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._closed = False
+
+        self._stats = {
+            'jobs': 0,
+            'failed_jobs': 0,
+            'batches': 0,
+            'largest_batch': 0,
+            'commit_failures': 0,
+            'commit_time': 0.0,
+        }
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Write queue is closed")
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+                self._thread.start()
+
+    def submit(self, func, *args):
+        """Queue func(conn, *args); returns a Future for its result"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((future, func, args))
+        return future
+
+    def run(self, func, *args, timeout=None):
+        """Queue func(conn, *args) and wait until it has been committed"""
+        return self.submit(func, *args).result(timeout=timeout)
+
+    def close(self):
+        """Finish the queued jobs and stop the writer thread"""
+        with self._lock:
+            self._closed = True
+            thread = self._thread
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    # -------------------- writer thread --------------------
+    def _next_batch(self):
+        """Block for one job, then take up to max_batch - 1 more"""
+        job = self._queue.get()
+        if job is None:
+            return None
+        batch = [job]
+        deadline = time.monotonic() + self.max_delay
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                job = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is None:
+                # Stop after this batch
+                self._queue.put(None)
+                break
+            batch.append(job)
+        return batch
+
+    def _run(self):
+        conn = self._connect()
+        # Transactions are managed explicitly below
+        conn.isolation_level = None
+        try:
+            while True:
+                batch = self._next_batch()
+                if batch is None:
+                    break
+                self._commit_batch(conn, batch)
+        finally:
+            conn.close()
+
+    def _commit_batch(self, conn, batch):
+        started = time.perf_counter()
+        outcomes = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for future, func, args in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                conn.execute("SAVEPOINT job")
+                try:
+                    result = func(conn, *args)
+                except Exception as e:
+                    conn.execute("ROLLBACK TO SAVEPOINT job")
+                    conn.execute("RELEASE SAVEPOINT job")
+                    outcomes.append((future, None, e))
+                else:
+                    conn.execute("RELEASE SAVEPOINT job")
+                    outcomes.append((future, result, None))
+            conn.execute("COMMIT")
+        except Exception as e:
+            # Nothing in the batch was committed
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            with self._lock:
+                self._stats['commit_failures'] += 1
+                self._stats['jobs'] += len(batch)
+                self._stats['failed_jobs'] += len(batch)
+            for future, func, args in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        with self._lock:
+            self._stats['batches'] += 1
+            self._stats['jobs'] += len(batch)
+            self._stats['failed_jobs'] += sum(1 for _, _, error in outcomes if error is not None)
+            self._stats['largest_batch'] = max(self._stats['largest_batch'], len(batch))
+            self._stats['commit_time'] += time.perf_counter() - started
+        for future, result, error in outcomes:
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(result)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+        data.update({
+            'queue_depth': self._queue.qsize(),
+            'max_batch': self.max_batch,
+            'max_delay': self.max_delay,
+            'avg_batch_size': round(data['jobs'] / data['batches'], 2) if data['batches'] else 0.0,
+            'commit_time': round(data['commit_time'], 6),
+        })
+        return data